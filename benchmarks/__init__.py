@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Micro-benchmarks of the policy enforcement hot path.
+
+Run them from the top of the source tree with::
+
+    python -m benchmarks --output results.json
+
+and compare two runs, e.g. from two commits, with::
+
+    python -m benchmarks --compare before.json --output after.json
+
+Every benchmark runs against the same fixtures: a temporary SQLite policy
+database and fixed credentials and targets, see :mod:`benchmarks.fixtures`.
+"""
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Run the benchmarks and write their results as JSON."""
+
+from __future__ import print_function
+
+import argparse
+import fnmatch
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+from benchmarks import cases
+from benchmarks import fixtures
+
+
+# Format of the JSON results
+RESULTS_VERSION = 1
+
+
+def measure(func, ops, repeat, min_time):
+    """Time func and return statistics per operation, in microseconds.
+
+    func is called in loops long enough to last at least min_time seconds,
+    and the loop is timed repeat times.
+    """
+
+    number = 1
+    while True:
+        elapsed = timeit.timeit(func, number=number)
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    timings = [elapsed] + timeit.repeat(func, number=number,
+                                        repeat=repeat - 1)
+    per_op = sorted(t / (number * ops) * 1e6 for t in timings)
+    return {'ops': number * ops,
+            'repeat': repeat,
+            'min_us': per_op[0],
+            'median_us': per_op[len(per_op) // 2],
+            'max_us': per_op[-1]}
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.STDOUT).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description=__doc__)
+    parser.add_argument('patterns', nargs='*', default=['*'],
+                        help='Only run benchmarks matching these glob'
+                             ' patterns, e.g. "enforce.*".')
+    parser.add_argument('--output', help='Write the results to this file.')
+    parser.add_argument('--compare',
+                        help='Results of a previous run to compare with.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timed loops per benchmark.')
+    parser.add_argument('--min-time', type=float, default=0.1,
+                        help='Minimum duration of a timed loop, in seconds.')
+    parser.add_argument('--domains', type=int, default=1000,
+                        help='Number of domain policies in the database.')
+    parser.add_argument('--rules', type=int, default=20,
+                        help='Number of rules per domain policy.')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    env = fixtures.Environment(domains=args.domains, rules=args.rules)
+    results = {}
+    try:
+        for group in cases.groups:
+            for name, func, ops in group(env):
+                if not any(fnmatch.fnmatch(name, p) for p in args.patterns):
+                    continue
+                gc.collect()
+                result = results[name] = measure(func, ops, args.repeat,
+                                                 args.min_time)
+                line = '%-60s %12.2f us' % (name, result['median_us'])
+                if name in baseline:
+                    line += '  x%.2f' % (result['median_us'] /
+                                         baseline[name]['median_us'])
+                print(line)
+                sys.stdout.flush()
+    finally:
+        env.close()
+
+    if args.output:
+        data = {'version': RESULTS_VERSION,
+                'commit': _commit(),
+                'time': time.time(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'settings': {'repeat': args.repeat,
+                             'min_time': args.min_time,
+                             'domains': args.domains,
+                             'rules': args.rules},
+                'results': results}
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=4, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""The benchmarks.
+
+Each group is a function taking the :class:`~benchmarks.fixtures.Environment`
+and yielding ``(name, func, ops)`` tuples, where calling ``func`` performs
+``ops`` operations.  Results are reported per operation.
+"""
+
+import random
+
+from oslo_policy import _parser
+from oslo_policy import policy
+from oslo_policy import sql
+
+from benchmarks import fixtures
+
+
+groups = []
+
+
+def group(func):
+    """Register a group of benchmarks."""
+
+    groups.append(func)
+    return func
+
+
+def _rule_strings(env):
+    strings = []
+    for rules_dict in fixtures.builtin_rule_dicts(env.conf):
+        for serv_rules in rules_dict.values():
+            strings.extend(serv_rules.values())
+    return strings
+
+
+@group
+def parse(env):
+    """Parsing every rule string of the built-in rule sets."""
+
+    strings = _rule_strings(env)
+
+    def run():
+        for rule in strings:
+            _parser.parse_rule(rule)
+
+    yield 'parse.rule', run, len(strings)
+
+
+@group
+def rules(env):
+    """Building the built-in rule sets."""
+
+    names = ('system', 'default')
+    for name, rules_dict in zip(names, fixtures.builtin_rule_dicts(env.conf)):
+        def from_dict(rules_dict=rules_dict):
+            policy.Rules.from_dict(rules_dict, 'role:domain_admin')
+
+        yield 'rules.from_dict.%s' % name, from_dict, 1
+
+        parsed = policy.Rules.from_dict(rules_dict, 'role:domain_admin')
+
+        def optimize(parsed=parsed):
+            parsed.optimize()
+
+        yield 'rules.optimize.%s' % name, optimize, 1
+
+        data = parsed.optimize().dump_compiled()
+
+        def load_compiled(data=data):
+            policy.Rules.load_compiled(data)
+
+        yield 'rules.load_compiled.%s' % name, load_compiled, 1
+
+
+def _evaluations(name, rules, target, creds):
+    """Yield a benchmark per rule, and one for all of them."""
+
+    all_rules = []
+    for serv in sorted(rules):
+        serv_rules = rules[serv]
+        for perm in sorted(serv_rules):
+            rule = serv_rules[perm]
+            all_rules.append((rule, serv_rules))
+
+            def run(rule=rule, serv_rules=serv_rules):
+                rule(target, creds, serv_rules)
+
+            yield '%s.%s.%s' % (name, serv, perm), run, 1
+
+    def run_all():
+        for rule, serv_rules in all_rules:
+            rule(target, creds, serv_rules)
+
+    yield '%s.all' % name, run_all, len(all_rules)
+
+
+@group
+def evaluate(env):
+    """Evaluating each rule of the built-in rule sets."""
+
+    enforcer = env.make_enforcer()
+    compiled = env.make_enforcer(compile_rules=True)
+    adaptive = env.make_enforcer(adaptive_reorder=True)
+    creds = policy.Credentials(fixtures.make_creds(fixtures.DOMAIN_POLICY))
+    target = fixtures.make_target((enforcer.sys_rules, enforcer.dflt_rules),
+                                  creds)
+
+    for name, rules in (('eval.system', enforcer.sys_rules),
+                        ('eval.default', enforcer.dflt_rules)):
+        for result in _evaluations(name, rules, target, creds):
+            yield result
+
+    for name, rules in (('eval.compiled.system', compiled.sys_rules),
+                        ('eval.compiled.default', compiled.dflt_rules)):
+        for result in _evaluations(name, rules, target, creds):
+            yield result
+
+    for name, rules in (('eval.adaptive.system', adaptive.sys_rules),
+                        ('eval.adaptive.default', adaptive.dflt_rules)):
+        for result in _evaluations(name, rules, target, creds):
+            yield result
+
+
+@group
+def enforce(env):
+    """The whole enforce() path against the policy database."""
+
+    variants = (('', {}),
+                ('.cached', {'domain_cache_time': 3600}),
+                ('.compiled', {'domain_cache_time': 3600,
+                               'compile_rules': True}))
+    cases = (('enforce.no_policy', fixtures.DOMAIN_NO_POLICY,
+              fixtures.POLICY_ACTION),
+             ('enforce.policy_hit', fixtures.DOMAIN_POLICY,
+              fixtures.POLICY_ACTION),
+             ('enforce.rule_not_found', fixtures.DOMAIN_POLICY,
+              fixtures.FALLBACK_ACTION))
+
+    for suffix, overrides in variants:
+        enforcer = env.make_enforcer(**overrides)
+        for name, domain_id, action in cases:
+            creds = fixtures.make_creds(domain_id)
+            target = fixtures.make_target(
+                (enforcer.sys_rules, enforcer.dflt_rules), creds)
+
+            def run(enforcer=enforcer, action=action, target=target,
+                    creds=creds):
+                enforcer.enforce(action, target, creds)
+
+            yield name + suffix, run, 1
+
+
+@group
+def filtering(env):
+    """Filtering a list of 100 objects: a predicate or enforce() on each."""
+
+    enforcer = env.make_enforcer(domain_cache_time=3600)
+    creds = fixtures.make_creds(fixtures.DOMAIN_POLICY)
+    target = fixtures.make_target((enforcer.sys_rules, enforcer.dflt_rules),
+                                  creds)
+    targets = []
+    for i in range(100):
+        target = dict(target)
+        target['obj.user.id'] = 'user-%d' % i
+        targets.append(target)
+
+    def predicate():
+        enforcer.filter_predicate(fixtures.POLICY_ACTION, creds)
+
+    yield 'filter.predicate', predicate, 1
+
+    def enforce_each():
+        for target in targets:
+            enforcer.enforce(fixtures.POLICY_ACTION, target, creds)
+
+    yield 'filter.enforce_each', enforce_each, 1
+
+
+@group
+def database(env):
+    """Policy lookups among the filler domains."""
+
+    backend = sql.Backend(env.conf)
+    domain_ids = list(env.domain_ids)
+    random.Random(0).shuffle(domain_ids)
+    domain_ids = domain_ids[:100]
+
+    def enabled_policy():
+        for domain_id in domain_ids:
+            backend.get_enabled_policy_in_domain(domain_id)
+
+    yield 'sql.enabled_policy_in_domain', enabled_policy, len(domain_ids)
+
+    def enabled_policy_rules():
+        for domain_id in domain_ids:
+            backend.get_enabled_policy_rules(domain_id)
+
+    yield ('sql.enabled_policy_rules', enabled_policy_rules,
+           len(domain_ids))
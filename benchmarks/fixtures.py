@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Reproducible fixtures shared by the benchmarks."""
+
+import os
+import random
+import shutil
+import tempfile
+
+from oslo_config import cfg
+
+from oslo_policy import _checks
+from oslo_policy import _compiler
+from oslo_policy import _default_domain
+from oslo_policy import _system
+from oslo_policy.common import sql as common_sql
+from oslo_policy import opts
+from oslo_policy import policy
+from oslo_policy import sql
+
+
+CSP_DOMAIN_ID = 'bench-csp'
+
+# A domain without any enabled policy
+DOMAIN_NO_POLICY = 'bench-no-policy'
+# A domain whose enabled policy has a rule for POLICY_ACTION, but not for
+# FALLBACK_ACTION
+DOMAIN_POLICY = 'bench-policy'
+
+POLICY_ACTION = ('keystone', 'get_user')
+FALLBACK_ACTION = ('keystone', 'list_users')
+POLICY_RULE = 'role:domain_admin or user_id:%(obj.user.id)s'
+
+USER_ID = 'bench-user'
+PROJECT_ID = 'bench-project'
+
+# Rules of the filler domain policies
+_FILLER_RULES = ['role:domain_admin',
+                 'role:domain_admin or role:project_admin',
+                 'role:project_admin and project_id:%(obj.project.id)s',
+                 'user_id:%(obj.user.id)s or role:domain_admin',
+                 'not role:reader']
+
+
+def make_creds(domain_id):
+    """Return the credentials used against a domain."""
+
+    return {'domain_id': domain_id,
+            'user_id': USER_ID,
+            'project_id': PROJECT_ID,
+            'scope': 'domain',
+            'roles': ['Member', 'domain_admin']}
+
+
+def make_target(rule_sets, creds):
+    """Return a target every generic check of rule_sets matches.
+
+    Each target key a generic check substitutes is set to the value the
+    check compares it with, so every check is evaluated in full.
+    """
+
+    target = {}
+
+    def visit(check):
+        if isinstance(check, _compiler.CompiledCheck):
+            visit(check.check)
+        elif isinstance(check, _checks.NotCheck):
+            visit(check.rule)
+        elif isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+            for rule in check.rules:
+                visit(rule)
+        elif isinstance(check, _checks.GenericCheck):
+            if check.literal is not None:
+                value = check.literal
+            else:
+                value = creds
+                for part in check.kind_parts:
+                    if not isinstance(value, dict):
+                        value = None
+                        break
+                    value = value.get(part)
+            for key in check.target_keys:
+                target.setdefault(key, value)
+
+    for rules in rule_sets:
+        for serv_rules in rules.values():
+            for rule in serv_rules.values():
+                visit(rule)
+    return target
+
+
+def builtin_rule_dicts(conf):
+    """Return the system and default rules as dicts of rule strings."""
+
+    return (_system.SystemRules(conf).sys_rules,
+            _default_domain.DefaultRules().dflt_rules)
+
+
+class Environment(object):
+    """A configuration and policy database to run benchmarks against.
+
+    :param domains: Number of filler domains, each with an enabled policy,
+                    used by the database benchmarks.
+    :param rules: Number of rules in the policy of each filler domain.
+    :param seed: Seed of the random choices made while filling the database.
+    """
+
+    def __init__(self, domains=1000, rules=20, seed=0):
+        self.workdir = tempfile.mkdtemp(prefix='oslo-policy-bench-')
+        self.conf = self.make_conf()
+        self.domain_ids = []
+
+        common_sql.cleanup()
+        sql.db_sync(self.conf)
+        self._populate(domains, rules, random.Random(seed))
+
+    def make_conf(self, **overrides):
+        """Return a new configuration for the benchmark database.
+
+        :param overrides: ``[oslo_policy]`` options to override.
+        """
+
+        conf = cfg.ConfigOpts()
+        opts._register(conf)
+        conf([])
+        conf.set_override('policy_connection',
+                          'sqlite:///' + os.path.join(self.workdir,
+                                                      'policy.db'),
+                          group='oslo_policy')
+        conf.set_override('CSP_domain_id', CSP_DOMAIN_ID,
+                          group='oslo_policy')
+        for name, value in overrides.items():
+            conf.set_override(name, value, group='oslo_policy')
+        return conf
+
+    def make_enforcer(self, **overrides):
+        """Return an Enforcer for the benchmark database.
+
+        :param overrides: ``[oslo_policy]`` options to override.
+        """
+
+        return policy.Enforcer(self.make_conf(**overrides))
+
+    def _populate(self, domains, rules, rng):
+        with common_sql.session_scope(self.conf) as session:
+            session.add(sql.Domain(id=DOMAIN_NO_POLICY, name=DOMAIN_NO_POLICY,
+                                   enabled=True, extra={}))
+            session.add(sql.Domain(id=DOMAIN_POLICY, name=DOMAIN_POLICY,
+                                   enabled=True, extra={}))
+            session.add(sql.Policy(id='bench-policy-p', name='bench',
+                                   domain_id=DOMAIN_POLICY, enabled=True,
+                                   extra={}))
+            session.add(sql.Rule(id='bench-policy-r',
+                                 policy_id='bench-policy-p',
+                                 service=POLICY_ACTION[0],
+                                 permission=POLICY_ACTION[1],
+                                 condition=POLICY_RULE, extra={}))
+
+            for i in range(domains):
+                domain_id = 'bench-domain-%d' % i
+                policy_id = 'bench-policy-%d' % i
+                self.domain_ids.append(domain_id)
+                session.add(sql.Domain(id=domain_id, name=domain_id,
+                                       enabled=True, extra={}))
+                # A disabled policy next to the enabled one
+                session.add(sql.Policy(id=policy_id + '-old', name='old',
+                                       domain_id=domain_id, enabled=False,
+                                       extra={}))
+                session.add(sql.Policy(id=policy_id, name='current',
+                                       domain_id=domain_id, enabled=True,
+                                       extra={}))
+                for j in range(rules):
+                    session.add(sql.Rule(id='%s-%d' % (policy_id, j),
+                                         policy_id=policy_id,
+                                         service='keystone',
+                                         permission='permission_%d' % j,
+                                         condition=rng.choice(_FILLER_RULES),
+                                         extra={}))
+
+    def close(self):
+        """Remove the benchmark database."""
+
+        common_sql.cleanup()
+        shutil.rmtree(self.workdir, ignore_errors=True)
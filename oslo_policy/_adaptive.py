@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Reorder the branches of ``and``/``or`` expressions from live traffic.
+
+An ``and`` stops at the first branch that rejects and an ``or`` at the first
+one that accepts, so the best order runs first the branches that are cheap
+and likely to decide.  :func:`adapt` rewrites expressions into nodes that
+measure, on a sample of their evaluations, how long each branch takes and
+how often it decides, and periodically sort their branches by expected
+cost.
+
+Only pure branches are moved: role checks, generic checks comparing a
+single key of the credentials with a single key of the target or a
+constant, and expressions of them.  They have no side effects, and only
+raise when the target is not a dict or the roles of the credentials cannot
+be read.  Other generic checks can raise ``TypeError`` or ``ValueError``
+depending on the values they read, and ``rule:``, ``http:`` and
+application-defined checks may have side effects: they are barriers that
+stay where they are, and branches are only reordered between two barriers.
+Targets and credentials the pure branches cannot read are evaluated in the
+original order, so that the node raises exactly where the expression it
+replaces does.
+
+Nodes may be evaluated by several threads at once.  The order in use is
+replaced as a whole, and the measurements are recorded and the branches
+reordered under a lock, which the evaluations that are not measured never
+take.
+
+The learned orders can be exported with :func:`export_profile` and applied
+to the expressions built by a later process with :func:`load_profile`.
+"""
+
+import itertools
+import json
+import threading
+import weakref
+
+from oslo_policy import _cache
+from oslo_policy import _checks
+from oslo_policy import _compiler
+
+
+# One evaluation out of this many is measured
+_SAMPLE_EVERY = 8
+
+# Version of the exported profiles
+PROFILE_VERSION = 1
+
+# Learned branch orders to apply to new nodes, by node key
+_profile = {}
+_profile_lock = threading.Lock()
+
+# Every adaptive node, for export_profile()
+_nodes = weakref.WeakSet()
+
+
+def _unwrap(check):
+    if isinstance(check, _compiler.CompiledCheck):
+        return check.check
+    return check
+
+
+def _is_pure(check):
+    """Whether evaluating check has no side effect.
+
+    Such a check may only raise when the target is not a dict or the roles
+    of the credentials cannot be read, see :func:`_readable`.
+    """
+
+    check = _unwrap(check)
+    if type(check) in (_checks.TrueCheck, _checks.FalseCheck,
+                       _checks.RoleCheck):
+        return True
+    elif type(check) is _checks.GenericCheck:
+        # Formatting a template, or walking down the values of the
+        # credentials, raises on some values
+        return ((check.target_key is not None or not check._formatted) and
+                (check.literal is not None or len(check.kind_parts) == 1))
+    elif isinstance(check, _checks.NotCheck):
+        return _is_pure(check.rule)
+    elif isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+        return all(_is_pure(r) for r in check.rules)
+    return False
+
+
+def _reads_roles(check):
+    """Whether check holds role checks."""
+
+    check = _unwrap(check)
+    if type(check) is _checks.RoleCheck:
+        return True
+    elif isinstance(check, _checks.NotCheck):
+        return _reads_roles(check.rule)
+    elif isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+        return any(_reads_roles(r) for r in check.rules)
+    return False
+
+
+def _target_readable(target, creds):
+    """Whether pure checks without role checks can read target."""
+
+    return isinstance(target, dict)
+
+
+def _readable(target, creds):
+    """Whether pure checks, role checks too, can read target and creds."""
+
+    if not isinstance(target, dict):
+        return False
+    try:
+        _checks.role_set(creds)
+    except Exception:
+        return False
+    return True
+
+
+def _node_key(op, rules):
+    """Identify a node independently of the order of its branches."""
+
+    return json.dumps([op, sorted(str(r) for r in rules)])
+
+
+def _arrange(rules, pure, sort_key):
+    """Sort the runs of pure rules between barriers with sort_key."""
+
+    arranged = []
+    run = []
+    for rule in rules:
+        if rule in pure:
+            run.append(rule)
+            continue
+        arranged.extend(sorted(run, key=sort_key))
+        run = []
+        arranged.append(rule)
+    arranged.extend(sorted(run, key=sort_key))
+    return arranged
+
+
+class _AdaptiveMixin(object):
+    """Measurement and reordering shared by the adaptive nodes.
+
+    Subclasses set ``_op`` and ``_decisive``, the result of a branch that
+    decides the result of the node.
+    """
+
+    __slots__ = ()
+
+    def _setup(self, interval):
+        self._interval = interval
+        # Numbers the evaluations, next() being atomic
+        self._calls = itertools.count(1)
+        self._next_reorder = interval
+        self._lock = threading.Lock()
+        self._pure = frozenset(r for r in self.rules if _is_pure(r))
+        self._original = list(self.rules)
+        # The current order, and the test of the inputs it does not raise
+        # on where the original does not, if it may.  One attribute, so
+        # that concurrent evaluations never read a new order with the guard
+        # of the previous one.
+        self._plan = (self.rules, None)
+        # Per branch: evaluations, decisive evaluations, seconds
+        self._stats = dict((r, [0, 0, 0.0]) for r in self.rules)
+
+        with _profile_lock:
+            order = _profile.get(self.key())
+        if order is not None:
+            positions = dict((s, i) for i, s in enumerate(order))
+            self._set_order(_arrange(
+                self.rules, self._pure,
+                lambda r: positions.get(str(r), len(positions))))
+        _nodes.add(self)
+
+    def _set_order(self, rules):
+        guard = None
+        if rules != self._original:
+            if any(_reads_roles(r) for r in self._pure):
+                guard = _readable
+            else:
+                guard = _target_readable
+        self._plan = (rules, guard)
+        self.rules = rules
+
+    def _order(self, target, cred):
+        """Return the branches in the order to evaluate them for cred."""
+
+        rules, guard = self._plan
+        if guard is not None and not guard(target, cred):
+            return self._original
+        return rules
+
+    def key(self):
+        """Return the key of this node in profiles."""
+
+        return _node_key(self._op, self.rules)
+
+    def _sampled_call(self, calls, target, cred, rule_dict):
+        """Evaluate every branch, measuring them.
+
+        Pure branches after the one that decided are evaluated too, so that
+        all of them are measured, but not past a barrier.
+
+        :param calls: The number of the evaluation.
+        """
+
+        decisive = self._decisive
+        result = not decisive
+        decided = False
+        clock = _cache._clock
+        # (branch, seconds, whether it decided)
+        measures = []
+        for rule in self._order(target, cred):
+            if not decided:
+                start = clock()
+                value = rule(target, cred, rule_dict)
+            elif rule in self._pure:
+                # Only evaluated to be measured: the result is known, and
+                # the expression this node replaces would not raise here
+                start = clock()
+                try:
+                    value = rule(target, cred, rule_dict)
+                except Exception:
+                    break
+            else:
+                break
+            elapsed = clock() - start
+
+            decides = bool(value) is decisive
+            measures.append((rule, elapsed, decides))
+            if decides:
+                decided = True
+                result = decisive
+
+        with self._lock:
+            stats = self._stats
+            for rule, elapsed, decides in measures:
+                rule_stats = stats[rule]
+                rule_stats[0] += 1
+                rule_stats[2] += elapsed
+                if decides:
+                    rule_stats[1] += 1
+            if calls >= self._next_reorder:
+                self._next_reorder = calls + self._interval
+                self._reorder()
+        return result
+
+    def _reorder(self):
+        """Sort the branches by expected cost, holding the lock."""
+
+        stats = self._stats
+
+        def expected_cost(rule):
+            evaluations, decisive, seconds = stats[rule]
+            if not evaluations:
+                return float('inf')
+            # Cost per decisive evaluation, the order that minimizes the
+            # expected cost of independent branches
+            return (seconds / evaluations) / max(
+                float(decisive) / evaluations, 1e-6)
+
+        self._set_order(_arrange(self.rules, self._pure, expected_cost))
+
+        # Decay, so that the order follows changes in traffic
+        for rule_stats in stats.values():
+            rule_stats[0] //= 2
+            rule_stats[1] //= 2
+            rule_stats[2] /= 2
+
+
+class AdaptiveAndCheck(_AdaptiveMixin, _checks.AndCheck):
+    """An "and" whose pure branches are reordered from live traffic.
+
+    :param rules: The branches.
+    :param interval: Number of evaluations between two reorders.
+    """
+
+    __slots__ = ('_interval', '_calls', '_next_reorder', '_lock', '_pure',
+                 '_original', '_plan', '_stats')
+
+    _op = 'and'
+    _decisive = False
+
+    def __init__(self, rules, interval=1000):
+        super(AdaptiveAndCheck, self).__init__(list(rules))
+        self._setup(interval)
+
+    def __call__(self, target, cred, rule_dict):
+        calls = next(self._calls)
+        if calls % _SAMPLE_EVERY == 0:
+            return self._sampled_call(calls, target, cred, rule_dict)
+        for rule in self._order(target, cred):
+            if not rule(target, cred, rule_dict):
+                return False
+        return True
+
+    def add_check(self, rule):
+        raise TypeError('%s cannot be extended' % self.__class__.__name__)
+
+
+class AdaptiveOrCheck(_AdaptiveMixin, _checks.OrCheck):
+    """An "or" whose pure branches are reordered from live traffic.
+
+    :param rules: The branches.
+    :param interval: Number of evaluations between two reorders.
+    """
+
+    __slots__ = ('_interval', '_calls', '_next_reorder', '_lock', '_pure',
+                 '_original', '_plan', '_stats')
+
+    _op = 'or'
+    _decisive = True
+
+    def __init__(self, rules, interval=1000):
+        super(AdaptiveOrCheck, self).__init__(list(rules))
+        self._setup(interval)
+
+    def __call__(self, target, cred, rule_dict):
+        calls = next(self._calls)
+        if calls % _SAMPLE_EVERY == 0:
+            return self._sampled_call(calls, target, cred, rule_dict)
+        for rule in self._order(target, cred):
+            if rule(target, cred, rule_dict):
+                return True
+        return False
+
+    def add_check(self, rule):
+        raise TypeError('%s cannot be extended' % self.__class__.__name__)
+
+
+def _has_group(check):
+    check = _unwrap(check)
+    if isinstance(check, _checks.NotCheck):
+        return _has_group(check.rule)
+    return type(check) in (_checks.AndCheck, _checks.OrCheck)
+
+
+def adapt(check, compile_rules=False, interval=1000):
+    """Return check with its and/or expressions made adaptive.
+
+    :param check: The root of the Check tree, optimized beforehand.
+    :param compile_rules: Whether to compile the branches that are not
+                          and/or expressions themselves.
+    :param interval: Number of evaluations between two reorders of a node.
+    """
+
+    if isinstance(check, _compiler.RoleMaskCheck):
+        # The role expressions leading it are evaluated in a few operations
+        # whatever their order, and move as a single branch
+        group = check.check
+        leading = _compiler._mask_prefix(group)
+        if leading == len(group.rules):
+            return check
+        mask = _compiler.RoleMaskCheck(
+            group.__class__(list(group.rules[:leading])))
+        rules = [mask] + [adapt(r, compile_rules, interval)
+                          for r in group.rules[leading:]]
+        if isinstance(group, _checks.AndCheck):
+            return AdaptiveAndCheck(rules, interval)
+        return AdaptiveOrCheck(rules, interval)
+
+    check = _unwrap(check)
+    if not _has_group(check):
+        return _compiler.compile_check(check) if compile_rules else check
+
+    if isinstance(check, _checks.NotCheck):
+        return _checks.NotCheck(adapt(check.rule, compile_rules, interval))
+
+    rules = [adapt(r, compile_rules, interval) for r in check.rules]
+    if isinstance(check, _checks.AndCheck):
+        return AdaptiveAndCheck(rules, interval)
+    return AdaptiveOrCheck(rules, interval)
+
+
+def export_profile():
+    """Return the branch orders learned by the live adaptive nodes.
+
+    :return: a JSON-serializable dict.
+    """
+
+    nodes = {}
+    for node in list(_nodes):
+        rules = list(node.rules)
+        nodes[_node_key(node._op, rules)] = [str(r) for r in rules]
+    return {'version': PROFILE_VERSION, 'nodes': nodes}
+
+
+def load_profile(profile):
+    """Apply the branch orders of a profile to the adaptive nodes built next.
+
+    :param profile: A dict returned by :func:`export_profile`.
+    :raises ValueError: if the profile is not in a supported format.
+    """
+
+    if not isinstance(profile, dict) or profile.get('version') != \
+            PROFILE_VERSION:
+        raise ValueError('Unsupported adaptive profile')
+    with _profile_lock:
+        _profile.update(profile['nodes'])
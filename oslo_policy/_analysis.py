@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Static analysis of the inputs a Check tree reads.
+
+The result of a rule only depends on the target keys its generic checks
+substitute, the credential attributes they compare against, and which of
+the roles it checks are held by the credentials.  :func:`get_inputs`
+collects those, so that callers can key caches on exactly the values a rule
+reads.
+"""
+
+import six
+
+from oslo_policy import _checks
+from oslo_policy import _compiler
+
+
+class Inputs(object):
+    """The target and credential values a Check tree reads.
+
+    :ivar target_keys: frozenset of target keys substituted by the rule.
+    :ivar cred_paths: frozenset of credential paths, as tuples of keys,
+                      compared by the rule.
+    :ivar roles: frozenset of the lowercased roles the rule checks.
+    :ivar cacheable: False if the result of the rule may depend on anything
+                     else, e.g. an ``http:`` check or a check registered by
+                     the application.
+    """
+
+    def __init__(self, target_keys, cred_paths, roles, cacheable):
+        self.target_keys = frozenset(target_keys)
+        self.cred_paths = frozenset(cred_paths)
+        self.roles = frozenset(roles)
+        self.cacheable = cacheable
+
+        # Fixed orders, so that extracted values line up between calls
+        self._target_keys = tuple(sorted(self.target_keys))
+        self._cred_paths = tuple(sorted(self.cred_paths))
+
+    def extract(self, target, creds):
+        """Return the values of target and creds the rule reads.
+
+        :return: a hashable tuple, or None if the values cannot be extracted
+                 without evaluating the rule, e.g. because the credentials
+                 have no roles.
+        """
+
+        try:
+            values = []
+            for key in self._target_keys:
+                if key in target:
+                    values.append('%s' % (target[key],))
+                else:
+                    values.append(None)
+
+            for path in self._cred_paths:
+                value = creds
+                for part in path:
+                    value = value[part]
+                values.append(six.text_type(value))
+
+            if self.roles:
+                # Roles the rule does not check cannot change its result
+                values.append(_checks.role_set(creds) & self.roles)
+        except (KeyError, TypeError):
+            return None
+        return tuple(values)
+
+
+def get_inputs(check, rule_dict=None):
+    """Collect the inputs a Check tree reads.
+
+    :param check: The root of the Check tree.
+    :param rule_dict: The rules ``rule:`` checks are resolved against.
+    :return: an :class:`Inputs` instance.
+    """
+
+    target_keys = set()
+    cred_paths = set()
+    roles = set()
+    state = {'cacheable': True}
+    rule_dict = rule_dict or {}
+    resolving = set()
+
+    def visit(node):
+        if isinstance(node, _compiler.CompiledCheck):
+            visit(node.check)
+        elif isinstance(node, (_checks.TrueCheck, _checks.FalseCheck)):
+            pass
+        elif isinstance(node, _checks.NotCheck):
+            visit(node.rule)
+        elif isinstance(node, (_checks.AndCheck, _checks.OrCheck)):
+            for rule in node.rules:
+                visit(rule)
+        elif type(node) is _checks.RuleCheck:
+            if node.match in resolving:
+                # Recursive rules are never cached
+                state['cacheable'] = False
+                return
+            try:
+                rule = rule_dict[node.match]
+            except KeyError:
+                # Fails closed whatever the inputs
+                return
+            resolving.add(node.match)
+            visit(rule)
+            resolving.discard(node.match)
+        elif type(node) is _checks.RoleCheck:
+            roles.add(node.role)
+        elif type(node) is _checks.GenericCheck:
+            # Only "%(key)s" substitutions can be tracked
+            rest = node.match.replace('%%', '')
+            for key in node.target_keys:
+                rest = rest.replace('%%(%s)s' % key, '')
+            if '%' in rest:
+                state['cacheable'] = False
+            target_keys.update(node.target_keys)
+            if node.literal is None:
+                cred_paths.add(node.kind_parts)
+        else:
+            # http: checks and application-defined checks
+            state['cacheable'] = False
+
+    visit(check)
+    return Inputs(target_keys, cred_paths, roles, state['cacheable'])
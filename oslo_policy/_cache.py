@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import threading
+import time
+
+
+# Prefer a clock that cannot jump backwards when one is available
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class IdentityKey(object):
+    """A cache key made of the identity of an object.
+
+    For objects that are not hashable, such as dicts.  The key keeps the
+    object alive, so that its ``id()`` cannot be reused by another object
+    while the key is cached.
+
+    :param obj: The object.
+    """
+
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+    def __eq__(self, other):
+        return isinstance(other, IdentityKey) and self.obj is other.obj
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class LRUCache(object):
+    """A size-bounded mapping with least-recently-used eviction.
+
+    All operations are protected by a lock so that a single instance can be
+    shared by the threads of a WSGI worker.  Hit, miss and eviction counters
+    are kept so that the cache can be sized from real traffic.
+
+    :param maxsize: Maximum number of entries to keep.  A value of ``0``
+                    disables the cache; every lookup is then a miss.
+    :param ttl: Number of seconds an entry stays valid after it was set.
+                ``None`` keeps entries until they are evicted.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Return the value cached for key, or default on a miss."""
+
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires <= _clock():
+                self.misses += 1
+                return default
+
+            # Re-insert to mark the entry as the most recently used
+            self._data[key] = (value, expires)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Cache value under key, evicting the oldest entries if needed."""
+
+        if self.maxsize <= 0:
+            return
+
+        expires = None
+        if self.ttl is not None:
+            expires = _clock() + self.ttl
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Drop key from the cache and return its value, if any."""
+
+        with self._lock:
+            try:
+                return self._data.pop(key)[0]
+            except KeyError:
+                return default
+
+    def items(self):
+        """Return the (key, value) pairs of the valid entries.
+
+        The entries are not marked as used and counters are left untouched.
+        """
+
+        now = _clock()
+        with self._lock:
+            return [(key, value)
+                    for key, (value, expires) in self._data.items()
+                    if expires is None or expires > now]
+
+    def clear(self):
+        """Drop every entry.  Counters are left untouched."""
+
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return the cache counters as a dictionary."""
+
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'size': len(self._data),
+                    'maxsize': self.maxsize}
@@ -16,21 +16,141 @@
 #    under the License.
 import abc
 import ast
-import copy
+import logging
+import re
+import socket
+import threading
+import weakref
 
 from oslo_serialization import jsonutils
 import six
-import six.moves.urllib.parse as urlparse
-import six.moves.urllib.request as urlrequest
+from six.moves import http_client
+
+from oslo_policy import _http
+from oslo_policy._i18n import _LW
+
+
+LOG = logging.getLogger(__name__)
 
 
 registered_checks = {}
 
+# Matches the "%(key)s" substitutions of a target template
+_target_key_re = re.compile(r'%\(([^)]*)\)s')
+
+
+# The bit standing for each lowercased role in role masks.  Roles are only
+# given a bit when a compiled role expression checks them, so the number of
+# bits given so far also serves as the version of the registry.  It is shared
+# by the whole process and never shrinks: it grows with the distinct roles
+# the rules check, not with the roles of the credentials, and
+# has_role_bit() stops the compiler from asking for more than _MAX_ROLE_BITS
+# of them.
+_MAX_ROLE_BITS = 1024
+_role_bits = {}
+_role_bits_lock = threading.Lock()
+
+
+def has_role_bit(role):
+    """Whether a lowercased role has, or can still be given, a bit.
+
+    Role checks of the roles for which this is False are evaluated on the
+    role set instead of the role mask.
+    """
+
+    return role in _role_bits or len(_role_bits) < _MAX_ROLE_BITS
+
+
+def role_bit(role):
+    """Return the bit standing for a lowercased role in role masks."""
+
+    bit = _role_bits.get(role)
+    if bit is None:
+        with _role_bits_lock:
+            bit = _role_bits.get(role)
+            if bit is None:
+                bit = _role_bits[role] = 1 << len(_role_bits)
+    return bit
+
+
+def _mask_of(roles):
+    """Return the mask of the bits of roles, lowercased beforehand."""
+
+    bits = _role_bits
+    mask = 0
+    for role in roles:
+        mask |= bits.get(role.lower(), 0)
+    return mask
+
+
+class Credentials(dict):
+    """The credentials of a single enforcement.
+
+    Behaves exactly like the ``creds`` dict it wraps, and computes the
+    lowercased set of ``roles`` at most once, however many role checks are
+    evaluated against it.  Both are computed again once ``roles`` is set to
+    another list; changing the list itself in place is not noticed.
+    """
+
+    def __init__(self, creds):
+        super(Credentials, self).__init__(creds)
+        # (roles list, set)
+        self._role_set = None
+        # (roles list, registry version, mask), so that roles given a bit
+        # later are accounted for
+        self._role_mask = None
+
+    @property
+    def role_set(self):
+        """The lowercased roles of the credentials, as a frozenset."""
+
+        roles = self['roles']
+        cached = self._role_set
+        if cached is None or cached[0] is not roles:
+            cached = self._role_set = (
+                roles, frozenset(x.lower() for x in roles))
+        return cached[1]
+
+    @property
+    def role_mask(self):
+        """The roles of the credentials, as a mask of :func:`role_bit`."""
+
+        roles = self['roles']
+        version = len(_role_bits)
+        cached = self._role_mask
+        if cached is None or cached[0] is not roles or cached[1] != version:
+            cached = self._role_mask = (roles, version, _mask_of(roles))
+        return cached[2]
+
+
+def role_set(creds):
+    """Return the lowercased roles of creds as a set."""
+
+    if isinstance(creds, Credentials):
+        return creds.role_set
+    return frozenset(x.lower() for x in creds['roles'])
+
+
+def role_mask(creds):
+    """Return the roles of creds as a mask of :func:`role_bit`.
+
+    Roles without a bit, which no compiled role expression checks, are left
+    out.
+    """
+
+    if isinstance(creds, Credentials):
+        return creds.role_mask
+    return _mask_of(creds['roles'])
+
 
 @six.add_metaclass(abc.ABCMeta)
 class BaseCheck(object):
     """Abstract base class for Check classes."""
 
+    # Checks are allocated by the thousand; subclasses that do not need a
+    # __dict__ should declare __slots__ too.
+    __slots__ = ('__weakref__',)
+
     @abc.abstractmethod
     def __str__(self):
         """String representation of the Check tree rooted at this node."""
@@ -48,9 +168,29 @@ class BaseCheck(object):
         pass
 
 
-class FalseCheck(BaseCheck):
+class _SingletonCheck(BaseCheck):
+    """A check with no state, of which only one instance is ever created."""
+
+    __slots__ = ()
+
+    def __new__(cls):
+        instance = cls.__dict__.get('_instance')
+        if instance is None:
+            instance = super(_SingletonCheck, cls).__new__(cls)
+            cls._instance = instance
+        return instance
+
+    def __reduce__(self):
+        """Make copies and unpickled checks the single instance too."""
+
+        return self.__class__, ()
+
+
+class FalseCheck(_SingletonCheck):
     """A policy check that always returns ``False`` (disallow)."""
 
+    __slots__ = ()
+
     def __str__(self):
         """Return a string representation of this check."""
 
@@ -62,9 +202,11 @@ class FalseCheck(BaseCheck):
         return False
 
 
-class TrueCheck(BaseCheck):
+class TrueCheck(_SingletonCheck):
     """A policy check that always returns ``True`` (allow)."""
 
+    __slots__ = ()
+
     def __str__(self):
         """Return a string representation of this check."""
 
@@ -84,6 +226,8 @@ class Check(BaseCheck):
 
     """
 
+    __slots__ = ('kind', 'match')
+
     def __init__(self, kind, match):
         self.kind = kind
         self.match = match
@@ -103,6 +247,8 @@ class NotCheck(BaseCheck):
 
     """
 
+    __slots__ = ('rule',)
+
     def __init__(self, rule):
         self.rule = rule
 
@@ -129,6 +275,8 @@ class AndCheck(BaseCheck):
 
     """
 
+    __slots__ = ('rules',)
+
     def __init__(self, rules):
         self.rules = rules
 
@@ -173,6 +321,8 @@ class OrCheck(BaseCheck):
 
     """
 
+    __slots__ = ('rules',)
+
     def __init__(self, rules):
         self.rules = rules
 
@@ -233,6 +383,8 @@ def register(name, func=None):
 class RuleCheck(Check):
     """Recursively checks credentials based on the defined rules."""
 
+    __slots__ = ()
+
     def __call__(self, target, creds, rule_dict):
         try:
             return rule_dict[self.match](target, creds, rule_dict)
@@ -245,8 +397,14 @@ class RuleCheck(Check):
 class RoleCheck(Check):
     """Check that there is a matching role in the ``creds`` dict."""
 
+    __slots__ = ('role',)
+
+    def __init__(self, kind, match):
+        super(RoleCheck, self).__init__(kind, match)
+        self.role = match.lower()
+
     def __call__(self, target, creds, rule_dict):
-        return self.match.lower() in [x.lower() for x in creds['roles']]
+        return self.role in role_set(creds)
 
 
 @register('http')
@@ -257,23 +415,27 @@ class HttpCheck(Check):
     is exactly ``True``.
     """
 
+    __slots__ = ()
+
     def __call__(self, target, creds, rule_dict):
         url = ('http:' + self.match) % target
 
         # Convert instances of object() in target temporarily to
         # empty dict to avoid circular reference detection
         # errors in jsonutils.dumps().
-        temp_target = copy.deepcopy(target)
-        for key in target.keys():
-            element = target.get(key)
-            if type(element) is object:
-                temp_target[key] = {}
+        temp_target = dict((key, {} if type(element) is object else element)
+                           for key, element in target.items())
 
         data = {'target': jsonutils.dumps(temp_target),
                 'credentials': jsonutils.dumps(creds)}
-        post_data = urlparse.urlencode(data)
-        f = urlrequest.urlopen(url, post_data)
-        return f.read() == 'True'
+        try:
+            response = _http.get_client().post(url, data)
+        except (http_client.HTTPException, socket.error) as e:
+            # Covers timeouts too; fail closed
+            LOG.warning(_LW('Request to policy server %(url)s failed:'
+                            ' %(error)s'), {'url': url, 'error': e})
+            return False
+        return response == b'True'
 
 
 @register(None)
@@ -288,23 +450,81 @@ class GenericCheck(Check):
         - 'Member':%(role.name)s
     """
 
+    __slots__ = ('literal', 'kind_parts', 'target_keys', 'target_key',
+                 '_formatted')
+
+    def __init__(self, kind, match):
+        super(GenericCheck, self).__init__(kind, match)
+
+        # Classify the left-hand side once: either a literal, whose text is
+        # compared as-is, or a dotted path into the credentials.
+        try:
+            self.literal = six.text_type(ast.literal_eval(kind))
+            self.kind_parts = None
+        except (ValueError, SyntaxError):
+            self.literal = None
+            self.kind_parts = tuple(kind.split('.'))
+
+        # The target keys the match template references.  A template made
+        # of a single substitution is rendered by a plain lookup.
+        self.target_keys = tuple(_target_key_re.findall(match))
+        self.target_key = None
+        if (len(self.target_keys) == 1 and
+                match == '%%(%s)s' % self.target_keys[0]):
+            self.target_key = self.target_keys[0]
+        self._formatted = '%' in match
+
     def __call__(self, target, creds, rule_dict):
         try:
-            match = self.match % target
+            if self.target_key is not None:
+                match = '%s' % (target[self.target_key],)
+            elif self._formatted:
+                match = self.match % target
+            else:
+                match = self.match
         except KeyError:
             # While doing GenericCheck if key not
             # present in Target return false
             return False
 
+        if self.literal is not None:
+            return match == self.literal
+
         try:
-            # Try to interpret self.kind as a literal
-            leftval = ast.literal_eval(self.kind)
-        except ValueError:
-            try:
-                kind_parts = self.kind.split('.')
-                leftval = creds
-                for kind_part in kind_parts:
-                    leftval = leftval[kind_part]
-            except KeyError:
-                return False
+            leftval = creds
+            for kind_part in self.kind_parts:
+                leftval = leftval[kind_part]
+        except KeyError:
+            return False
         return match == six.text_type(leftval)
+
+
+# Leaf checks that only depend on their kind and match, and can therefore be
+# shared by every rule using them.
+_SHARED_CHECK_TYPES = (RuleCheck, RoleCheck, HttpCheck, GenericCheck)
+_shared_checks = weakref.WeakValueDictionary()
+
+
+def make_check(kind, match):
+    """Return the check of a kind, built by the check registered for it.
+
+    Identical built-in leaf checks are shared, so that the same check used
+    by many rules is only held in memory once.  Checks registered by the
+    application are always built anew.
+
+    :raises KeyError: if no check is registered for kind and there is no
+                      default check.
+    """
+
+    if kind in registered_checks:
+        factory = registered_checks[kind]
+    else:
+        factory = registered_checks[None]
+
+    key = (factory, kind, match)
+    check = _shared_checks.get(key)
+    if check is None:
+        check = factory(kind, match)
+        if type(check) in _SHARED_CHECK_TYPES:
+            _shared_checks[key] = check
+    return check
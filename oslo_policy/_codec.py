@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compact binary encoding of parsed rule sets.
+
+A buffer holds any number of named sections, each of them a rule set as
+stored by :class:`oslo_policy.policy.Rules`, i.e. a dict of services to a
+dict of permissions to Check trees.  All of it, services, permissions,
+check kinds and match templates alike, is stored once in a string table
+and referenced by index.
+
+Layout, all integers little-endian::
+
+    header     magic, version, string count, string table offset,
+               section count, section directory offset, metadata string
+    strings    (offset, length) pairs, then the UTF-8 data
+    sections   (name string, metadata string, offset, length) entries
+    bodies     the encoded sections
+
+A :class:`Reader` only decodes what is asked for: a section is decoded when
+it is loaded and a string when a loaded section uses it, so a buffer can be
+read straight from a memory-mapped file.
+"""
+
+import struct
+
+import six
+
+from oslo_policy import _checks
+from oslo_policy import _compiler
+
+
+MAGIC = b'OSLOPOL\0'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sIIIIII')
+_STRING = struct.Struct('<II')
+_SECTION = struct.Struct('<IIII')
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_CHECK = struct.Struct('<II')
+
+# Node opcodes
+_OP_TRUE = 0
+_OP_FALSE = 1
+_OP_NOT = 2
+_OP_AND = 3
+_OP_OR = 4
+_OP_CHECK = 5
+
+# How the default rule of a section is stored
+_DEFAULT_NONE = 0
+_DEFAULT_NAME = 1
+_DEFAULT_CHECK = 2
+
+# Marks an absent optional string
+_NO_STRING = 0xffffffff
+
+# Raised when reading past the end of a buffer or a table
+_OUT_OF_BOUNDS = (struct.error, IndexError)
+
+
+class _Encoder(object):
+
+    def __init__(self):
+        self.strings = []
+        self.string_ids = {}
+
+    def string(self, value):
+        if value is None:
+            return _NO_STRING
+        value = six.text_type(value)
+        try:
+            return self.string_ids[value]
+        except KeyError:
+            index = self.string_ids[value] = len(self.strings)
+            self.strings.append(value)
+            return index
+
+    def node(self, check, out):
+        if isinstance(check, _compiler.CompiledCheck):
+            check = check.check
+
+        if isinstance(check, _checks.TrueCheck):
+            out.append(_U8.pack(_OP_TRUE))
+        elif isinstance(check, _checks.FalseCheck):
+            out.append(_U8.pack(_OP_FALSE))
+        elif isinstance(check, _checks.NotCheck):
+            out.append(_U8.pack(_OP_NOT))
+            self.node(check.rule, out)
+        elif isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+            op = _OP_AND if isinstance(check, _checks.AndCheck) else _OP_OR
+            out.append(_U8.pack(op))
+            out.append(_U32.pack(len(check.rules)))
+            for rule in check.rules:
+                self.node(rule, out)
+        elif isinstance(check, _checks.Check):
+            out.append(_U8.pack(_OP_CHECK))
+            out.append(_CHECK.pack(self.string(check.kind),
+                                   self.string(check.match)))
+        else:
+            raise ValueError('Cannot encode check %r' % check)
+
+    def rules(self, rules):
+        out = []
+        default_rule = getattr(rules, 'default_rule', None)
+        if isinstance(default_rule, _checks.BaseCheck):
+            out.append(_U8.pack(_DEFAULT_CHECK))
+            self.node(default_rule, out)
+        elif default_rule:
+            out.append(_U8.pack(_DEFAULT_NAME))
+            out.append(_U32.pack(self.string(default_rule)))
+        else:
+            out.append(_U8.pack(_DEFAULT_NONE))
+
+        out.append(_U32.pack(len(rules)))
+        for serv in sorted(rules):
+            serv_rules = rules[serv]
+            out.append(_U32.pack(self.string(serv)))
+            out.append(_U32.pack(len(serv_rules)))
+            for perm in sorted(serv_rules):
+                out.append(_U32.pack(self.string(perm)))
+                self.node(serv_rules[perm], out)
+        return b''.join(out)
+
+
+def encode(sections, metadata=None):
+    """Encode rule sets into a buffer.
+
+    :param sections: dict mapping section names to rule sets, or to tuples
+                     of a rule set and a metadata string.
+    :param metadata: A string stored with the whole buffer.
+    :return: the encoded bytes.
+    :raises ValueError: if a rule holds a check that is neither one of the
+                        built-in operators nor a :class:`~_checks.Check`.
+    """
+
+    encoder = _Encoder()
+    entries = []
+    bodies = []
+    offset = 0
+    for name in sorted(sections):
+        rules = sections[name]
+        section_metadata = None
+        if isinstance(rules, tuple):
+            rules, section_metadata = rules
+        body = encoder.rules(rules)
+        entries.append((encoder.string(name),
+                        encoder.string(section_metadata), offset, len(body)))
+        bodies.append(body)
+        offset += len(body)
+    metadata_id = encoder.string(metadata)
+
+    data = [s.encode('utf-8') for s in encoder.strings]
+    strings_offset = _HEADER.size
+    data_offset = strings_offset + _STRING.size * len(data)
+    string_entries = []
+    position = data_offset
+    for item in data:
+        string_entries.append(_STRING.pack(position, len(item)))
+        position += len(item)
+    sections_offset = position
+    bodies_offset = sections_offset + _SECTION.size * len(entries)
+
+    out = [_HEADER.pack(MAGIC, VERSION, len(data), strings_offset,
+                        len(entries), sections_offset, metadata_id)]
+    out.extend(string_entries)
+    out.extend(data)
+    for name_id, metadata_id, offset, length in entries:
+        out.append(_SECTION.pack(name_id, metadata_id,
+                                 bodies_offset + offset, length))
+    out.extend(bodies)
+    return b''.join(out)
+
+
+class Reader(object):
+    """Decode rule sets from a buffer written by :func:`encode`.
+
+    :param buf: bytes, or any object supporting the buffer protocol such as
+                an ``mmap.mmap``.  It must not change while the reader is in
+                use.
+    :raises ValueError: if the buffer is not in a supported format, or is
+                        truncated or corrupt.
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        if len(buf) < _HEADER.size:
+            raise ValueError('Truncated policy buffer')
+        (magic, version, self._n_strings, self._strings_offset,
+         n_sections, sections_offset, metadata_id) = _HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            raise ValueError('Not a policy buffer')
+        if version != VERSION:
+            raise ValueError('Unsupported policy buffer version %d' % version)
+
+        if (self._strings_offset + self._n_strings * _STRING.size >
+                len(buf) or
+                sections_offset + n_sections * _SECTION.size > len(buf)):
+            raise ValueError('Truncated policy buffer')
+
+        self._strings = [None] * self._n_strings
+
+        self.metadata = self._string(metadata_id)
+        self._sections = {}
+        for i in range(n_sections):
+            name_id, meta_id, offset, length = _SECTION.unpack_from(
+                buf, sections_offset + i * _SECTION.size)
+            if offset + length > len(buf):
+                raise ValueError('Truncated policy buffer')
+            self._sections[self._string(name_id)] = (meta_id, offset, length)
+
+    def _string(self, index):
+        if index == _NO_STRING:
+            return None
+        try:
+            value = self._strings[index]
+        except IndexError:
+            raise ValueError('Corrupt policy buffer: string %d' % index)
+        if value is None:
+            offset, length = _STRING.unpack_from(
+                self.buf, self._strings_offset + index * _STRING.size)
+            if offset + length > len(self.buf):
+                raise ValueError('Truncated policy buffer')
+            value = self._strings[index] = (
+                bytes(self.buf[offset:offset + length]).decode('utf-8'))
+        return value
+
+    def sections(self):
+        """Return the names of the sections."""
+
+        return list(self._sections)
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    def section_metadata(self, name):
+        """Return the metadata string of a section.
+
+        :raises KeyError: if there is no such section.
+        """
+
+        return self._string(self._sections[name][0])
+
+    def load(self, name):
+        """Decode a section.
+
+        :return: tuple of a dict mapping services to dicts of permissions to
+                 Check trees, and the default rule.
+        :raises KeyError: if there is no such section.
+        :raises ValueError: if the section is corrupt.
+        """
+
+        _meta_id, offset, length = self._sections[name]
+        try:
+            return self._load(name, offset, length)
+        except _OUT_OF_BOUNDS as e:
+            raise ValueError('Corrupt policy buffer: section %s: %s' %
+                             (name, e))
+
+    def _load(self, name, offset, length):
+        pos = [offset]
+        buf = self.buf
+
+        def u8():
+            value = _U8.unpack_from(buf, pos[0])[0]
+            pos[0] += 1
+            return value
+
+        def u32():
+            value = _U32.unpack_from(buf, pos[0])[0]
+            pos[0] += 4
+            return value
+
+        def node():
+            op = u8()
+            if op == _OP_CHECK:
+                kind_id, match_id = _CHECK.unpack_from(buf, pos[0])
+                pos[0] += _CHECK.size
+                return self._leaf(kind_id, match_id)
+            elif op == _OP_TRUE:
+                return _checks.TrueCheck()
+            elif op == _OP_FALSE:
+                return _checks.FalseCheck()
+            elif op == _OP_NOT:
+                return _checks.NotCheck(node())
+            elif op in (_OP_AND, _OP_OR):
+                rules = [node() for _i in range(u32())]
+                if op == _OP_AND:
+                    return _checks.AndCheck(rules)
+                return _checks.OrCheck(rules)
+            raise ValueError('Corrupt policy buffer: opcode %d' % op)
+
+        default_kind = u8()
+        default_rule = None
+        if default_kind == _DEFAULT_NAME:
+            default_rule = self._string(u32())
+        elif default_kind == _DEFAULT_CHECK:
+            default_rule = node()
+
+        rules = {}
+        for _i in range(u32()):
+            serv = self._string(u32())
+            serv_rules = rules[serv] = {}
+            for _j in range(u32()):
+                perm = self._string(u32())
+                serv_rules[perm] = node()
+
+        if pos[0] != offset + length:
+            raise ValueError('Corrupt policy buffer: section %s' % name)
+        return rules, default_rule
+
+    def _leaf(self, kind_id, match_id):
+        kind = self._string(kind_id)
+        try:
+            return _checks.make_check(kind, self._string(match_id))
+        except KeyError:
+            raise ValueError('No handler for check kind %s' % kind)
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compile Check trees into specialized Python closures.
+
+Evaluating a Check tree costs a method call per node, and a
+:class:`~oslo_policy._checks.GenericCheck` redoes the classification of its
+kind on every call.  :func:`compile_check` turns a tree into a single
+callable with the same ``(target, creds, rule_dict)`` signature, where
+everything that only depends on the rule text is resolved once.
+
+The ``role:`` checks leading an ``and``/``or`` expression are compiled into
+one or two operations on the roles of the credentials encoded as an integer
+mask, which is computed once per request; see
+:func:`~oslo_policy._checks.role_mask`.
+
+Check types the compiler does not know about, such as ``http:`` checks or
+checks registered by the application, are called as they are.
+"""
+
+import six
+
+from oslo_policy import _checks
+
+
+class CompiledCheck(_checks.BaseCheck):
+    """A Check tree compiled into a single callable.
+
+    :param check: The Check tree that was compiled.
+    :param func: The compiled callable.
+    """
+
+    __slots__ = ('check', '_func')
+
+    def __init__(self, check, func):
+        self.check = check
+        self._func = func
+
+    def __str__(self):
+        """Return a string representation of the original Check tree."""
+
+        return str(self.check)
+
+    def __call__(self, target, cred, rule_dict):
+        """Check the policy."""
+
+        return self._func(target, cred, rule_dict)
+
+
+class RoleMaskCheck(CompiledCheck):
+    """An and/or expression whose leading role checks use the role mask.
+
+    Its other branches are called as they are.
+
+    :param check: The expression, see :func:`fold_roles`.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, check):
+        super(RoleMaskCheck, self).__init__(
+            check, _compile_role_mask(check, lambda rule: rule))
+
+
+def compile_check(check):
+    """Compile a Check tree.
+
+    :param check: The root of the Check tree.
+    :return: A :class:`CompiledCheck`, or check itself if it is compiled
+             already or holds no and/or expression: such a check is
+             evaluated in a call or two, which compiling would only wrap in
+             one more.
+    """
+
+    if isinstance(check, CompiledCheck) or not _has_group(check):
+        return check
+    return CompiledCheck(check, _compile(check))
+
+
+def _has_group(check):
+    while type(check) is _checks.NotCheck:
+        check = check.rule
+    return type(check) in (_checks.AndCheck, _checks.OrCheck)
+
+
+def fold_roles(check):
+    """Make the and/or expressions of a Check tree use the role mask.
+
+    Unlike :func:`compile_check`, only the expressions starting with role
+    checks are replaced, by :class:`RoleMaskCheck` instances; the rest of
+    the tree is left as it is.
+
+    :param check: The root of the Check tree.
+    """
+
+    if type(check) is _checks.NotCheck:
+        rule = fold_roles(check.rule)
+        if rule is check.rule:
+            return check
+        return _checks.NotCheck(rule)
+    elif type(check) in (_checks.AndCheck, _checks.OrCheck):
+        leading = _mask_prefix(check)
+        rules = (list(check.rules[:leading]) +
+                 [fold_roles(r) for r in check.rules[leading:]])
+        if leading:
+            return RoleMaskCheck(check.__class__(rules))
+        elif any(a is not b for a, b in zip(rules, check.rules)):
+            return check.__class__(rules)
+    return check
+
+
+def _role_expression_size(node):
+    """Return the number of role checks of a role expression, else 0.
+
+    Role checks of roles which cannot be given a bit any more do not count
+    as role expressions.
+    """
+
+    if type(node) is _checks.RoleCheck:
+        return 1 if _checks.has_role_bit(node.role) else 0
+    elif type(node) is _checks.NotCheck:
+        return _role_expression_size(node.rule)
+    elif type(node) in (_checks.AndCheck, _checks.OrCheck):
+        size = 0
+        for rule in node.rules:
+            rule_size = _role_expression_size(rule)
+            if not rule_size:
+                return 0
+            size += rule_size
+        return size
+    return 0
+
+
+def _mask_prefix(node):
+    """Return how many leading branches of an and/or are role expressions.
+
+    Returns 0 unless they hold at least two role checks between them, below
+    which the role mask does not pay off.
+    """
+
+    if type(node) not in (_checks.AndCheck, _checks.OrCheck):
+        return 0
+    leading = size = 0
+    for rule in node.rules:
+        rule_size = _role_expression_size(rule)
+        if not rule_size:
+            break
+        leading += 1
+        size += rule_size
+    return leading if size > 1 else 0
+
+
+def _compile(node):
+    if _mask_prefix(node):
+        return _compile_role_mask(node, _compile)
+
+    compiler = _compilers.get(type(node))
+    if compiler is None:
+        if isinstance(node, CompiledCheck):
+            return node._func
+        # Unknown check types are evaluated the usual way
+        return node
+    return compiler(node)
+
+
+def _compile_true(node):
+    def check(target, creds, rule_dict):
+        return True
+    return check
+
+
+def _compile_false(node):
+    def check(target, creds, rule_dict):
+        return False
+    return check
+
+
+def _compile_not(node):
+    rule = _compile(node.rule)
+
+    def check(target, creds, rule_dict):
+        return not rule(target, creds, rule_dict)
+    return check
+
+
+def _compile_and(node):
+    rules = tuple(_compile(r) for r in node.rules)
+
+    if len(rules) == 2:
+        first, second = rules
+
+        def check(target, creds, rule_dict):
+            if first(target, creds, rule_dict):
+                if second(target, creds, rule_dict):
+                    return True
+            return False
+        return check
+
+    def check(target, creds, rule_dict):
+        for rule in rules:
+            if not rule(target, creds, rule_dict):
+                return False
+        return True
+    return check
+
+
+def _compile_or(node):
+    rules = tuple(_compile(r) for r in node.rules)
+
+    if len(rules) == 2:
+        first, second = rules
+
+        def check(target, creds, rule_dict):
+            if first(target, creds, rule_dict):
+                return True
+            if second(target, creds, rule_dict):
+                return True
+            return False
+        return check
+
+    def check(target, creds, rule_dict):
+        for rule in rules:
+            if rule(target, creds, rule_dict):
+                return True
+        return False
+    return check
+
+
+def _compile_rule(node):
+    name = node.match
+
+    def check(target, creds, rule_dict):
+        try:
+            return rule_dict[name](target, creds, rule_dict)
+        except KeyError:
+            # We don't have any matching rule; fail closed
+            return False
+    return check
+
+
+def _compile_role(node):
+    role = node.role
+    role_set = _checks.role_set
+
+    def check(target, creds, rule_dict):
+        return role in role_set(creds)
+    return check
+
+
+def _compile_role_mask(node, compile_rule):
+    """Compile an and/or expression starting with role expressions.
+
+    The leading role expressions are tested on the role mask, and the other
+    branches, compiled with compile_rule, are evaluated after them as
+    before.
+    """
+
+    leading = _mask_prefix(node)
+    test = _compile_mask_test(node.__class__(list(node.rules[:leading])))
+    others = tuple(compile_rule(r) for r in node.rules[leading:])
+    role_mask = _checks.role_mask
+
+    if not others:
+        def check(target, creds, rule_dict):
+            return test(role_mask(creds))
+        return check
+
+    if type(node) is _checks.AndCheck:
+        def check(target, creds, rule_dict):
+            if not test(role_mask(creds)):
+                return False
+            for other in others:
+                if not other(target, creds, rule_dict):
+                    return False
+            return True
+        return check
+
+    def check(target, creds, rule_dict):
+        if test(role_mask(creds)):
+            return True
+        for other in others:
+            if other(target, creds, rule_dict):
+                return True
+        return False
+    return check
+
+
+def _compile_mask_test(node):
+    """Compile a role expression into a function of the role mask.
+
+    The role checks and negated role checks of an and/or expression are
+    merged into a single mask each, tested with one or two operations.
+    Since the mask is computed up front, the order in which the branches
+    are tested does not matter.
+    """
+
+    if type(node) is _checks.RoleCheck:
+        bit = _checks.role_bit(node.role)
+
+        def test(mask):
+            return (mask & bit) != 0
+        return test
+
+    if type(node) is _checks.NotCheck:
+        inner = _compile_mask_test(node.rule)
+
+        def test(mask):
+            return not inner(mask)
+        return test
+
+    # The bits of the roles checked, and of the negated roles checked
+    present = 0
+    absent = 0
+    others = []
+    for rule in node.rules:
+        if type(rule) is _checks.RoleCheck:
+            present |= _checks.role_bit(rule.role)
+        elif (type(rule) is _checks.NotCheck and
+                type(rule.rule) is _checks.RoleCheck):
+            absent |= _checks.role_bit(rule.rule.role)
+        else:
+            others.append(_compile_mask_test(rule))
+    others = tuple(others)
+
+    if type(node) is _checks.AndCheck:
+        def test(mask):
+            # Every role held, none of the negated ones
+            if (mask & present) != present or mask & absent:
+                return False
+            for other in others:
+                if not other(mask):
+                    return False
+            return True
+        return test
+
+    def test(mask):
+        # Any role held, or any negated one missing
+        if mask & present or (mask & absent) != absent:
+            return True
+        for other in others:
+            if other(mask):
+                return True
+        return False
+    return test
+
+
+def _compile_target_accessor(node):
+    """Return a function rendering the match template against the target.
+
+    The function raises KeyError if the target lacks a referenced key.
+    """
+
+    template = node.match
+
+    if node.target_key is not None:
+        key = node.target_key
+
+        def render(target):
+            return '%s' % (target[key],)
+        return render
+
+    if '%' not in template:
+        def render(target):
+            return template
+        return render
+
+    def render(target):
+        return template % target
+    return render
+
+
+def _compile_generic(node):
+    render = _compile_target_accessor(node)
+
+    if node.literal is not None:
+        leftval = node.literal
+
+        def check(target, creds, rule_dict):
+            try:
+                match = render(target)
+            except KeyError:
+                return False
+            return match == leftval
+        return check
+
+    kind_parts = node.kind_parts
+
+    if len(kind_parts) == 1:
+        kind = kind_parts[0]
+
+        def check(target, creds, rule_dict):
+            try:
+                match = render(target)
+                leftval = creds[kind]
+            except KeyError:
+                return False
+            return match == six.text_type(leftval)
+        return check
+
+    def check(target, creds, rule_dict):
+        try:
+            match = render(target)
+            leftval = creds
+            for kind_part in kind_parts:
+                leftval = leftval[kind_part]
+        except KeyError:
+            return False
+        return match == six.text_type(leftval)
+    return check
+
+
+_compilers = {
+    _checks.TrueCheck: _compile_true,
+    _checks.FalseCheck: _compile_false,
+    _checks.NotCheck: _compile_not,
+    _checks.AndCheck: _compile_and,
+    _checks.OrCheck: _compile_or,
+    _checks.RuleCheck: _compile_rule,
+    _checks.RoleCheck: _compile_role,
+    _checks.GenericCheck: _compile_generic,
+}
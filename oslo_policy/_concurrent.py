@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Concurrent evaluation of ``http:`` checks.
+
+When several branches of an ``and``/``or`` expression call remote policy
+servers, evaluating them one after the other adds up their latencies.
+:func:`parallelize` rewrites such expressions so that those branches are
+sent concurrently through a thread pool.  An ``or`` resolves on the first
+branch that accepts and an ``and`` on the first one that rejects; the
+requests that did not start yet are then cancelled.
+
+The branches that do not call remote servers are evaluated first, in
+order, and the remote ones only if none of them decided.  This departs
+from the left-to-right order of the expression: a remote branch written
+before a local one is evaluated after it, or not at all.  When no branch
+decides and some raised, the exception of the leftmost of them is raised,
+whatever the order in which they completed.
+
+Expressions nested in a branch that already runs in the thread pool
+evaluate their branches one after the other in that thread: waiting there
+for other threads of the pool could exhaust it and deadlock.
+"""
+
+from concurrent import futures
+import threading
+
+from oslo_policy import _checks
+from oslo_policy import _http
+
+
+def _contains_http(check):
+    if isinstance(check, _checks.HttpCheck):
+        return True
+    elif isinstance(check, _checks.NotCheck):
+        return _contains_http(check.rule)
+    elif isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+        return any(_contains_http(r) for r in check.rules)
+    return False
+
+
+def _split(rules):
+    """Split rules into local ones and ones calling remote servers."""
+
+    local = []
+    remote = []
+    for rule in rules:
+        (remote if _contains_http(rule) else local).append(rule)
+    return local, remote
+
+
+# Whether the current thread evaluates a branch for _any_concurrently()
+_in_pool = threading.local()
+
+
+def _evaluate_in_pool(rule, target, creds, rule_dict):
+    _in_pool.active = True
+    try:
+        return rule(target, creds, rule_dict)
+    finally:
+        _in_pool.active = False
+
+
+def _any_concurrently(rules, target, creds, rule_dict, expected):
+    """Whether any of rules evaluates to expected, evaluated concurrently.
+
+    Returns as soon as one rule does, cancelling the evaluations that did
+    not start yet.  In a thread of the pool, rules are evaluated in order
+    instead.
+
+    :raises: the exception raised by the leftmost rule that raised, if
+             none evaluates to expected.
+    """
+
+    if getattr(_in_pool, 'active', False):
+        error = None
+        for rule in rules:
+            try:
+                if bool(rule(target, creds, rule_dict)) is expected:
+                    return True
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+        return False
+
+    executor = _http.get_executor()
+    pending = [executor.submit(_evaluate_in_pool, rule, target, creds,
+                               rule_dict)
+               for rule in rules]
+    try:
+        for future in futures.as_completed(pending):
+            if (future.exception() is None and
+                    bool(future.result()) is expected):
+                return True
+        for future in pending:
+            # Every one completed, in the order of the rules
+            if future.exception() is not None:
+                raise future.exception()
+        return False
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class ConcurrentAndCheck(_checks.AndCheck):
+    """An "and" whose remote branches are evaluated concurrently.
+
+    Local branches are evaluated first, in order, even those written after
+    remote branches.  If they all accept, the remote branches are evaluated
+    concurrently; if none rejects and some raise, the exception of the
+    leftmost of them is raised.
+    """
+
+    __slots__ = ('_local', '_remote')
+
+    def __init__(self, rules):
+        super(ConcurrentAndCheck, self).__init__(rules)
+        self._local, self._remote = _split(rules)
+
+    def __call__(self, target, cred, rule_dict):
+        for rule in self._local:
+            if not rule(target, cred, rule_dict):
+                return False
+        return not _any_concurrently(self._remote, target, cred, rule_dict,
+                                     False)
+
+    def add_check(self, rule):
+        raise TypeError('%s cannot be extended' % self.__class__.__name__)
+
+
+class ConcurrentOrCheck(_checks.OrCheck):
+    """An "or" whose remote branches are evaluated concurrently.
+
+    Local branches are evaluated first, in order, even those written after
+    remote branches.  If none accepts, the remote branches are evaluated
+    concurrently; if none accepts and some raise, the exception of the
+    leftmost of them is raised.
+    """
+
+    __slots__ = ('_local', '_remote')
+
+    def __init__(self, rules):
+        super(ConcurrentOrCheck, self).__init__(rules)
+        self._local, self._remote = _split(rules)
+
+    def __call__(self, target, cred, rule_dict):
+        for rule in self._local:
+            if rule(target, cred, rule_dict):
+                return True
+        return _any_concurrently(self._remote, target, cred, rule_dict, True)
+
+    def add_check(self, rule):
+        raise TypeError('%s cannot be extended' % self.__class__.__name__)
+
+
+def parallelize(check):
+    """Return check with independent remote branches evaluated concurrently.
+
+    Only ``and``/``or`` expressions with at least two branches that contain
+    ``http:`` checks are rewritten; anything else is returned as it is.
+    """
+
+    if isinstance(check, _checks.NotCheck):
+        rule = parallelize(check.rule)
+        if rule is check.rule:
+            return check
+        return _checks.NotCheck(rule)
+
+    if type(check) not in (_checks.AndCheck, _checks.OrCheck):
+        return check
+
+    rules = [parallelize(r) for r in check.rules]
+    if len(_split(rules)[1]) < 2:
+        return check.__class__(rules)
+    if isinstance(check, _checks.AndCheck):
+        return ConcurrentAndCheck(rules)
+    return ConcurrentOrCheck(rules)
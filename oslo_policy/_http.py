@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""HTTP client used by ``http:`` checks.
+
+Connections to each remote policy server are kept alive and reused, every
+request is bounded by connect and read timeouts, the number of requests in
+flight can be limited, and responses can be cached for a short while.
+"""
+
+from concurrent import futures
+import hashlib
+import socket
+import threading
+
+import six
+from six.moves import http_client
+import six.moves.urllib.parse as urlparse
+
+from oslo_policy import _cache
+
+
+class HttpClient(object):
+    """A keep-alive HTTP client with timeouts and a response cache.
+
+    :param connect_timeout: Seconds to wait for a connection, or None to
+                            wait forever.
+    :param read_timeout: Seconds to wait for a response, or None to wait
+                         forever.
+    :param max_concurrency: Maximum number of requests in flight; further
+                            requests wait for a free slot.  0 means no limit.
+    :param pool_size: Maximum number of idle connections kept per server.
+    :param cache_ttl: Seconds a response is cached, keyed on the URL and a
+                      hash of the request body.  0 disables the cache.
+    :param cache_size: Maximum number of cached responses.
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None,
+                 max_concurrency=0, pool_size=10, cache_ttl=0,
+                 cache_size=1024):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+
+        self._semaphore = None
+        if max_concurrency > 0:
+            self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        self._cache = _cache.LRUCache(cache_size if cache_ttl > 0 else 0,
+                                      ttl=cache_ttl)
+
+        # Idle connections, per (host, port)
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, server):
+        conn = http_client.HTTPConnection(server[0], server[1],
+                                          timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    def _get_connection(self, server):
+        """Return an idle connection to server, and whether it was reused."""
+
+        with self._lock:
+            idle = self._pools.get(server)
+            if idle:
+                return idle.pop(), True
+        return self._connect(server), False
+
+    def _release(self, server, conn):
+        with self._lock:
+            idle = self._pools.setdefault(server, [])
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _request(self, server, path, body, headers):
+        """Send a request and return the response, with its body read."""
+
+        conn, reused = self._get_connection(server)
+        try:
+            conn.request('POST', path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (http_client.HTTPException, socket.error) as e:
+            conn.close()
+            if not reused or isinstance(e, socket.timeout):
+                raise
+            # The server closed the idle connection, retry on a new one
+            conn = self._connect(server)
+            try:
+                conn.request('POST', path, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(server, conn)
+        return response, data
+
+    def post(self, url, data):
+        """POST form data to url and return the response body.
+
+        :param url: The URL to post to.
+        :param data: dict of form fields.
+        :raises: socket.error, including timeouts, or
+                 http_client.HTTPException if the request failed or the
+                 response status is not 2xx.
+        """
+
+        body = urlparse.urlencode(data)
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+
+        key = (url, hashlib.sha1(body).hexdigest())
+        result = self._cache.get(key)
+        if result is not None:
+            return result
+
+        parts = urlparse.urlsplit(url)
+        server = (parts.hostname, parts.port or 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        try:
+            response, result = self._request(server, path, body, headers)
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+        if not 200 <= response.status < 300:
+            raise http_client.HTTPException(
+                'HTTP %s %s from %s' % (response.status, response.reason,
+                                        url))
+        self._cache.set(key, result)
+        return result
+
+    def close(self):
+        """Close every idle connection."""
+
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for idle in pools.values():
+            for conn in idle:
+                conn.close()
+
+
+_client = HttpClient()
+_client_settings = None
+_client_lock = threading.Lock()
+
+_executor = None
+_executor_workers = 8
+
+
+def get_client():
+    """Return the client shared by all ``http:`` checks."""
+
+    return _client
+
+
+def get_executor():
+    """Return the thread pool concurrent ``http:`` checks run in."""
+
+    global _executor
+
+    if _executor is None:
+        with _client_lock:
+            if _executor is None:
+                _executor = futures.ThreadPoolExecutor(_executor_workers)
+    return _executor
+
+
+def configure(conf):
+    """Configure the shared client from the ``[oslo_policy]`` options.
+
+    Calling this again with the same settings, e.g. from another Enforcer,
+    changes nothing.  When the settings changed, a new client, or thread
+    pool, is used from then on; the previous one is left alone, so that
+    the checks still using it complete, and is closed once they dropped it.
+    """
+
+    global _client, _client_settings, _executor, _executor_workers
+
+    opts = conf.oslo_policy
+
+    with _client_lock:
+        if opts.http_check_max_workers != _executor_workers:
+            # The idle threads of the previous pool exit once it is no
+            # longer referenced.
+            _executor = None
+            _executor_workers = opts.http_check_max_workers
+
+    settings = (opts.http_check_connect_timeout,
+                opts.http_check_read_timeout,
+                opts.http_check_max_concurrency,
+                opts.http_check_pool_size,
+                opts.http_check_cache_time,
+                opts.http_check_cache_size)
+
+    with _client_lock:
+        if settings == _client_settings:
+            return
+        _client = HttpClient(*settings)
+        _client_settings = settings
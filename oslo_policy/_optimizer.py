@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Simplify parsed Check trees.
+
+:func:`optimize` rewrites a Check tree into an equivalent one that is
+cheaper to evaluate:
+
+* nested ``and``/``or`` groups are flattened into their parent,
+* ``@`` and ``!`` are folded into the surrounding expression, as is a
+  double ``not`` over a check that returns a boolean,
+* duplicated checks in the same group are evaluated once,
+* ``rule:`` references are inlined when that cannot change the result,
+* the checks of a group are ordered so that cheap ones run before
+  expensive ones, as long as none of them may raise.
+
+The rewritten tree returns the same result, or raises the same exception,
+as the original one.  Since checks are expected to be free of side
+effects, an expensive check may simply be skipped more often.  A check
+that may raise, such as a role check against credentials without roles,
+is never moved nor skipped more often, so the checks of a group are only
+reordered between two such checks.
+"""
+
+from oslo_policy import _checks
+
+
+# Relative cost of evaluating a leaf check
+_COST_CONSTANT = 0
+_COST_ROLE = 1
+_COST_GENERIC = 2
+_COST_RULE = 3
+_COST_CUSTOM = 5
+_COST_HTTP = 10
+
+# Check types whose result is always a boolean
+_BOOLEAN_CHECKS = (_checks.TrueCheck, _checks.FalseCheck, _checks.NotCheck,
+                   _checks.AndCheck, _checks.OrCheck, _checks.RoleCheck,
+                   _checks.GenericCheck, _checks.HttpCheck)
+
+
+# What a rule: check to a missing rule amounts to
+_MISSING = _checks.FalseCheck()
+
+
+def _referenced(check, rule_dict, resolving):
+    """Return the rule a ``rule:`` check refers to.
+
+    :return: the rule, _MISSING if rule_dict has none by that name, or None
+             if it is unknown: rule_dict is None or the rule is recursive.
+    """
+
+    if rule_dict is None or check.match in resolving:
+        return None
+    return rule_dict.get(check.match, _MISSING)
+
+
+def cost(check, rule_dict=None, _resolving=frozenset()):
+    """Estimate the relative cost of evaluating a Check tree.
+
+    :param rule_dict: The rules ``rule:`` checks refer to, whose cost adds
+                      up to theirs.  If None, the rules are unknown and
+                      assumed to be as expensive as an ``http:`` check.
+    """
+
+    if isinstance(check, (_checks.TrueCheck, _checks.FalseCheck)):
+        return _COST_CONSTANT
+    elif isinstance(check, _checks.NotCheck):
+        return cost(check.rule, rule_dict, _resolving)
+    elif isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+        return sum(cost(r, rule_dict, _resolving) for r in check.rules)
+    elif type(check) is _checks.RoleCheck:
+        return _COST_ROLE
+    elif type(check) is _checks.GenericCheck:
+        return _COST_GENERIC
+    elif type(check) is _checks.RuleCheck:
+        rule = _referenced(check, rule_dict, _resolving)
+        if rule is None:
+            return _COST_RULE + _COST_HTTP
+        return _COST_RULE + cost(rule, rule_dict,
+                                 _resolving | frozenset([check.match]))
+    elif isinstance(check, _checks.HttpCheck):
+        return _COST_HTTP
+    return _COST_CUSTOM
+
+
+def _is_boolean(check):
+    return type(check) in _BOOLEAN_CHECKS
+
+
+def may_raise(check, rule_dict=None, _resolving=frozenset()):
+    """Whether evaluating check may raise.
+
+    Role checks raise KeyError when the credentials have no roles,
+    ``http:`` checks when the target lacks a key of their URL, and checks
+    registered by the application may raise anything.  Generic checks turn
+    missing keys into False.  A ``rule:`` check may raise what the rule it
+    refers to does, other than KeyError, so it is only known not to raise
+    when that rule cannot raise at all.
+
+    :param rule_dict: The rules ``rule:`` checks refer to.  If None, they
+                      are unknown and may raise.
+    """
+
+    if isinstance(check, (_checks.TrueCheck, _checks.FalseCheck)):
+        return False
+    elif isinstance(check, _checks.NotCheck):
+        return may_raise(check.rule, rule_dict, _resolving)
+    elif isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+        return any(may_raise(r, rule_dict, _resolving) for r in check.rules)
+    elif type(check) is _checks.GenericCheck:
+        return False
+    elif type(check) is _checks.RuleCheck:
+        rule = _referenced(check, rule_dict, _resolving)
+        if rule is None:
+            return True
+        return may_raise(rule, rule_dict,
+                         _resolving | frozenset([check.match]))
+    return True
+
+
+def _sort_by_cost(rules, rule_dict=None):
+    """Sort the runs of checks that cannot raise between those that may."""
+
+    def key(rule):
+        return cost(rule, rule_dict)
+
+    arranged = []
+    run = []
+    for rule in rules:
+        if may_raise(rule, rule_dict):
+            arranged.extend(sorted(run, key=key))
+            run = []
+            arranged.append(rule)
+        else:
+            run.append(rule)
+    # sorted() is stable, so ties keep their order
+    arranged.extend(sorted(run, key=key))
+    return arranged
+
+
+def _check_key(check):
+    """Identify checks that always return the same result."""
+
+    return (type(check), str(check))
+
+
+class _Optimizer(object):
+
+    def __init__(self, rule_dict):
+        self.rule_dict = rule_dict
+        self.resolving = set()
+
+    def visit(self, check):
+        if isinstance(check, _checks.NotCheck):
+            return self.visit_not(check)
+        elif isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+            return self.visit_group(check)
+        elif type(check) is _checks.RuleCheck and self.rule_dict is not None:
+            return self.visit_rule(check)
+        return check
+
+    def visit_not(self, check):
+        rule = self.visit(check.rule)
+        if isinstance(rule, _checks.TrueCheck):
+            return _checks.FalseCheck()
+        elif isinstance(rule, _checks.FalseCheck):
+            return _checks.TrueCheck()
+        elif isinstance(rule, _checks.NotCheck) and _is_boolean(rule.rule):
+            return rule.rule
+        return _checks.NotCheck(rule)
+
+    def visit_group(self, check):
+        is_and = isinstance(check, _checks.AndCheck)
+        cls = _checks.AndCheck if is_and else _checks.OrCheck
+        # The constant that decides the group, and the one that is neutral
+        absorbing = _checks.FalseCheck if is_and else _checks.TrueCheck
+        neutral = _checks.TrueCheck if is_and else _checks.FalseCheck
+
+        rules = []
+        seen = set()
+        for rule in check.rules:
+            rule = self.visit(rule)
+            # Flatten a nested group of the same kind into this one
+            members = rule.rules if type(rule) is cls else [rule]
+            for member in members:
+                if isinstance(member, absorbing):
+                    if any(may_raise(r, self.rule_dict) for r in rules):
+                        # The checks before still decide whether it raises;
+                        # the ones after are never evaluated.
+                        rules.append(member)
+                        return cls(_sort_by_cost(rules, self.rule_dict))
+                    return absorbing()
+                if isinstance(member, neutral):
+                    continue
+                key = _check_key(member)
+                if key in seen:
+                    continue
+                seen.add(key)
+                rules.append(member)
+
+        if not rules:
+            return neutral()
+        if len(rules) == 1 and _is_boolean(rules[0]):
+            return rules[0]
+
+        # Cheap checks first
+        return cls(_sort_by_cost(rules, self.rule_dict))
+
+    def visit_rule(self, check):
+        name = check.match
+        if name in self.resolving:
+            # Recursive rule, leave it alone
+            return check
+
+        try:
+            rule = self.rule_dict[name]
+        except KeyError:
+            # We don't have any matching rule; fail closed
+            return _checks.FalseCheck()
+
+        self.resolving.add(name)
+        try:
+            rule = self.visit(rule)
+        finally:
+            self.resolving.discard(name)
+
+        # A "rule:" check turns a KeyError raised by the rule it references
+        # into a False result
+        if may_raise(rule, self.rule_dict):
+            return check
+        return rule
+
+
+def optimize(check, rule_dict=None):
+    """Return a simplified Check tree equivalent to check.
+
+    :param check: The root of the Check tree.
+    :param rule_dict: The rules ``rule:`` checks are resolved against when the
+                      tree is evaluated.  If given, references to them are
+                      inlined; the rules must not change afterwards.  If
+                      None, ``rule:`` checks are left as they are.
+    """
+
+    return _Optimizer(rule_dict).visit(check)
@@ -18,8 +18,6 @@
 import logging
 import re
 
-import six
-
 from oslo_policy import _checks
 from oslo_policy._i18n import _LE
 
@@ -27,166 +25,6 @@ from oslo_policy._i18n import _LE
 LOG = logging.getLogger(__name__)
 
 
-def reducer(*tokens):
-    """Decorator for reduction methods.
-
-    Arguments are a sequence of tokens, in order, which should trigger running
-    this reduction method.
-    """
-
-    def decorator(func):
-        # Make sure we have a list of reducer sequences
-        if not hasattr(func, 'reducers'):
-            func.reducers = []
-
-        # Add the tokens to the list of reducer sequences
-        func.reducers.append(list(tokens))
-
-        return func
-
-    return decorator
-
-
-class ParseStateMeta(type):
-    """Metaclass for the :class:`.ParseState` class.
-
-    Facilitates identifying reduction methods.
-    """
-
-    def __new__(mcs, name, bases, cls_dict):
-        """Create the class.
-
-        Injects the 'reducers' list, a list of tuples matching token sequences
-        to the names of the corresponding reduction methods.
-        """
-
-        reducers = []
-
-        for key, value in cls_dict.items():
-            if not hasattr(value, 'reducers'):
-                continue
-            for reduction in value.reducers:
-                reducers.append((reduction, key))
-
-        cls_dict['reducers'] = reducers
-
-        return super(ParseStateMeta, mcs).__new__(mcs, name, bases, cls_dict)
-
-
-@six.add_metaclass(ParseStateMeta)
-class ParseState(object):
-    """Implement the core of parsing the policy language.
-
-    Uses a greedy reduction algorithm to reduce a sequence of tokens into
-    a single terminal, the value of which will be the root of the
-    :class:`Check` tree.
-
-    .. note::
-
-        Error reporting is rather lacking.  The best we can get with this
-        parser formulation is an overall "parse failed" error. Fortunately, the
-        policy language is simple enough that this shouldn't be that big a
-        problem.
-    """
-
-    def __init__(self):
-        """Initialize the ParseState."""
-
-        self.tokens = []
-        self.values = []
-
-    def reduce(self):
-        """Perform a greedy reduction of the token stream.
-
-        If a reducer method matches, it will be executed, then the
-        :meth:`reduce` method will be called recursively to search for any more
-        possible reductions.
-        """
-
-        for reduction, methname in self.reducers:
-            if (len(self.tokens) >= len(reduction) and
-                    self.tokens[-len(reduction):] == reduction):
-                # Get the reduction method
-                meth = getattr(self, methname)
-
-                # Reduce the token stream
-                results = meth(*self.values[-len(reduction):])
-
-                # Update the tokens and values
-                self.tokens[-len(reduction):] = [r[0] for r in results]
-                self.values[-len(reduction):] = [r[1] for r in results]
-
-                # Check for any more reductions
-                return self.reduce()
-
-    def shift(self, tok, value):
-        """Adds one more token to the state.
-
-        Calls :meth:`reduce`.
-        """
-
-        self.tokens.append(tok)
-        self.values.append(value)
-
-        # Do a greedy reduce...
-        self.reduce()
-
-    @property
-    def result(self):
-        """Obtain the final result of the parse.
-
-        :raises ValueError: If the parse failed to reduce to a single result.
-        """
-
-        if len(self.values) != 1:
-            raise ValueError('Could not parse rule')
-        return self.values[0]
-
-    @reducer('(', 'check', ')')
-    @reducer('(', 'and_expr', ')')
-    @reducer('(', 'or_expr', ')')
-    def _wrap_check(self, _p1, check, _p2):
-        """Turn parenthesized expressions into a 'check' token."""
-
-        return [('check', check)]
-
-    @reducer('check', 'and', 'check')
-    def _make_and_expr(self, check1, _and, check2):
-        """Create an 'and_expr'.
-
-        Join two checks by the 'and' operator.
-        """
-
-        return [('and_expr', _checks.AndCheck([check1, check2]))]
-
-    @reducer('and_expr', 'and', 'check')
-    def _extend_and_expr(self, and_expr, _and, check):
-        """Extend an 'and_expr' by adding one more check."""
-
-        return [('and_expr', and_expr.add_check(check))]
-
-    @reducer('check', 'or', 'check')
-    def _make_or_expr(self, check1, _or, check2):
-        """Create an 'or_expr'.
-
-        Join two checks by the 'or' operator.
-        """
-
-        return [('or_expr', _checks.OrCheck([check1, check2]))]
-
-    @reducer('or_expr', 'or', 'check')
-    def _extend_or_expr(self, or_expr, _or, check):
-        """Extend an 'or_expr' by adding one more check."""
-
-        return [('or_expr', or_expr.add_check(check))]
-
-    @reducer('not', 'check')
-    def _make_not_expr(self, _not, check):
-        """Invert the result of another check."""
-
-        return [('check', _checks.NotCheck(check))]
-
-
 def _parse_check(rule):
     """Parse a single base check rule into an appropriate Check object."""
 
@@ -204,10 +42,9 @@ def _parse_check(rule):
         return _checks.FalseCheck()
 
     # Find what implements the check
-    if kind in _checks.registered_checks:
-        return _checks.registered_checks[kind](kind, match)
-    elif None in _checks.registered_checks:
-        return _checks.registered_checks[None](kind, match)
+    if (kind in _checks.registered_checks or
+            None in _checks.registered_checks):
+        return _checks.make_check(kind, match)
     else:
         LOG.error(_LE('No handler for matches of kind %s') % kind)
         return _checks.FalseCheck()
@@ -266,6 +103,93 @@ def _parse_tokenize(rule):
             yield ')', ')'
 
 
+class _Group(object):
+    """An expression being parsed, either the whole rule or a parenthesis.
+
+    :param pos: Token position where the expression starts.
+    """
+
+    def __init__(self, pos=0):
+        self.pos = pos
+        self.op = None
+        self.operands = []
+        self.pending_nots = 0
+
+    def add(self, check):
+        """Add an operand, applying the pending ``not`` operators to it."""
+
+        for i in range(self.pending_nots):
+            check = _checks.NotCheck(check)
+        self.pending_nots = 0
+        self.operands.append(check)
+
+    def result(self):
+        """Build the Check for the complete expression."""
+
+        if self.op == 'and':
+            return _checks.AndCheck(self.operands)
+        elif self.op == 'or':
+            return _checks.OrCheck(self.operands)
+        return self.operands[0]
+
+
+def _parse_tokens(tokens):
+    """Build the Check tree for a stream of tokens.
+
+    The policy language is parsed in a single pass over the tokens, with an
+    explicit stack for the open parentheses, so parsing takes linear time
+    and never recurses.  ``not`` binds to the operand that follows it, and
+    an expression may join its operands with ``and`` or with ``or``, but
+    mixing them requires parentheses.
+
+    :param tokens: iterable of (token, value) tuples, as produced by
+                   :func:`_parse_tokenize`.
+    :raises ValueError: if the tokens do not form a valid rule.  The message
+                        gives the position of the offending token.
+    """
+
+    stack = []
+    group = _Group()
+    expect_operand = True
+    pos = -1
+
+    for pos, (tok, value) in enumerate(tokens):
+        if expect_operand:
+            if tok == 'not':
+                group.pending_nots += 1
+            elif tok == 'check':
+                group.add(value)
+                expect_operand = False
+            elif tok == '(':
+                stack.append(group)
+                group = _Group(pos=pos)
+            else:
+                raise ValueError('Unexpected %r at token %d, expected a'
+                                 ' check' % (value, pos))
+        else:
+            if tok in ('and', 'or'):
+                if group.op is None:
+                    group.op = tok
+                elif group.op != tok:
+                    raise ValueError('Unexpected %r at token %d, "and" and'
+                                     ' "or" cannot be mixed without'
+                                     ' parentheses' % (value, pos))
+                expect_operand = True
+            elif tok == ')' and stack:
+                check = group.result()
+                group = stack.pop()
+                group.add(check)
+            else:
+                raise ValueError('Unexpected %r at token %d, expected an'
+                                 ' operator' % (value, pos))
+
+    if expect_operand:
+        raise ValueError('Unexpected end of rule at token %d' % (pos + 1))
+    if stack:
+        raise ValueError('Unclosed parenthesis at token %d' % group.pos)
+    return group.result()
+
+
 def parse_rule(rule):
     """Parses policy to the tree.
 
@@ -277,16 +201,12 @@ def parse_rule(rule):
     if not rule:
         return _checks.TrueCheck()
 
-    # Parse the token stream
-    state = ParseState()
-    for tok, value in _parse_tokenize(rule):
-        state.shift(tok, value)
-
     try:
-        return state.result
-    except ValueError:
+        return _parse_tokens(_parse_tokenize(rule))
+    except ValueError as e:
         # Couldn't parse the rule
-        LOG.exception(_LE('Failed to understand rule %s') % rule)
+        LOG.error(_LE('Failed to understand rule %(rule)s: %(error)s') %
+                  {'rule': rule, 'error': e})
 
         # Fail closed
         return _checks.FalseCheck()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Evaluate Check trees against credentials alone.
+
+:func:`evaluate` resolves the checks of a tree that only read the
+credentials, such as role checks or generic checks against constants, and
+turns the generic checks against a single target attribute into
+:class:`~oslo_policy.predicates.Eq` predicates.  The result is a
+:class:`~oslo_policy.predicates.Predicate` that a target meets exactly when
+the tree evaluates to true against it.
+
+Trees that cannot be reduced that way, because they hold ``http:`` checks,
+checks registered by the application, generic checks against templates
+made of more than a substitution, or would raise for lack of roles in the
+credentials, evaluate to None.
+"""
+
+import six
+
+from oslo_policy import _checks
+from oslo_policy import _compiler
+from oslo_policy import predicates
+
+
+class _Unsupported(Exception):
+    """The tree cannot be reduced to a predicate."""
+
+
+def conjunction(preds):
+    """Return the predicate met when every one of preds is."""
+
+    members = []
+    for pred in preds:
+        if pred is predicates.FALSE:
+            return predicates.FALSE
+        elif pred is predicates.TRUE:
+            continue
+        for member in (pred.predicates if isinstance(pred, predicates.And)
+                       else (pred,)):
+            if member not in members:
+                members.append(member)
+
+    if not members:
+        return predicates.TRUE
+    elif len(members) == 1:
+        return members[0]
+    return predicates.And(members)
+
+
+def disjunction(preds):
+    """Return the predicate met when any one of preds is."""
+
+    members = []
+    for pred in preds:
+        if pred is predicates.TRUE:
+            return predicates.TRUE
+        elif pred is predicates.FALSE:
+            continue
+        for member in (pred.predicates if isinstance(pred, predicates.Or)
+                       else (pred,)):
+            if member not in members:
+                members.append(member)
+
+    if not members:
+        return predicates.FALSE
+    elif len(members) == 1:
+        return members[0]
+    return predicates.Or(members)
+
+
+def negation(pred):
+    """Return the predicate met when pred is not."""
+
+    if pred is predicates.TRUE:
+        return predicates.FALSE
+    elif pred is predicates.FALSE:
+        return predicates.TRUE
+    elif isinstance(pred, predicates.Not):
+        return pred.predicate
+    return predicates.Not(pred)
+
+
+class _Evaluator(object):
+
+    def __init__(self, creds, rule_dict):
+        self.creds = creds
+        self.rule_dict = rule_dict
+        self.resolving = set()
+
+    def visit(self, check):
+        if isinstance(check, _compiler.CompiledCheck):
+            check = check.check
+
+        if isinstance(check, _checks.TrueCheck):
+            return predicates.TRUE
+        elif isinstance(check, _checks.FalseCheck):
+            return predicates.FALSE
+        elif isinstance(check, _checks.NotCheck):
+            return negation(self.visit(check.rule))
+        elif isinstance(check, (_checks.AndCheck, _checks.OrCheck)):
+            return self.visit_group(check)
+        elif type(check) is _checks.RoleCheck:
+            return self.visit_role(check)
+        elif type(check) is _checks.GenericCheck:
+            return self.visit_generic(check)
+        elif type(check) is _checks.RuleCheck:
+            return self.visit_rule(check)
+        raise _Unsupported()
+
+    def visit_group(self, check):
+        is_and = isinstance(check, _checks.AndCheck)
+        # The result that ends the evaluation of the group
+        decisive = predicates.FALSE if is_and else predicates.TRUE
+
+        preds = []
+        for rule in check.rules:
+            pred = self.visit(rule)
+            if pred is decisive:
+                # The branches after this one are never evaluated
+                return decisive
+            preds.append(pred)
+        return conjunction(preds) if is_and else disjunction(preds)
+
+    def visit_role(self, check):
+        try:
+            roles = _checks.role_set(self.creds)
+        except KeyError:
+            # Whether the rule raises depends on the branches evaluated
+            # before this one
+            raise _Unsupported()
+        return predicates.TRUE if check.role in roles else predicates.FALSE
+
+    def visit_generic(self, check):
+        if check.literal is not None:
+            value = check.literal
+        else:
+            try:
+                value = self.creds
+                for kind_part in check.kind_parts:
+                    value = value[kind_part]
+            except KeyError:
+                return predicates.FALSE
+            value = six.text_type(value)
+
+        if check.target_key is not None:
+            return predicates.Eq(check.target_key, value)
+        elif '%' not in check.match:
+            return (predicates.TRUE if check.match == value
+                    else predicates.FALSE)
+        raise _Unsupported()
+
+    def visit_rule(self, check):
+        name = check.match
+        if name in self.resolving:
+            raise _Unsupported()
+
+        try:
+            rule = self.rule_dict[name]
+        except KeyError:
+            # We don't have any matching rule; fail closed
+            return predicates.FALSE
+
+        self.resolving.add(name)
+        try:
+            return self.visit(rule)
+        finally:
+            self.resolving.discard(name)
+
+
+def evaluate(check, creds, rule_dict=None):
+    """Reduce a Check tree to a predicate on the target.
+
+    :param check: The root of the Check tree.
+    :param creds: The credentials.
+    :param rule_dict: The rules ``rule:`` checks refer to.
+    :return: a :class:`~oslo_policy.predicates.Predicate`, or None if the
+             tree cannot be reduced to one.
+    """
+
+    try:
+        return _Evaluator(creds, rule_dict or {}).visit(check)
+    except _Unsupported:
+        return None
+
+
+def evaluate_action(action, creds, rules):
+    """Reduce the rule of an action in a rule set to a predicate.
+
+    An action without a rule is denied, as it is by
+    :meth:`~oslo_policy.policy.Enforcer.enforce`.
+
+    :param action: The (service, permission) tuple.
+    :param creds: The credentials.
+    :param rules: The :class:`~oslo_policy.policy.Rules`.
+    """
+
+    try:
+        serv_rules = rules[action[0]]
+        rule = serv_rules[action[1]]
+    except KeyError:
+        return predicates.FALSE
+    return evaluate(rule, creds, serv_rules)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Rule sets shared between the processes of a host through a file.
+
+One process, the leader, writes parsed rule sets to a file in the format of
+:mod:`oslo_policy._codec`.  Every process maps the file read-only, so they
+all read the same pages and only decode the sections they use.
+
+The file is replaced atomically, so readers never see a partial write, and
+a reader keeps using the mapping it opened until it notices the file was
+replaced.  Leadership is held with an exclusive ``flock`` on a companion
+``.lock`` file, so this only works on POSIX systems.
+"""
+
+import errno
+import fcntl
+import mmap
+import os
+import tempfile
+import threading
+
+from oslo_policy import _codec
+
+
+class SharedRulesFile(object):
+    """A rule sets file shared between processes.
+
+    :param path: Path of the file.  Its directory must be writable by the
+                 leader.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reader = None
+        self._stat = None
+        self._lock_file = None
+        self._lock_pid = None
+
+    def try_lead(self):
+        """Try to become the leader, the only process writing the file.
+
+        :return: True if this process is the leader.
+        """
+
+        with self._lock:
+            if self._lock_file is not None and self._lock_pid == os.getpid():
+                return True
+
+            # A lock inherited from the parent process does not count
+            lock_file = open(self.path + '.lock', 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                lock_file.close()
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    return False
+                raise
+            self._lock_file = lock_file
+            self._lock_pid = os.getpid()
+            return True
+
+    def publish(self, sections, metadata=None):
+        """Replace the content of the file.
+
+        :param sections: dict of sections, see :func:`_codec.encode`.
+        :param metadata: A string stored with the whole file.
+        """
+
+        data = _codec.encode(sections, metadata)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.policy-')
+        try:
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_path, self.path)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def reader(self):
+        """Return a :class:`_codec.Reader` of the current file.
+
+        The same reader is returned as long as the file was not replaced.
+
+        :return: the reader, or None if there is no usable file.
+        """
+
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        stat = (st.st_ino, st.st_mtime, st.st_size)
+
+        with self._lock:
+            if stat == self._stat:
+                return self._reader
+            reader = None
+            try:
+                with open(self.path, 'rb') as f:
+                    # The file may have been replaced since the stat() call
+                    st = os.fstat(f.fileno())
+                    stat = (st.st_ino, st.st_mtime, st.st_size)
+                    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                reader = _codec.Reader(buf)
+            except (EnvironmentError, ValueError):
+                # Removed, or written by an incompatible version
+                pass
+            self._reader = reader
+            self._stat = stat
+            return reader
+
+
+_files = {}
+_files_lock = threading.Lock()
+
+
+def get_shared_file(path):
+    """Return the :class:`SharedRulesFile` of path, one per process."""
+
+    with _files_lock:
+        try:
+            return _files[path]
+        except KeyError:
+            shared = _files[path] = SharedRulesFile(path)
+            return shared
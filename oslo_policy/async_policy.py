@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Policy enforcement for asyncio applications.
+
+:class:`AsyncEnforcer` evaluates rules the same way as
+:class:`~oslo_policy.policy.Enforcer`, system policy first, then the domain
+policy, then the default policy.  Its :meth:`~AsyncEnforcer.enforce` is a
+coroutine, and the blocking policy database queries run in a thread pool,
+so that concurrent enforcements for different domains overlap their I/O
+instead of stalling the event loop.  So do the parsing of domain rules and
+the evaluation of rules holding checks that may block, such as ``http:``
+checks; the other rules are evaluated on the event loop.
+
+This module requires Python 3.7 or later.
+"""
+
+import asyncio
+from concurrent import futures
+import functools
+import logging
+import weakref
+
+from oslo_policy import _analysis
+from oslo_policy import _checks
+from oslo_policy import _partial
+from oslo_policy.common import sql as common_sql
+from oslo_policy import instrumentation
+from oslo_policy import policy
+from oslo_policy import predicates
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _may_block(rule, rule_dict=None):
+    """Whether evaluating rule may block, e.g. on an ``http:`` check.
+
+    Checks registered by the application are assumed to block.
+    """
+
+    return not _analysis.get_inputs(rule, rule_dict).cacheable
+
+
+def _blocking_actions(rules):
+    """Return the set of actions whose rule may block."""
+
+    return frozenset((serv, perm)
+                     for serv, serv_rules in rules.items()
+                     for perm, rule in serv_rules.items()
+                     if _may_block(rule, serv_rules))
+
+
+class AsyncEnforcer(policy.Enforcer):
+    """Responsible for loading and enforcing rules from coroutines.
+
+    :param conf: A configuration object.
+    :param executor: A :class:`concurrent.futures.Executor` to run policy
+                     database queries, rule parsing and blocking checks in.
+                     If not given, a thread pool of ``[oslo_policy]
+                     async_max_workers`` threads is created, and shut down
+                     by :meth:`close`.
+
+    Any other argument is passed to :class:`~oslo_policy.policy.Enforcer`.
+    """
+
+    def __init__(self, conf, executor=None, **kwargs):
+        super(AsyncEnforcer, self).__init__(conf, **kwargs)
+        # Only the pool created here is the enforcer's to shut down
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = futures.ThreadPoolExecutor(
+                conf.oslo_policy.async_max_workers)
+        self._executor = executor
+
+        self._blocking_sys = _blocking_actions(self.sys_rules)
+        self._blocking_dflt = _blocking_actions(self.dflt_rules)
+        # Whether each parsed domain rule may block
+        self._blocking_domain = weakref.WeakKeyDictionary()
+
+    async def _run(self, func, *args, **kwargs):
+        """Call func in the thread pool."""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    def _counted_domain_snapshot(self, domain_id, action=None):
+        queries = common_sql.query_count()
+        snapshot = self.policy_api.get_domain_snapshot(domain_id, action)
+        return snapshot, common_sql.query_count() - queries
+
+    async def _get_domain_snapshot(self, domain_id, probe=None, action=None):
+        if probe is None:
+            return await self._run(self.policy_api.get_domain_snapshot,
+                                   domain_id, action)
+
+        # The queries are made, and counted, by the executor thread
+        snapshot, queries = await self._run(self._counted_domain_snapshot,
+                                            domain_id, action)
+        probe.extra_queries += queries
+        probe.stage(instrumentation.STAGE_DOMAIN_LOOKUP)
+        return snapshot
+
+    async def _enforce_system(self, action, target, creds, **kwargs):
+        """Checks an action against the system policy."""
+
+        if action in self._blocking_sys:
+            return await self._run(self._enforce, action, target, creds,
+                                   rule_dict=self.sys_rules, **kwargs)
+        return self._enforce(action, target, creds, rule_dict=self.sys_rules,
+                             **kwargs)
+
+    def _domain_rule_blocks(self, rule):
+        blocking = self._blocking_domain.get(rule)
+        if blocking is None:
+            blocking = self._blocking_domain[rule] = _may_block(rule)
+        return blocking
+
+    async def _enforce_domain_async(self, action, target, creds, snapshot,
+                                    **kwargs):
+        """Checks an action against the domain or the default policy.
+
+        Domain rules that are not parsed yet are parsed, and evaluated, in
+        the thread pool, as are the rules that may block.
+        """
+
+        selected = self._select_domain_rule(action, snapshot, parse=False)
+        if selected is not None:
+            rule, rule_dict = selected
+            if rule_dict is None:
+                blocking = self._domain_rule_blocks(rule)
+            else:
+                blocking = action in self._blocking_dflt
+            if not blocking:
+                return self._enforce(rule, target, creds, rule_dict=rule_dict,
+                                     **kwargs)
+        return await self._run(self._enforce_domain, action, target, creds,
+                               snapshot, **kwargs)
+
+    async def enforce(self, action, target, creds, **kwargs):
+        """Checks authorization of an action, see :meth:`Enforcer.enforce`."""
+
+        if self._instrumentation is None:
+            return await self._enforce_action(action, target, creds, None,
+                                              **kwargs)
+
+        probe = self._probe()
+        result = False
+        try:
+            result = await self._enforce_action(action, target, creds, probe,
+                                                **kwargs)
+            return result
+        finally:
+            probe.done(action, result)
+
+    async def _enforce_action(self, action, target, creds, probe, **kwargs):
+        # Preprocess the credentials once for all the checks below
+        if not isinstance(creds, _checks.Credentials):
+            creds = _checks.Credentials(creds)
+
+        LOG.debug('Evaluating against System Authz Policy')
+        sys_rst = await self._enforce_system(action, target, creds, **kwargs)
+        if probe is not None:
+            probe.stage(instrumentation.STAGE_SYSTEM)
+        if not sys_rst:
+            return sys_rst
+
+        LOG.debug('Evaluating against Domain Authz Policy')
+        # We can always get scope_domain_id from creds.
+        snapshot = await self._get_domain_snapshot(creds['domain_id'], probe,
+                                                   action)
+        result = await self._enforce_domain_async(action, target, creds,
+                                                  snapshot, **kwargs)
+        if probe is not None:
+            probe.stage(instrumentation.STAGE_DOMAIN)
+        return result
+
+    async def enforce_many(self, actions_and_targets, creds, **kwargs):
+        """Checks many (action, target) pairs for one set of credentials.
+
+        See :meth:`Enforcer.enforce_many`.
+
+        :return: list of results in the order of ``actions_and_targets``.
+        """
+
+        if not isinstance(creds, _checks.Credentials):
+            creds = _checks.Credentials(creds)
+
+        results = []
+        snapshot = None
+        for action, target in actions_and_targets:
+            probe = self._probe()
+            result = False
+            try:
+                result = await self._enforce_system(action, target, creds,
+                                                    **kwargs)
+                if probe is not None:
+                    probe.stage(instrumentation.STAGE_SYSTEM)
+                if result:
+                    if snapshot is None:
+                        snapshot = await self._get_domain_snapshot(
+                            creds['domain_id'], probe)
+                    result = await self._enforce_domain_async(
+                        action, target, creds, snapshot, **kwargs)
+                    if probe is not None:
+                        probe.stage(instrumentation.STAGE_DOMAIN)
+            finally:
+                if probe is not None:
+                    probe.done(action, result)
+            results.append(result)
+        return results
+
+    async def filter_predicate(self, action, creds):
+        """Return the condition targets must meet for an action to be allowed.
+
+        See :meth:`Enforcer.filter_predicate`.
+        """
+
+        if not isinstance(creds, _checks.Credentials):
+            creds = _checks.Credentials(creds)
+
+        sys_predicate = _partial.evaluate_action(action, creds,
+                                                 self.sys_rules)
+        if sys_predicate is None or sys_predicate is predicates.FALSE:
+            return sys_predicate
+
+        snapshot = await self._get_domain_snapshot(creds['domain_id'],
+                                                   action=action)
+        if self._select_domain_rule(action, snapshot, parse=False) is None:
+            # The domain rule is parsed in the thread pool
+            return await self._run(self._domain_filter_predicate, action,
+                                   creds, snapshot, sys_predicate)
+        return self._domain_filter_predicate(action, creds, snapshot,
+                                             sys_predicate)
+
+    def close(self):
+        """Shut down the thread pool of the enforcer, if it created it.
+
+        An executor given to the constructor is left running.
+        """
+
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
@@ -19,6 +19,7 @@ CONF() because it sets up configuration options.
 
 """
 import contextlib
+import threading
 
 from oslo_db.sqlalchemy import models
 from oslo_db.sqlalchemy import session as db_session
@@ -27,6 +28,7 @@ from oslo_serialization import jsonutils
 import six
 import sqlalchemy as sql
 from sqlalchemy.ext import declarative
+from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy import types as sql_types
 
 from oslo_policy import exception
@@ -43,8 +45,16 @@ String = sql.String
 ForeignKey = sql.ForeignKey
 NotFound = sql.orm.exc.NoResultFound
 Boolean = sql.Boolean
+Integer = sql.Integer
 Text = sql.Text
 UniqueConstraint = sql.UniqueConstraint
+Index = sql.Index
+DDL = sql.DDL
+event = sql.event
+inspect = sql.inspect
+func = sql.func
+and_ = sql.and_
+true = sql.true
 
 
 def initialize(conf):
@@ -95,6 +105,9 @@ class JsonBlob(sql_types.TypeDecorator):
         return jsonutils.dumps(value)
 
     def process_result_value(self, value, dialect):
+        # Outer joins yield NULL for the columns of missing rows
+        if value is None:
+            return None
         return jsonutils.loads(value)
 
 
@@ -135,13 +148,74 @@ class DictBase(models.ModelBase):
 
 _engine_facade = None
 
+# Holds the session of the session_scope() active in the current thread, and
+# the number of queries it made if they are counted
+_context = threading.local()
+
+# Whether queries are counted, and the engine counting them
+_count_queries = False
+_counting_engine = None
+
+
+def _ping_connection(dbapi_connection, connection_record, connection_proxy):
+    """Make sure a pooled connection is still alive when it is checked out.
+
+    Raising DisconnectionError makes the pool retry with a new connection.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    except Exception:
+        raise sql.exc.DisconnectionError()
+    finally:
+        cursor.close()
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _context.queries = getattr(_context, 'queries', 0) + 1
+
+
+def _listen_queries(engine):
+    global _counting_engine
+
+    if _count_queries and engine is not _counting_engine:
+        sql.event.listen(engine, 'before_cursor_execute', _count_query)
+        _counting_engine = engine
+
+
+def count_queries(conf):
+    """Start counting the queries made by each thread.
+
+    See :func:`query_count`.
+    """
+    global _count_queries
+
+    _count_queries = True
+    _listen_queries(get_engine(conf))
+
+
+def query_count():
+    """Return the number of queries made so far by the current thread.
+
+    Always 0 unless :func:`count_queries` was called.
+    """
+    return getattr(_context, 'queries', 0)
+
 
 def _get_engine_facade(conf):
     global _engine_facade
 
     if not _engine_facade:
+        opts = conf.oslo_policy
         _engine_facade = db_session.EngineFacade(
-                                        conf.oslo_policy.policy_connection)
+            opts.policy_connection,
+            max_pool_size=opts.policy_max_pool_size,
+            max_overflow=opts.policy_max_overflow,
+            idle_timeout=opts.policy_idle_timeout)
+        if opts.policy_pool_pre_ping:
+            sql.event.listen(_engine_facade.get_engine(), 'checkout',
+                             _ping_connection)
+        _listen_queries(_engine_facade.get_engine())
 
     return _engine_facade
 
@@ -162,7 +236,38 @@ def get_session(conf, expire_on_commit=False):
 
 @contextlib.contextmanager
 def transaction(conf, expire_on_commit=False):
-    """Return a SQLAlchemy session in a scoped transaction."""
+    """Return a SQLAlchemy session in a scoped transaction.
+
+    Inside a :func:`session_scope`, the session and the transaction of the
+    scope are used instead of new ones.
+    """
+    session = getattr(_context, 'session', None)
+    if session is not None:
+        yield session
+        return
+
     session = get_session(conf, expire_on_commit=expire_on_commit)
     with session.begin():
         yield session
+
+
+@contextlib.contextmanager
+def session_scope(conf, expire_on_commit=False):
+    """Share one session and one transaction between transactions.
+
+    Every :func:`transaction` entered by the current thread inside this
+    block reuses the same session and transaction.  Nested scopes join the
+    outermost one.
+    """
+    session = getattr(_context, 'session', None)
+    if session is not None:
+        yield session
+        return
+
+    session = get_session(conf, expire_on_commit=expire_on_commit)
+    with session.begin():
+        _context.session = session
+        try:
+            yield session
+        finally:
+            _context.session = None
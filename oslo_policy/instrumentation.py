@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure where enforcement time goes.
+
+Pass an :class:`Instrumentation` to :class:`~oslo_policy.policy.Enforcer`
+to be told how long each stage of every enforcement took, and how each
+enforcement ended::
+
+    stats = instrumentation.Stats()
+    enforcer = policy.Enforcer(conf, instrumentation=stats)
+    ...
+    report = stats.report(enforcer)
+
+Without an instrumentation, the enforcer does not measure anything.
+
+The stages of an enforcement are:
+
+``system``
+    Evaluating the system rule.
+``domain_lookup``
+    Getting the policy of the domain of the credentials, from the cache or
+    the database.  Only measured when the system rule allowed the action.
+``domain``
+    Evaluating the domain rule, or the default rule if the domain has none
+    for the action, parsing included.
+``parse``
+    Parsing a domain rule that was not cached yet, also part of ``domain``.
+"""
+
+import threading
+
+import six
+
+from oslo_policy import _cache
+
+
+STAGE_SYSTEM = 'system'
+STAGE_DOMAIN_LOOKUP = 'domain_lookup'
+STAGE_DOMAIN = 'domain'
+STAGE_PARSE = 'parse'
+
+# The clock measurements are taken with
+clock = _cache._clock
+
+
+class Instrumentation(object):
+    """Receives the measurements of an Enforcer.
+
+    The methods do nothing; override the ones you need.  They are called
+    from the threads enforcing, so they must be thread-safe, and quick.
+    """
+
+    def stage(self, name, seconds):
+        """Called after each stage of an enforcement.
+
+        :param name: One of the ``STAGE_*`` constants.
+        :param seconds: How long the stage took.
+        """
+
+    def enforcement(self, action, result, seconds, db_round_trips):
+        """Called after each enforcement.
+
+        :param action: The (service, permission) tuple enforced.
+        :param result: The result of the enforcement, False if it raised.
+        :param seconds: How long the whole enforcement took.
+        :param db_round_trips: Number of policy database queries made by the
+                               enforcement.
+        """
+
+
+class Histogram(object):
+    """Count, sum, extremes and distribution of a measurement.
+
+    Values are counted in buckets whose upper bounds are powers of two.
+
+    :param scale: Factor applied to values before they are bucketed, e.g.
+                  1e6 to bucket seconds as microseconds.
+    """
+
+    def __init__(self, scale=1):
+        self.scale = scale
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.buckets = {}
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        bucket = 1 << int(value * self.scale).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def as_dict(self):
+        return {'count': self.count,
+                'total': self.total,
+                'mean': self.total / self.count if self.count else None,
+                'min': self.min,
+                'max': self.max,
+                # Values scaled by scale are lower than each bound
+                'buckets': dict(self.buckets)}
+
+
+class Stats(Instrumentation):
+    """Aggregate the measurements of one or more Enforcers.
+
+    Durations are in seconds, and bucketed by microseconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything measured so far."""
+
+        with self._lock:
+            self._stages = {}
+            self._total = Histogram(1e6)
+            self._db_round_trips = Histogram()
+            self._actions = {}
+            self._allowed = 0
+            self._denied = 0
+
+    def stage(self, name, seconds):
+        with self._lock:
+            histogram = self._stages.get(name)
+            if histogram is None:
+                histogram = self._stages[name] = Histogram(1e6)
+            histogram.add(seconds)
+
+    def enforcement(self, action, result, seconds, db_round_trips):
+        key = '%s:%s' % tuple(action)
+        with self._lock:
+            counts = self._actions.get(key)
+            if counts is None:
+                counts = self._actions[key] = {'allowed': 0, 'denied': 0}
+            if result:
+                self._allowed += 1
+                counts['allowed'] += 1
+            else:
+                self._denied += 1
+                counts['denied'] += 1
+            self._total.add(seconds)
+            self._db_round_trips.add(db_round_trips)
+
+    def report(self, enforcer=None):
+        """Return everything measured so far as a dict.
+
+        :param enforcer: If given, the hit ratios of its caches are included.
+        """
+
+        with self._lock:
+            report = {
+                'enforcements': self._total.as_dict(),
+                'allowed': self._allowed,
+                'denied': self._denied,
+                'stages': dict((name, histogram.as_dict())
+                               for name, histogram in self._stages.items()),
+                'actions': dict((key, dict(counts))
+                                for key, counts in self._actions.items()),
+                'db_round_trips': self._db_round_trips.as_dict(),
+            }
+
+        if enforcer is not None:
+            caches = {}
+            for name, stats in six.iteritems(enforcer.cache_stats()):
+                stats = dict(stats)
+                lookups = stats['hits'] + stats['misses']
+                stats['hit_ratio'] = (float(stats['hits']) / lookups
+                                      if lookups else None)
+                caches[name] = stats
+            report['caches'] = caches
+        return report
+
+
+class _Probe(object):
+    """Measures a single enforcement for an :class:`Instrumentation`.
+
+    :param instrumentation: The instrumentation to report to.
+    :param query_count: Callable returning the number of policy database
+                        queries made so far by the current thread.
+    """
+
+    def __init__(self, instrumentation, query_count):
+        self.instrumentation = instrumentation
+        self._query_count = query_count
+        self.start = self._last = clock()
+        self._queries = query_count()
+        # Queries made on behalf of this enforcement by other threads
+        self.extra_queries = 0
+
+    def stage(self, name):
+        """Report the stage that just ended."""
+
+        now = clock()
+        self.instrumentation.stage(name, now - self._last)
+        self._last = now
+
+    def done(self, action, result):
+        """Report the end of the enforcement."""
+
+        self.instrumentation.enforcement(
+            action, result, clock() - self.start,
+            self._query_count() - self._queries + self.extra_queries)
@@ -34,7 +34,143 @@ _options = [
                help='SQLAlchemy connection string used to connect to the '
                     'policy database.',
                secret=True
-               )
+               ),
+    cfg.IntOpt('policy_max_pool_size',
+               help=_('Maximum number of SQL connections to keep open in the'
+                      ' policy database connection pool.')
+               ),
+    cfg.IntOpt('policy_max_overflow',
+               help=_('If set, use this value for max_overflow with'
+                      ' SQLAlchemy for the policy database.')
+               ),
+    cfg.IntOpt('policy_idle_timeout',
+               default=3600,
+               help=_('Timeout in seconds after which pooled policy database'
+                      ' connections are recycled.')
+               ),
+    cfg.BoolOpt('policy_pool_pre_ping',
+                default=False,
+                help=_('Test each pooled policy database connection when it'
+                       ' is checked out, and replace it if it went stale.')
+                ),
+    cfg.IntOpt('rule_cache_size',
+               default=1024,
+               help=_('Maximum number of distinct domain rule conditions'
+                      ' to keep parsed in the per-Enforcer rule cache.'
+                      ' Domains using the same condition share its entry.'
+                      ' Set to 0 to parse the domain rule on every'
+                      ' enforcement.')
+               ),
+    cfg.IntOpt('domain_cache_time',
+               default=0,
+               help=_('Number of seconds a domain policy snapshot, i.e. the'
+                      ' enabled policy of a domain and all of its rules, is'
+                      ' cached. Set to 0 to read the enabled policy and the'
+                      ' enforced rule from the policy database on every'
+                      ' enforcement.')
+               ),
+    cfg.IntOpt('domain_cache_size',
+               default=1024,
+               help=_('Maximum number of domain policy snapshots to cache.')
+               ),
+    cfg.IntOpt('policy_change_poll_interval',
+               default=0,
+               help=_('Number of seconds between two reads of the policy'
+                      ' change feed, which drop the cached snapshots of the'
+                      ' domains whose policy changed. Set to 0 to only rely'
+                      ' on domain_cache_time.')
+               ),
+    cfg.StrOpt('shared_policy_file',
+               help=_('Path of a file through which the processes of a host'
+                      ' share parsed rules. One process writes it and all'
+                      ' of them map it read-only. Domain rules are only'
+                      ' shared when policy_change_poll_interval is set.')
+               ),
+    cfg.BoolOpt('compile_rules',
+                default=False,
+                help=_('Compile parsed rules into specialized Python'
+                       ' callables, which evaluate faster than walking the'
+                       ' tree of checks.')
+                ),
+    cfg.IntOpt('decision_cache_size',
+               default=0,
+               help=_('Maximum number of enforcement decisions to cache. A'
+                      ' decision is keyed by the rule and the target and'
+                      ' credential values the rule reads. Set to 0 to'
+                      ' disable the decision cache.')
+               ),
+    cfg.IntOpt('decision_cache_time',
+               default=60,
+               help=_('Number of seconds a cached enforcement decision stays'
+                      ' valid.')
+               ),
+    cfg.FloatOpt('http_check_connect_timeout',
+                 default=5.0,
+                 help=_('Seconds to wait for a connection to the remote'
+                        ' server of an http: check.')
+                 ),
+    cfg.FloatOpt('http_check_read_timeout',
+                 default=10.0,
+                 help=_('Seconds to wait for the response of the remote'
+                        ' server of an http: check. A check whose request'
+                        ' times out fails.')
+                 ),
+    cfg.IntOpt('http_check_max_concurrency',
+               default=0,
+               help=_('Maximum number of http: check requests in flight at'
+                      ' once. Set to 0 for no limit.')
+               ),
+    cfg.IntOpt('http_check_pool_size',
+               default=10,
+               help=_('Maximum number of idle keep-alive connections kept'
+                      ' per remote server of http: checks.')
+               ),
+    cfg.IntOpt('http_check_cache_time',
+               default=0,
+               help=_('Number of seconds the response of an http: check is'
+                      ' cached, keyed on the URL and the posted target and'
+                      ' credentials. Set to 0 to disable the cache.')
+               ),
+    cfg.IntOpt('http_check_cache_size',
+               default=1024,
+               help=_('Maximum number of cached http: check responses.')
+               ),
+    cfg.BoolOpt('http_check_parallel',
+                default=False,
+                help=_('Evaluate independent http: checks of the same'
+                       ' "and"/"or" expression concurrently instead of one'
+                       ' after the other.')
+                ),
+    cfg.IntOpt('http_check_max_workers',
+               default=8,
+               help=_('Size of the thread pool concurrent http: checks run'
+                      ' in.')
+               ),
+    cfg.IntOpt('async_max_workers',
+               default=8,
+               help=_('Size of the thread pool AsyncEnforcer uses to run'
+                      ' policy database queries, domain rule parsing and'
+                      ' blocking checks such as http: checks off the event'
+                      ' loop.')
+               ),
+    cfg.BoolOpt('adaptive_reorder',
+                default=False,
+                help=_('Measure how often each branch of the "and"/"or"'
+                       ' expressions decides their result and how long it'
+                       ' takes, and periodically evaluate first the branches'
+                       ' most likely to decide cheaply. Only role and'
+                       ' generic checks are moved.')
+                ),
+    cfg.IntOpt('adaptive_reorder_interval',
+               default=1000,
+               help=_('Number of evaluations of an "and"/"or" expression'
+                      ' between two reorders of its branches.')
+               ),
+    cfg.StrOpt('adaptive_profile_file',
+               help=_('File the branch orders learned with adaptive_reorder'
+                      ' are loaded from at startup, and saved to by'
+                      ' Enforcer.save_adaptive_profile().')
+               ),
 ]
 
 
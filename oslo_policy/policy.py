@@ -202,18 +202,31 @@ by setting the ``policy_default_rule`` configuration setting to the
 desired rule name.
 """
 
+import errno
 import logging
 import os
+import threading
 
-from oslo_config import cfg
 from oslo_serialization import jsonutils
 import six
 
+from oslo_policy import _adaptive
+from oslo_policy import _analysis
+from oslo_policy import _cache
 from oslo_policy import _checks
+from oslo_policy import _codec
+from oslo_policy import _compiler
+from oslo_policy import _concurrent
+from oslo_policy import _http
 from oslo_policy._i18n import _
+from oslo_policy import instrumentation
+from oslo_policy import _optimizer
 from oslo_policy import _parser
+from oslo_policy import _partial
+from oslo_policy import _shared
 from oslo_policy.openstack.common import fileutils
 from oslo_policy import opts
+from oslo_policy import predicates
 from oslo_policy import _default_domain
 from oslo_policy import _system
 from oslo_policy.common import sql as common_sql
@@ -226,6 +239,7 @@ LOG = logging.getLogger(__name__)
 
 register = _checks.register
 Check = _checks.Check
+Credentials = _checks.Credentials
 
 
 def initialize(conf):
@@ -241,6 +255,10 @@ class PolicyNotAuthorized(Exception):
         super(PolicyNotAuthorized, self).__init__(msg)
 
 
+# Section of the buffers written by Rules.dump_compiled()
+_COMPILED_SECTION = 'rules'
+
+
 class Rules(dict):
     """A store for rules. Handles the default_rule setting directly."""
 
@@ -248,11 +266,11 @@ class Rules(dict):
     def load_json(cls, data, default_rule=None):
         """Allow loading of JSON rule data."""
         data = jsonutils.loads(data)
-        
+
         # Parse the rules stored in  JSON data loaded
         rules = {}
-        for serv in data.iterkeys():
-            rules[serv] = dict((k, _parser.parse_rule(v)) 
+        for serv in six.iterkeys(data):
+            rules[serv] = dict((k, _parser.parse_rule(v))
                                for k, v in data[serv].items())
 
         return cls(rules, default_rule)
@@ -263,18 +281,89 @@ class Rules(dict):
 
         # Parse the rules stored in the dictionary
         rules = {}
-        for serv in rules_dict.iterkeys():
-            rules[serv] = dict((k, _parser.parse_rule(v)) 
-                               for k, v in rules_dict[serv].items()) 
+        for serv in six.iterkeys(rules_dict):
+            rules[serv] = dict((k, _parser.parse_rule(v))
+                               for k, v in rules_dict[serv].items())
 
         return cls(rules, default_rule)
 
+    @classmethod
+    def load_compiled(cls, data):
+        """Load rules serialized by :meth:`dump_compiled`.
+
+        Nothing is parsed, so this is much faster than :meth:`from_dict`.
+        The checks are rebuilt from the registered check types, which must
+        be registered before calling this.
+
+        :param data: bytes, or any buffer such as an ``mmap.mmap``.
+        :raises ValueError: if data is not a serialized rule set, or was
+                            written by an incompatible version.
+        """
+
+        rules, default_rule = _codec.Reader(data).load(_COMPILED_SECTION)
+        return cls(rules, default_rule)
+
     def __init__(self, rules=None, default_rule=None):
         """Initialize the Rules store."""
 
         super(Rules, self).__init__(rules or {})
         self.default_rule = default_rule
 
+    def optimize(self):
+        """Simplify every rule, see :func:`oslo_policy._optimizer.optimize`.
+
+        ``rule:`` references are resolved against the rules of the same
+        service, so the store must not be modified afterwards.
+
+        :return: a new :class:`Rules` store of equivalent rules.
+        """
+
+        rules = {}
+        for serv, serv_rules in self.items():
+            rules[serv] = dict((k, _optimizer.optimize(v, serv_rules))
+                               for k, v in serv_rules.items())
+
+        default_rule = self.default_rule
+        if isinstance(default_rule, _checks.BaseCheck):
+            default_rule = _optimizer.optimize(default_rule)
+
+        return self.__class__(rules, default_rule)
+
+    def compile(self):
+        """Compile every rule into a specialized callable.
+
+        :return: a new :class:`Rules` store holding
+                 :class:`~oslo_policy._compiler.CompiledCheck` instances,
+                 which evaluate the same as the original rules.  Rules
+                 without and/or expressions are kept as they are, see
+                 :func:`~oslo_policy._compiler.compile_check`.
+        """
+
+        rules = {}
+        for serv, serv_rules in self.items():
+            rules[serv] = dict((k, _compiler.compile_check(v))
+                               for k, v in serv_rules.items())
+
+        default_rule = self.default_rule
+        if isinstance(default_rule, _checks.BaseCheck):
+            default_rule = _compiler.compile_check(default_rule)
+
+        return self.__class__(rules, default_rule)
+
+    def dump_compiled(self):
+        """Serialize the parsed rules into a compact, versioned format.
+
+        Compiled rules are serialized as the Check trees they were compiled
+        from.
+
+        :return: bytes to pass to :meth:`load_compiled`.
+        :raises ValueError: if a rule holds a check that is not a
+                            :class:`Check`, e.g. one returned by a registered
+                            function.
+        """
+
+        return _codec.encode({_COMPILED_SECTION: self})
+
     def __missing__(self, key):
         """Implements the default rule handling."""
 
@@ -312,6 +401,156 @@ class Rules(dict):
         return jsonutils.dumps(out_rules, indent=4)
 
 
+class _FrozenDict(dict):
+    """A dict that refuses any modification once built."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(_('%s is immutable') % self.__class__.__name__)
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+
+class _FrozenRules(_FrozenDict, Rules):
+    """An immutable :class:`Rules` store."""
+
+    pass
+
+
+# The built-in system and default rule sets are parsed once per process and
+# shared by every Enforcer.  They are keyed by the CSP domain ID, which the
+# system rules embed, by whether the rules are compiled and by the interval
+# their branches are reordered at, if they are.
+_builtin_rules = {}
+_builtin_rules_lock = threading.Lock()
+
+
+def _get_builtin_rules(conf, compile_rules=False, adaptive_interval=None):
+    """Return the shared, immutable system and default rule sets.
+
+    :param adaptive_interval: If not None, the and/or expressions reorder
+                              their branches every this many evaluations.
+    :return: tuple of the system :class:`Rules` and the default
+             :class:`Rules`.
+    """
+
+    key = (conf.oslo_policy.CSP_domain_id, compile_rules, adaptive_interval)
+    try:
+        return _builtin_rules[key]
+    except KeyError:
+        pass
+
+    with _builtin_rules_lock:
+        if key not in _builtin_rules:
+            rule_sets = None
+            shared = _get_shared_file(conf)
+            if shared is not None:
+                rule_sets = _read_shared_builtin_rules(conf, shared.reader())
+            if rule_sets is None:
+                rule_sets = _parse_builtin_rules(conf)
+
+            frozen = []
+            for rules in rule_sets:
+                rules = _map_rules(rules, _compiler.fold_roles)
+                if adaptive_interval is not None:
+                    rules = _map_rules(
+                        rules,
+                        lambda rule: _adaptive.adapt(rule, compile_rules,
+                                                     adaptive_interval))
+                elif compile_rules:
+                    rules = rules.compile()
+                frozen.append(_FrozenRules(
+                    dict((serv, _FrozenDict(serv_rules))
+                         for serv, serv_rules in rules.items()),
+                    rules.default_rule))
+            _builtin_rules[key] = tuple(frozen)
+        return _builtin_rules[key]
+
+
+def _parse_builtin_rules(conf):
+    """Parse and optimize the system and default rule sets."""
+
+    default_rule = 'role:domain_admin'
+    return [Rules.from_dict(rules_dict, default_rule).optimize()
+            for rules_dict in (_system.SystemRules(conf).sys_rules,
+                               _default_domain.DefaultRules().dflt_rules)]
+
+
+def _map_rules(rules, func):
+    """Return a copy of rules with func applied to every rule."""
+
+    mapped = dict((serv, dict((perm, func(rule))
+                              for perm, rule in serv_rules.items()))
+                  for serv, serv_rules in rules.items())
+    return Rules(mapped, rules.default_rule)
+
+
+# Paths of the adaptive profiles loaded by this process
+_adaptive_profiles = set()
+_adaptive_profiles_lock = threading.Lock()
+
+
+def _load_adaptive_profile(path):
+    """Load the branch orders of an adaptive profile file, once per process.
+
+    A missing file is not an error: there is nothing learned yet.
+    """
+
+    with _adaptive_profiles_lock:
+        if path in _adaptive_profiles:
+            return
+        _adaptive_profiles.add(path)
+        try:
+            with open(path) as f:
+                _adaptive.load_profile(jsonutils.loads(f.read()))
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                LOG.warning('Cannot read the adaptive profile %(path)s:'
+                            ' %(error)s', {'path': path, 'error': e})
+        except ValueError as e:
+            LOG.warning('Ignoring the invalid adaptive profile %(path)s:'
+                        ' %(error)s', {'path': path, 'error': e})
+
+
+# Sections of the shared rules file holding the built-in rule sets
+_SHARED_BUILTIN_SECTIONS = ('system', 'default')
+
+
+def _get_shared_file(conf):
+    path = conf.oslo_policy.shared_policy_file
+    if not path:
+        return None
+    return _shared.get_shared_file(path)
+
+
+def _shared_file_matches(conf, reader):
+    """Whether a shared rules file holds the built-in rules of conf."""
+
+    if reader is None or reader.metadata is None:
+        return False
+    metadata = jsonutils.loads(reader.metadata)
+    return (metadata.get('csp_domain_id') ==
+            conf.oslo_policy.CSP_domain_id and
+            all(name in reader for name in _SHARED_BUILTIN_SECTIONS))
+
+
+def _read_shared_builtin_rules(conf, reader):
+    """Read the system and default rule sets from a shared rules file.
+
+    :return: the rule sets, or None if the file does not hold them.
+    """
+
+    if not _shared_file_matches(conf, reader):
+        return None
+    try:
+        return [Rules(*reader.load(name))
+                for name in _SHARED_BUILTIN_SECTIONS]
+    except ValueError as e:
+        LOG.warning('Cannot read the built-in rules from the shared rules'
+                    ' file: %s', e)
+        return None
+
+
 class Enforcer(object):
     """Responsible for loading and enforcing rules.
 
@@ -329,25 +568,208 @@ class Enforcer(object):
     :param use_conf: Whether to load rules from cache or config file.
     :param overwrite: Whether to overwrite existing rules when reload rules
                       from config file.
+    :param instrumentation: An
+                            :class:`~oslo_policy.instrumentation.Instrumentation`
+                            to report measurements of every enforcement to.
     """
 
     def __init__(self, conf, rules=None, default_rule=None,
-                 use_conf=True, overwrite=True):
+                 use_conf=True, overwrite=True, instrumentation=None):
         self.conf = conf
         opts._register(conf)
         initialize(conf)
 
-        self.policy_api = sql.Backend(conf)
-        
-        default_rule = 'role:domain_admin'
-        self.sys_rules = _system.SystemRules(conf).sys_rules
-        self.sys_rules = Rules.from_dict(self.sys_rules, default_rule)
+        self._instrumentation = instrumentation
+        if instrumentation is not None:
+            common_sql.count_queries(conf)
+
+        self._shared = _get_shared_file(conf)
+        self.policy_api = sql.CachingBackend(conf, shared=self._shared)
+        _http.configure(conf)
+
+        self._compile_rules = conf.oslo_policy.compile_rules
+        self._parallel_http = conf.oslo_policy.http_check_parallel
+        self._adaptive_interval = None
+        if conf.oslo_policy.adaptive_reorder:
+            self._adaptive_interval = (
+                conf.oslo_policy.adaptive_reorder_interval)
+            if conf.oslo_policy.adaptive_profile_file:
+                _load_adaptive_profile(conf.oslo_policy.adaptive_profile_file)
+        self.sys_rules, self.dflt_rules = _get_builtin_rules(
+            conf, self._compile_rules, self._adaptive_interval)
+        if (self._shared is not None and
+                not _shared_file_matches(conf, self._shared.reader())):
+            self.publish_shared()
+
+        self._rule_cache = _cache.LRUCache(conf.oslo_policy.rule_cache_size)
+
+        # Decisions are keyed by the Check tree that made them, so a domain
+        # rule whose condition changed never reuses stale decisions.
+        self._decisions = None
+        size = conf.oslo_policy.decision_cache_size
+        if size > 0:
+            self._decisions = _cache.LRUCache(
+                size, ttl=conf.oslo_policy.decision_cache_time)
+            self._decision_inputs = _cache.LRUCache(size)
+
+    def _get_domain_rule(self, condition, parse=True):
+        """Return the parsed Check tree of a domain rule.
+
+        Parsed trees are cached under their condition, which serves as the
+        fingerprint: a rule is only parsed again once its condition changes,
+        and domains using the same condition share the same tree.
+
+        :param parse: Whether to parse the condition if it is not cached;
+                      if False, None is returned instead.
+        """
+
+        if (condition is None or isinstance(condition, six.string_types) or
+                isinstance(condition, _checks.BaseCheck)):
+            # Checks are read parsed from the shared rules file
+            fingerprint = condition
+        else:
+            fingerprint = jsonutils.dumps(condition, sort_keys=True)
+        rule = self._rule_cache.get(fingerprint)
+        if rule is None and parse:
+            if self._instrumentation is not None:
+                start = instrumentation.clock()
+            rule = self._parse_domain_rule(condition)
+            if self._parallel_http:
+                rule = _concurrent.parallelize(rule)
+            rule = _compiler.fold_roles(rule)
+            if self._adaptive_interval is not None:
+                rule = _adaptive.adapt(rule, self._compile_rules,
+                                       self._adaptive_interval)
+            elif self._compile_rules:
+                rule = _compiler.compile_check(rule)
+            self._rule_cache.set(fingerprint, rule)
+            if self._instrumentation is not None:
+                self._instrumentation.stage(instrumentation.STAGE_PARSE,
+                                            instrumentation.clock() - start)
+        return rule
+
+    @staticmethod
+    def _parse_domain_rule(condition):
+        """Parse and optimize the condition of a domain rule."""
+
+        if isinstance(condition, _checks.BaseCheck):
+            return condition
+        # Domain rules are evaluated without any rules to refer to
+        return _optimizer.optimize(_parser.parse_rule(condition), {})
+
+    def publish_shared(self):
+        """Write the rules of this process to the shared rules file.
+
+        Only the leader, the first process of the host to call this, writes
+        the file; it should call this again from time to time so that the
+        file follows its cache.  The file holds the system and default
+        rules, and the snapshots of the domains this process has cached.
+
+        :return: True if the file was written.
+        """
+
+        if self._shared is None or not self._shared.try_lead():
+            return False
+
+        sections = dict(zip(_SHARED_BUILTIN_SECTIONS,
+                            _get_builtin_rules(self.conf)))
+        revision, snapshots = self.policy_api.export_snapshots()
+        for domain_id, snapshot in snapshots:
+            rules = {}
+            for serv, serv_rules in snapshot.rules.items():
+                rules[serv] = dict((perm, self._parse_domain_rule(condition))
+                                   for perm, condition in serv_rules.items())
+            name = sql.SHARED_DOMAIN_PREFIX + domain_id
+            sections[name] = (rules, jsonutils.dumps(snapshot.policy))
+
+        metadata = {'csp_domain_id': self.conf.oslo_policy.CSP_domain_id,
+                    'revision': revision}
+        try:
+            self._shared.publish(sections, jsonutils.dumps(metadata))
+        except (EnvironmentError, ValueError) as e:
+            LOG.warning('Cannot write the shared rules file %(path)s:'
+                        ' %(error)s',
+                        {'path': self._shared.path, 'error': e})
+            return False
+        return True
+
+    def save_adaptive_profile(self, path=None):
+        """Save the branch orders learned by adaptive_reorder.
+
+        Processes started with the saved file as adaptive_profile_file
+        evaluate the branches in these orders from the start.  The orders
+        learned by every Enforcer of this process are saved.
+
+        :param path: The file to write, adaptive_profile_file by default.
+        :raises ValueError: if no file is given nor configured.
+        """
+
+        path = path or self.conf.oslo_policy.adaptive_profile_file
+        if not path:
+            raise ValueError(_('No adaptive profile file configured'))
+        data = jsonutils.dumps(_adaptive.export_profile(), sort_keys=True)
+        directory = os.path.dirname(os.path.abspath(path))
+        temp = fileutils.write_to_tempfile(data.encode('utf-8'), directory,
+                                           prefix='.adaptive-')
+        with fileutils.remove_path_on_error(temp):
+            os.rename(temp, path)
+
+    def cache_stats(self):
+        """Return the hit, miss and eviction counters of the caches.
+
+        :return: dict mapping each cache name to its counters.
+        """
+
+        stats = {'rules': self._rule_cache.stats(),
+                 'domains': self.policy_api.stats()}
+        if self._decisions is not None:
+            stats['decisions'] = self._decisions.stats()
+        return stats
+
+    def _evaluate(self, rule, target, creds, rule_dict):
+        """Evaluates a Check tree, through the decision cache if enabled."""
+
+        if self._decisions is None:
+            return rule(target, creds, rule_dict)
+
+        # Identical checks are shared between rule sets, and a "rule:" check
+        # evaluates differently against each.  Empty rule sets all evaluate
+        # the same.
+        scope = (rule, _cache.IdentityKey(rule_dict) if rule_dict else None)
+        inputs = self._decision_inputs.get(scope)
+        if inputs is None:
+            inputs = _analysis.get_inputs(rule, rule_dict)
+            self._decision_inputs.set(scope, inputs)
+
+        values = None
+        if inputs.cacheable:
+            values = inputs.extract(target, creds)
+        if values is None:
+            return rule(target, creds, rule_dict)
+
+        key = (scope, values)
+        result = self._decisions.get(key)
+        if result is None:
+            result = rule(target, creds, rule_dict)
+            self._decisions.set(key, result)
+        return result
+
+    def invalidate(self, domain_id):
+        """Forget the cached policy of a domain.
+
+        Call this after the policy or the rules of a domain were changed,
+        so that the next enforcement reads them from the database.
+        """
+
+        self.policy_api.invalidate(domain_id)
+
+    def invalidate_all(self):
+        """Forget the cached policies of all domains."""
 
-        self.dflt_rules = _default_domain.DefaultRules().dflt_rules
-        self.dflt_rules = Rules.from_dict(self.dflt_rules, default_rule)
+        self.policy_api.invalidate_all()
 
     def _enforce(self, rule, target, creds, rule_dict=None, do_raise=False,
-                exc=None, *args, **kwargs):
+                 exc=None, *args, **kwargs):
         """Checks authorization of a rule against the target and credentials.
 
         :param rule: The rule to evaluate.
@@ -371,23 +793,24 @@ class Enforcer(object):
                  expression.
         """
 
-        # Allow the rule to be a Check tree. In this situation, there should NOT
-        # be any "rule:" reference in param rule passed in.
+        # Allow the rule to be a Check tree. In this situation, there should
+        # NOT be any "rule:" reference in param rule passed in.
         if isinstance(rule, _checks.BaseCheck):
-            result = rule(target, creds, {})
+            result = self._evaluate(rule, target, creds, {})
 
         elif rule_dict:
             try:
                 serv = rule[0]
                 perm = rule[1]
-                result = rule_dict[serv][perm](target, creds, rule_dict[serv])
+                result = self._evaluate(rule_dict[serv][perm], target, creds,
+                                        rule_dict[serv])
             except KeyError:
                 LOG.debug('Rule [service:%(serv)s, permission:%(perm)s] does'
-                          ' not exist' % {'serv':rule[0], 'perm':rule[1]})
+                          ' not exist', {'serv': rule[0], 'perm': rule[1]})
                 result = False
 
         else:
-            LOG.warning('Wrong execution path, Rule [%s] does not exist' % rule)
+            LOG.warning('Wrong execution path, Rule [%s] does not exist', rule)
             result = False
 
         # If result is False, raise the exception provided
@@ -398,34 +821,189 @@ class Enforcer(object):
 
         return result
 
-    def enforce(self, action, target, creds, **kwargs):
-        LOG.debug('Evaluating against System Authz Policy')
-        sys_rst = self._enforce(action, target, creds, rule_dict=
-                                                self.sys_rules, **kwargs)
-        if not sys_rst:
-            return sys_rst
+    def _select_domain_rule(self, action, snapshot, parse=True):
+        """Return what an action is checked against after the system policy.
 
-        LOG.debug('Evaluating against Domain Authz Policy')
-        # We can always get scope_domain_id from creds.
-        domain_id = creds['domain_id'] 
-        p_ref = self.policy_api.get_enabled_policy_in_domain(domain_id)
-        if p_ref:
-            try:
-                r_dict = self.policy_api.get_rule(p_ref['id'], action[0],
-                                                                    action[1])
-                rule = _parser.parse_rule(r_dict['condition'])
-                return self._enforce(rule, target, creds, **kwargs)
+        :param snapshot: The :class:`~oslo_policy.sql.DomainSnapshot` of the
+                         domain the credentials are scoped to.
+        :param parse: Whether to parse the domain rule if it is not cached.
+        :return: tuple of the arguments of :meth:`_enforce`: the Check tree
+                 of the domain rule and None, or the action and the default
+                 rules.  None if parse is False and the domain rule is not
+                 parsed yet.
+        """
 
+        if snapshot.policy:
+            try:
+                condition = snapshot.get_rule(action[0], action[1])
             except exception.RuleNotFound:
                 LOG.debug('Tenant domain has an enabled policy, but rule'
                           ' on target service and permission has not been'
                           ' specified. Using the corresponding rule in'
                           ' default policy.')
-                return self._enforce(action, target, creds,
-                                        rule_dict=self.dflt_rules, **kwargs)
+            else:
+                rule = self._get_domain_rule(condition, parse)
+                return None if rule is None else (rule, None)
         else:
             LOG.debug('Tenant domain has no enabled policy. Using'
                       ' the corresponding rule in default policy.')
-            return self._enforce(action, target, creds,
-                                        rule_dict=self.dflt_rules, **kwargs)
+        return action, self.dflt_rules
+
+    def _enforce_domain(self, action, target, creds, snapshot, **kwargs):
+        """Checks an action against the domain or the default policy.
+
+        :param snapshot: The :class:`~oslo_policy.sql.DomainSnapshot` of the
+                         domain the credentials are scoped to.
+        """
+
+        rule, rule_dict = self._select_domain_rule(action, snapshot)
+        return self._enforce(rule, target, creds, rule_dict=rule_dict,
+                             **kwargs)
+
+    def _probe(self):
+        """Start measuring an enforcement, if instrumented."""
 
+        if self._instrumentation is None:
+            return None
+        return instrumentation._Probe(self._instrumentation,
+                                      common_sql.query_count)
+
+    def enforce(self, action, target, creds, **kwargs):
+        if self._instrumentation is None:
+            return self._enforce_action(action, target, creds, None, **kwargs)
+
+        probe = self._probe()
+        result = False
+        try:
+            result = self._enforce_action(action, target, creds, probe,
+                                          **kwargs)
+            return result
+        finally:
+            probe.done(action, result)
+
+    def _enforce_action(self, action, target, creds, probe, **kwargs):
+        # Preprocess the credentials once for all the checks below
+        if not isinstance(creds, _checks.Credentials):
+            creds = _checks.Credentials(creds)
+
+        LOG.debug('Evaluating against System Authz Policy')
+        sys_rst = self._enforce(action, target, creds,
+                                rule_dict=self.sys_rules, **kwargs)
+        if probe is not None:
+            probe.stage(instrumentation.STAGE_SYSTEM)
+        if not sys_rst:
+            return sys_rst
+
+        LOG.debug('Evaluating against Domain Authz Policy')
+        # We can always get scope_domain_id from creds.
+        domain_id = creds['domain_id']
+        snapshot = self.policy_api.get_domain_snapshot(domain_id, action)
+        if probe is not None:
+            probe.stage(instrumentation.STAGE_DOMAIN_LOOKUP)
+        result = self._enforce_domain(action, target, creds, snapshot,
+                                      **kwargs)
+        if probe is not None:
+            probe.stage(instrumentation.STAGE_DOMAIN)
+        return result
+
+    def _iter_enforce(self, actions_and_targets, creds, **kwargs):
+        if not isinstance(creds, _checks.Credentials):
+            creds = _checks.Credentials(creds)
+
+        snapshot = None
+        for action, target in actions_and_targets:
+            probe = self._probe()
+            result = False
+            try:
+                result = self._enforce(action, target, creds,
+                                       rule_dict=self.sys_rules, **kwargs)
+                if probe is not None:
+                    probe.stage(instrumentation.STAGE_SYSTEM)
+                if result:
+                    # The domain policy is only looked up once, and only if
+                    # at least one pair passes the system policy.
+                    if snapshot is None:
+                        snapshot = self.policy_api.get_domain_snapshot(
+                            creds['domain_id'])
+                        if probe is not None:
+                            probe.stage(instrumentation.STAGE_DOMAIN_LOOKUP)
+                    result = self._enforce_domain(action, target, creds,
+                                                  snapshot, **kwargs)
+                    if probe is not None:
+                        probe.stage(instrumentation.STAGE_DOMAIN)
+            finally:
+                if probe is not None:
+                    probe.done(action, result)
+            yield result
+
+    def enforce_many(self, actions_and_targets, creds, stream=False,
+                     **kwargs):
+        """Checks many (action, target) pairs for one set of credentials.
+
+        The result of each pair is the same as :meth:`enforce` would return,
+        but the credentials are preprocessed and the domain policy is
+        looked up once for all pairs.
+
+        :param actions_and_targets: iterable of (action, target) tuples, where
+                                    action is a (service, permission) tuple.
+        :param dict creds: As much information about the user performing the
+                           action as possible.
+        :param stream: If True, return an iterator yielding the results as
+                       they are computed instead of a list.
+        :return: list, or iterator if ``stream`` is True, of results in the
+                 order of ``actions_and_targets``.
+        """
+
+        results = self._iter_enforce(actions_and_targets, creds, **kwargs)
+        if stream:
+            return results
+        return list(results)
+
+    def filter_predicate(self, action, creds):
+        """Return the condition targets must meet for an action to be allowed.
+
+        The rules of the action are evaluated as :meth:`enforce` would,
+        except that everything read from the target is left as a
+        :class:`~oslo_policy.predicates.Predicate`: :meth:`enforce` allows
+        the action on a target exactly when the predicate matches it.  List
+        APIs can translate it into a database query with
+        :func:`~oslo_policy.predicates.to_sqlalchemy` instead of enforcing
+        the action on every object.
+
+        :param action: The (service, permission) tuple.
+        :param dict creds: As much information about the user performing the
+                           action as possible.
+        :return: a :class:`~oslo_policy.predicates.Predicate`, or None if the
+                 rules cannot be reduced to one, e.g. because they hold
+                 ``http:`` checks; the objects must then be checked one by
+                 one with :meth:`enforce`.
+        :raises DomainNotFound: as :meth:`enforce` would for any target that
+                                passes the system policy.
+        """
+
+        if not isinstance(creds, _checks.Credentials):
+            creds = _checks.Credentials(creds)
+
+        sys_predicate = _partial.evaluate_action(action, creds,
+                                                 self.sys_rules)
+        if sys_predicate is None or sys_predicate is predicates.FALSE:
+            return sys_predicate
+
+        snapshot = self.policy_api.get_domain_snapshot(creds['domain_id'],
+                                                       action)
+        return self._domain_filter_predicate(action, creds, snapshot,
+                                             sys_predicate)
+
+    def _domain_filter_predicate(self, action, creds, snapshot,
+                                 sys_predicate):
+        """Combine the system predicate with the domain or default one."""
+
+        rule, rule_dict = self._select_domain_rule(action, snapshot)
+        if rule_dict is None:
+            domain_predicate = _partial.evaluate(rule, creds)
+        else:
+            domain_predicate = _partial.evaluate_action(rule, creds,
+                                                        rule_dict)
+        if domain_predicate is None:
+            return None
+        return _partial.conjunction([sys_predicate, domain_predicate])
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Conditions on targets, to filter lists of objects in the database.
+
+:meth:`~oslo_policy.policy.Enforcer.filter_predicate` resolves everything
+the rules of an action read from the credentials, and returns what is left:
+a condition on the attributes of the target, built from the types below.
+List APIs can translate it into a ``WHERE`` clause with
+:func:`to_sqlalchemy` instead of fetching every object and enforcing the
+action on each::
+
+    predicate = enforcer.filter_predicate(('keystone', 'list_projects'),
+                                          creds)
+    if predicate is None:
+        # The rules cannot be reduced to a condition on the target
+        projects = [p for p in query.all()
+                    if enforcer.enforce(action, target_of(p), creds)]
+    else:
+        columns = {'obj.project.domain_id': Project.domain_id}
+        projects = query.filter(
+            predicates.to_sqlalchemy(predicate, columns)).all()
+
+Like the rules, predicates compare the text of the target attributes: the
+attribute rendered with ``'%s'``.
+"""
+
+import abc
+
+import six
+import sqlalchemy as sql
+
+
+@six.add_metaclass(abc.ABCMeta)
+class Predicate(object):
+    """A condition on a target.
+
+    Predicates are immutable, and compare equal when they are made of the
+    same conditions.
+    """
+
+    __slots__ = ()
+
+    @abc.abstractmethod
+    def matches(self, target):
+        """Whether target meets the condition.
+
+        :param dict target: The target, as passed to
+                            :meth:`~oslo_policy.policy.Enforcer.enforce`.
+        """
+
+        pass
+
+    @abc.abstractmethod
+    def _key(self):
+        """Return what the predicate is made of, compared and hashed."""
+
+        pass
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self._key()))
+
+
+class _Constant(Predicate):
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def matches(self, target):
+        return self.value
+
+    def _key(self):
+        return self.value
+
+    def __str__(self):
+        return 'True' if self.value else 'False'
+
+    def __repr__(self):
+        return 'TRUE' if self.value else 'FALSE'
+
+
+#: Met by every target.
+TRUE = _Constant(True)
+
+#: Met by no target.
+FALSE = _Constant(False)
+
+
+class Eq(Predicate):
+    """The target has the attribute key, and its text is value.
+
+    :param key: The target key, e.g. ``obj.project.domain_id``.
+    :param value: The text the attribute must have.
+    """
+
+    __slots__ = ('key', 'value')
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+    def matches(self, target):
+        try:
+            return '%s' % (target[self.key],) == self.value
+        except KeyError:
+            return False
+
+    def _key(self):
+        return (self.key, self.value)
+
+    def __str__(self):
+        return '%s == %r' % (self.key, self.value)
+
+    def __repr__(self):
+        return 'Eq(%r, %r)' % (self.key, self.value)
+
+
+class Not(Predicate):
+    """The target does not meet a predicate.
+
+    :param predicate: The predicate negated.
+    """
+
+    __slots__ = ('predicate',)
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def matches(self, target):
+        return not self.predicate.matches(target)
+
+    def _key(self):
+        return self.predicate
+
+    def __str__(self):
+        return 'not %s' % self.predicate
+
+    def __repr__(self):
+        return 'Not(%r)' % (self.predicate,)
+
+
+class And(Predicate):
+    """The target meets every one of several predicates.
+
+    :param predicates: The predicates.
+    """
+
+    __slots__ = ('predicates',)
+
+    def __init__(self, predicates):
+        self.predicates = tuple(predicates)
+
+    def matches(self, target):
+        return all(p.matches(target) for p in self.predicates)
+
+    def _key(self):
+        return self.predicates
+
+    def __str__(self):
+        return '(%s)' % ' and '.join(str(p) for p in self.predicates)
+
+    def __repr__(self):
+        return 'And(%r)' % (list(self.predicates),)
+
+
+class Or(Predicate):
+    """The target meets at least one of several predicates.
+
+    :param predicates: The predicates.
+    """
+
+    __slots__ = ('predicates',)
+
+    def __init__(self, predicates):
+        self.predicates = tuple(predicates)
+
+    def matches(self, target):
+        return any(p.matches(target) for p in self.predicates)
+
+    def _key(self):
+        return self.predicates
+
+    def __str__(self):
+        return '(%s)' % ' or '.join(str(p) for p in self.predicates)
+
+    def __repr__(self):
+        return 'Or(%r)' % (list(self.predicates),)
+
+
+def to_sqlalchemy(predicate, columns):
+    """Translate a predicate into a SQLAlchemy boolean expression.
+
+    Values are compared with the columns as they are, so the columns should
+    hold the text the policy compares; an integer column, for instance,
+    compares correctly with the text of an integer on most databases.  A
+    ``NULL`` column stands for an attribute whose text is ``'None'``, as it
+    does for the policy.
+
+    :param predicate: A :class:`Predicate`.
+    :param columns: Mapping of the target keys to the columns holding them,
+                    e.g. ``{'obj.project.domain_id': Project.domain_id}``.
+    :raises KeyError: if the predicate reads a key missing from columns.
+    """
+
+    return _to_sqlalchemy(predicate, columns, False)
+
+
+def _to_sqlalchemy(predicate, columns, negate):
+    # Negations are pushed down to the comparisons, which must let NULL
+    # columns through explicitly: NOT of a comparison with NULL is NULL.
+    if isinstance(predicate, _Constant):
+        return sql.true() if predicate.value != negate else sql.false()
+
+    elif isinstance(predicate, Eq):
+        column = columns[predicate.key]
+        if predicate.value == 'None':
+            if negate:
+                return sql.and_(column != predicate.value,
+                                column.isnot(None))
+            return sql.or_(column == predicate.value, column.is_(None))
+        if negate:
+            return sql.or_(column != predicate.value, column.is_(None))
+        return column == predicate.value
+
+    elif isinstance(predicate, Not):
+        return _to_sqlalchemy(predicate.predicate, columns, not negate)
+
+    elif isinstance(predicate, (And, Or)):
+        clauses = [_to_sqlalchemy(p, columns, negate)
+                   for p in predicate.predicates]
+        if isinstance(predicate, And) != negate:
+            return sql.and_(*clauses)
+        return sql.or_(*clauses)
+
+    raise TypeError('Unknown predicate %r' % (predicate,))
@@ -12,6 +12,11 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import threading
+
+from oslo_serialization import jsonutils
+
+from oslo_policy import _cache
 from oslo_policy.common import sql
 from oslo_policy import exception
 from oslo_log import log
@@ -22,15 +27,44 @@ LOG = log.getLogger(__name__)
 
 class Policy(sql.ModelBase, sql.DictBase):
     __tablename__ = 'policy'
-    attributes = ['description', 'domain_id', 'enabled', 'id', 'name']
+    attributes = ['description', 'domain_id', 'enabled', 'id', 'name',
+                  'revision']
     id = sql.Column(sql.String(64), primary_key=True)
     name = sql.Column(sql.String(64), nullable=False)
     domain_id = sql.Column(sql.String(64), sql.ForeignKey('domain.id'),
                            nullable=False)
     enabled = sql.Column(sql.Boolean, default=False, nullable=False)
     description = sql.Column(sql.Text(), nullable=True)
+    revision = sql.Column(sql.Integer, default=0, server_default='0',
+                          nullable=False)
     extra = sql.Column(sql.JsonBlob())
-    __table_args__ = (sql.UniqueConstraint('domain_id', 'name'), {})
+    __table_args__ = (sql.UniqueConstraint('domain_id', 'name'),
+                      # Covers the enabled policy lookup of a domain
+                      sql.Index('ix_policy_domain_id_enabled',
+                                'domain_id', 'enabled', 'id'),
+                      {})
+
+
+# At most one enabled policy per domain, by dialect.  MySQL has no partial
+# indexes, so it indexes a generated column that only holds the domain of
+# enabled policies.  Elsewhere it is up to the code enabling policies, and
+# the readers use the first enabled policy.
+_ENABLED_POLICY_INDEX = 'ux_policy_domain_id_enabled'
+_partial_index_ddl = sql.DDL(
+    'CREATE UNIQUE INDEX %s ON policy (domain_id) WHERE enabled' %
+    _ENABLED_POLICY_INDEX)
+_enabled_policy_ddls = {
+    'sqlite': _partial_index_ddl,
+    'postgresql': _partial_index_ddl,
+    'mysql': sql.DDL(
+        'ALTER TABLE policy ADD COLUMN enabled_domain_id VARCHAR(64) '
+        'GENERATED ALWAYS AS (IF(enabled, domain_id, NULL)) VIRTUAL, '
+        'ADD UNIQUE INDEX %s (enabled_domain_id)' % _ENABLED_POLICY_INDEX),
+}
+
+for _dialect, _ddl in _enabled_policy_ddls.items():
+    sql.event.listen(Policy.__table__, 'after_create',
+                     _ddl.execute_if(dialect=_dialect))
 
 
 class Rule(sql.ModelBase, sql.DictBase):
@@ -49,15 +83,34 @@ class Rule(sql.ModelBase, sql.DictBase):
 
 class Domain(sql.ModelBase, sql.DictBase):
     __tablename__ = 'domain'
-    attributes = ['id', 'name', 'enabled', 'description']
+    attributes = ['id', 'name', 'enabled', 'description', 'revision']
     id = sql.Column(sql.String(64), primary_key=True)
     name = sql.Column(sql.String(64), nullable=False)
     enabled = sql.Column(sql.Boolean, default=True, nullable=False)
     description = sql.Column(sql.Text(), nullable=True)
+    revision = sql.Column(sql.Integer, default=0, server_default='0',
+                          nullable=False)
     extra = sql.Column(sql.JsonBlob())
     __table_args__ = (sql.UniqueConstraint('name'), {})
 
 
+class PolicyChange(sql.ModelBase):
+    """An entry of the policy change feed.
+
+    The id is the revision of the change; revisions only ever increase.
+    """
+    __tablename__ = 'policy_change'
+    id = sql.Column(sql.Integer, primary_key=True, autoincrement=True)
+    domain_id = sql.Column(sql.String(64), nullable=False)
+    # Never reuse the ids of purged rows
+    __table_args__ = ({'sqlite_autoincrement': True},)
+
+
+# Columns added to tables after they were first released, created on
+# existing tables by db_sync()
+_ADDED_COLUMNS = [(Policy, 'revision'), (Domain, 'revision')]
+
+
 class Backend(object):
 
     def __init__(self, conf):
@@ -78,11 +131,14 @@ class Backend(object):
             return [policy_ref.to_dict() for policy_ref in policy_refs]
 
     def get_enabled_policy_in_domain(self, domain_id):
-        policies_ref = self._list_policies_in_domain(domain_id)
-        if policies_ref:
-            for policy_ref in policies_ref:
-                if policy_ref['enabled']:
-                    return policy_ref
+        with sql.transaction(self.conf) as session:
+            policy_ref = (session.query(Policy).
+                          filter_by(domain_id=domain_id, enabled=True).
+                          order_by(Policy.id).first())
+            if policy_ref is not None:
+                return policy_ref.to_dict()
+        # Only look the domain up to tell a missing one apart
+        self._get_domain(domain_id)
 
     def get_rule(self, p_id, serv, perm):
         """
@@ -98,3 +154,384 @@ class Backend(object):
             except:
                 raise exception.RuleNotFound(p_id=p_id, serv=serv, perm=perm)
         return rule_ref.to_dict()
+
+    def record_change(self, domain_id, policy_id=None):
+        """Record that the policy of a domain changed.
+
+        Call this from the transaction that changes the policy, e.g. inside
+        :func:`oslo_policy.common.sql.session_scope`, so that the change and
+        its record are committed together.
+
+        :param domain_id: ID of the domain whose policy changed.
+        :param policy_id: ID of the policy that changed, if any.
+        :return: the revision of the change.
+        """
+        with sql.transaction(self.conf) as session:
+            change = PolicyChange(domain_id=domain_id)
+            session.add(change)
+            session.flush()
+            revision = change.id
+
+            (session.query(Domain).filter_by(id=domain_id).
+             update({'revision': revision}, synchronize_session=False))
+            if policy_id is not None:
+                (session.query(Policy).filter_by(id=policy_id).
+                 update({'revision': revision}, synchronize_session=False))
+            return revision
+
+    def get_changes_since(self, revision=None):
+        """Return the domains whose policy changed after a revision.
+
+        :param revision: A revision returned by a previous call, or None to
+                         only get the latest revision.
+        :return: tuple of the latest revision, or 0 if nothing was ever
+                 recorded, and the set of IDs of the changed domains.
+        """
+        with sql.transaction(self.conf) as session:
+            if revision is None:
+                latest = session.query(sql.func.max(PolicyChange.id)).scalar()
+                return latest or 0, set()
+
+            rows = (session.query(PolicyChange.id, PolicyChange.domain_id).
+                    filter(PolicyChange.id > revision).all())
+            latest = max([revision] + [r[0] for r in rows])
+            return latest, set(r[1] for r in rows)
+
+    def purge_changes(self, revision):
+        """Delete the change feed entries up to a revision.
+
+        The latest entry is always kept, so that revisions are not reused
+        by backends that reset their counters on restart.
+        """
+        with sql.transaction(self.conf) as session:
+            latest = session.query(sql.func.max(PolicyChange.id)).scalar()
+            if latest is None:
+                return
+            (session.query(PolicyChange).
+             filter(PolicyChange.id <= min(revision, latest - 1)).
+             delete(synchronize_session=False))
+
+    def get_enabled_policy_rules(self, domain_id):
+        """Load the enabled policy of a domain and all of its rules at once.
+
+        A single query joins ``domain``, the enabled row of ``policy`` and
+        its ``rule`` rows.  Should the domain have several enabled
+        policies, the one with the lowest ID is used.
+
+        :param domain_id: ID of the domain.
+        :return: tuple of the enabled policy dict, or None if the domain has
+                 no enabled policy, and a dict mapping service to a dict of
+                 permission to condition, as accepted by
+                 :meth:`oslo_policy.policy.Rules.from_dict`.
+        :raises DomainNotFound: if the domain does not exist.
+        """
+        with sql.transaction(self.conf) as session:
+            query = (session.query(Domain.id, Policy, Rule.service,
+                                   Rule.permission, Rule.condition).
+                     outerjoin(Policy, sql.and_(Policy.domain_id == Domain.id,
+                                                Policy.enabled == sql.true())).
+                     outerjoin(Rule, Rule.policy_id == Policy.id).
+                     filter(Domain.id == domain_id))
+            rows = query.all()
+            if not rows:
+                raise exception.DomainNotFound(domain_id=domain_id)
+
+            # Where the unique index of enabled policies is missing, a domain
+            # may have several: use the first one, as
+            # get_enabled_policy_in_domain() does.
+            policy_ids = [row[1].id for row in rows if row[1] is not None]
+            if not policy_ids:
+                return None, {}
+            policy_id = min(policy_ids)
+
+            policy_ref = None
+            rules = {}
+            for _d_id, p_ref, serv, perm, condition in rows:
+                if p_ref is None or p_ref.id != policy_id:
+                    continue
+                if policy_ref is None:
+                    policy_ref = p_ref.to_dict()
+                if serv is not None:
+                    rules.setdefault(serv, {})[perm] = condition
+            return policy_ref, rules
+
+    def get_enabled_policy_rule(self, domain_id, serv, perm):
+        """Load the enabled policy of a domain and one of its rules at once.
+
+        Like :meth:`get_enabled_policy_rules`, but only the rule of one
+        action is read, for callers that enforce a single action without
+        caching the whole policy.
+
+        :param domain_id: ID of the domain.
+        :param serv: target service, e.g. 'keystone'.
+        :param perm: target permission, e.g. 'create_domain'.
+        :return: tuple of the enabled policy dict, or None if the domain has
+                 no enabled policy, and a dict mapping serv to a dict of perm
+                 to its condition, or an empty dict if the policy has no such
+                 rule.
+        :raises DomainNotFound: if the domain does not exist.
+        """
+        with sql.transaction(self.conf) as session:
+            query = (session.query(Domain.id, Policy, Rule.id,
+                                   Rule.condition).
+                     outerjoin(Policy, sql.and_(Policy.domain_id == Domain.id,
+                                                Policy.enabled == sql.true())).
+                     outerjoin(Rule, sql.and_(Rule.policy_id == Policy.id,
+                                              Rule.service == serv,
+                                              Rule.permission == perm)).
+                     filter(Domain.id == domain_id).
+                     order_by(Policy.id))
+            row = query.first()
+            if row is None:
+                raise exception.DomainNotFound(domain_id=domain_id)
+
+            _d_id, p_ref, rule_id, condition = row
+            if p_ref is None:
+                return None, {}
+            rules = {}
+            if rule_id is not None:
+                rules[serv] = {perm: condition}
+            return p_ref.to_dict(), rules
+
+
+def db_sync(conf):
+    """Create the policy tables, or add what is missing to existing ones.
+
+    New tables are created with all of their columns and indexes.  The
+    columns and indexes added since the tables were first released are
+    created on existing tables, so it is safe to run this on every upgrade.
+
+    :raises DBError: if a domain has several enabled policies, which the
+                     unique index of enabled policies does not allow.
+    """
+
+    engine = sql.get_engine(conf)
+    sql.ModelBase.metadata.create_all(engine)
+
+    inspector = sql.inspect(engine)
+    for model, name in _ADDED_COLUMNS:
+        table = model.__table__
+        columns = set(c['name'] for c in inspector.get_columns(table.name))
+        if name in columns:
+            continue
+        LOG.info('Adding column %(table)s.%(column)s',
+                 {'table': table.name, 'column': name})
+        column = table.columns[name]
+        with engine.begin() as connection:
+            connection.execute(sql.DDL(
+                'ALTER TABLE %s ADD COLUMN %s %s DEFAULT %s NOT NULL' %
+                (table.name, name, column.type.compile(engine.dialect),
+                 column.server_default.arg)))
+
+    existing = set(index['name']
+                   for index in inspector.get_indexes('policy'))
+    for index in Policy.__table__.indexes:
+        if index.name not in existing:
+            LOG.info('Creating index %s', index.name)
+            index.create(engine)
+
+    ddl = _enabled_policy_ddls.get(engine.dialect.name)
+    if _ENABLED_POLICY_INDEX not in existing and ddl is not None:
+        LOG.info('Creating index %s', _ENABLED_POLICY_INDEX)
+        with engine.begin() as connection:
+            connection.execute(ddl)
+
+
+# Shared rules file sections holding domain snapshots
+SHARED_DOMAIN_PREFIX = 'domain:'
+
+
+class DomainSnapshot(object):
+    """The enabled policy of a domain together with all of its rules.
+
+    :param policy: dict of the enabled policy, or None if the domain has no
+                   enabled policy.
+    :param rules: dict mapping service to a dict of permission to condition.
+    """
+
+    def __init__(self, policy, rules=None):
+        self.policy = policy
+        self.rules = rules or {}
+
+    def get_rule(self, serv, perm):
+        """Return the condition of a rule, or raise RuleNotFound."""
+
+        try:
+            return self.rules[serv][perm]
+        except KeyError:
+            raise exception.RuleNotFound(p_id=self.policy['id'], serv=serv,
+                                         perm=perm)
+
+
+class CachingBackend(object):
+    """Keep per-domain policy snapshots in front of a :class:`Backend`.
+
+    Snapshots expire after ``[oslo_policy] domain_cache_time`` seconds, and at
+    most ``[oslo_policy] domain_cache_size`` of them are kept.  The policy
+    admin path should call :meth:`invalidate` or :meth:`invalidate_all` after
+    changing a policy so the change is seen right away.
+
+    Other processes learn about changes from the change feed written by
+    :meth:`Backend.record_change`: every ``[oslo_policy]
+    policy_change_poll_interval`` seconds, one query fetches the domains
+    that changed since the last read and only their snapshots are dropped.
+
+    With the change feed enabled, snapshots missing from the cache are first
+    looked up in the shared rules file, if any, where the leader process of
+    the host writes the snapshots it has cached.  Snapshots of domains that
+    changed since the file was written are read from the database instead.
+
+    :param shared: The :class:`oslo_policy._shared.SharedRulesFile` of the
+                   host, or None.
+    """
+
+    def __init__(self, conf, backend=None, shared=None):
+        self.conf = conf
+        self.backend = backend or Backend(conf)
+
+        ttl = conf.oslo_policy.domain_cache_time
+        size = conf.oslo_policy.domain_cache_size if ttl > 0 else 0
+        self._snapshots = _cache.LRUCache(size, ttl=ttl)
+
+        # Bumped on every invalidation, so that a snapshot loaded while an
+        # invalidation happened is never stored.
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self._poll_interval = (conf.oslo_policy.policy_change_poll_interval
+                               if size > 0 else 0)
+        self._next_poll = 0
+        # Polls read from the revision seen by the poll before the last one,
+        # to catch changes that committed later than newer ones.
+        self._revisions = (None, None)
+
+        self._shared = shared if self._poll_interval > 0 else None
+        self._shared_reader = None
+        # Domains that changed since the shared file was written
+        self._shared_stale = set()
+
+    def _load_snapshot(self, domain_id):
+        p_ref, rules = self.backend.get_enabled_policy_rules(domain_id)
+        return DomainSnapshot(p_ref, rules)
+
+    def _load_shared_snapshot(self, domain_id):
+        """Return the snapshot of a domain from the shared file, or None.
+
+        The rules of the returned snapshot are parsed Check trees.
+        """
+
+        reader = self._shared.reader()
+        if reader is None or reader.metadata is None:
+            return None
+
+        if reader is not self._shared_reader:
+            revision = jsonutils.loads(reader.metadata).get('revision')
+            if revision is None:
+                return None
+            _latest, changed = self.backend.get_changes_since(revision)
+            with self._lock:
+                self._shared_reader = reader
+                self._shared_stale = changed
+
+        name = SHARED_DOMAIN_PREFIX + domain_id
+        if domain_id in self._shared_stale or name not in reader:
+            return None
+        try:
+            rules, _default_rule = reader.load(name)
+        except ValueError as e:
+            LOG.warning('Cannot read %(name)s from the shared rules file:'
+                        ' %(error)s', {'name': name, 'error': e})
+            return None
+        return DomainSnapshot(
+            jsonutils.loads(reader.section_metadata(name)), rules)
+
+    def get_domain_snapshot(self, domain_id, action=None):
+        """Return the :class:`DomainSnapshot` of a domain.
+
+        :param action: The (service, permission) tuple of the only action
+                       the snapshot is used for, if any.  When snapshots are
+                       not cached, only the rule of that action is loaded
+                       instead of the whole policy.
+        :raises DomainNotFound: if the domain does not exist.
+        """
+
+        if action is not None and not self._snapshots.maxsize:
+            p_ref, rules = self.backend.get_enabled_policy_rule(
+                domain_id, action[0], action[1])
+            return DomainSnapshot(p_ref, rules)
+
+        if self._poll_interval > 0 and _cache._clock() >= self._next_poll:
+            self.poll_changes()
+
+        snapshot = self._snapshots.get(domain_id)
+        if snapshot is None:
+            generation = self._generation
+            with sql.session_scope(self.conf):
+                if self._shared is not None:
+                    snapshot = self._load_shared_snapshot(domain_id)
+                if snapshot is None:
+                    snapshot = self._load_snapshot(domain_id)
+            with self._lock:
+                if generation == self._generation:
+                    self._snapshots.set(domain_id, snapshot)
+        return snapshot
+
+    def poll_changes(self):
+        """Drop the snapshots of the domains that changed since last time.
+
+        :return: the set of IDs of the changed domains.
+        """
+
+        with self._lock:
+            if self._poll_interval > 0:
+                self._next_poll = _cache._clock() + self._poll_interval
+            older, last = self._revisions
+
+        latest, domain_ids = self.backend.get_changes_since(older)
+        for domain_id in domain_ids:
+            self.invalidate(domain_id)
+        if self._shared is not None:
+            with self._lock:
+                self._shared_stale.update(domain_ids)
+
+        with self._lock:
+            if self._revisions == (older, last):
+                self._revisions = (last if last is not None else latest,
+                                   latest)
+        return domain_ids
+
+    def export_snapshots(self):
+        """Return the cached snapshots, for the shared rules file.
+
+        :return: tuple of a revision and a list of (domain ID, snapshot)
+                 tuples.  The snapshots reflect every change up to the
+                 revision.  Without a shared rules file, or the change feed
+                 to tell which snapshots are still valid, no snapshot is
+                 exported.
+        """
+
+        if self._shared is None:
+            return None, []
+        if self._revisions[0] is None:
+            self.poll_changes()
+        revision = self._revisions[0]
+        return revision, self._snapshots.items()
+
+    def invalidate(self, domain_id):
+        """Drop the cached snapshot of a domain."""
+
+        with self._lock:
+            self._generation += 1
+            self._snapshots.pop(domain_id)
+
+    def invalidate_all(self):
+        """Drop every cached snapshot."""
+
+        with self._lock:
+            self._generation += 1
+            self._snapshots.clear()
+
+    def stats(self):
+        """Return the counters of the snapshot cache."""
+
+        return self._snapshots.stats()
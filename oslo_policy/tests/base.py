@@ -0,0 +1,62 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import tempfile
+
+from oslo_config import cfg
+from oslotest import base as test_base
+
+from oslo_policy.common import sql as common_sql
+from oslo_policy import opts
+from oslo_policy import sql
+
+
+class SQLTestCase(test_base.BaseTestCase):
+    """Run against a fresh SQLite policy database.
+
+    The database holds the domain ``d1`` and its enabled policy ``p1``.
+    """
+
+    def setUp(self):
+        super(SQLTestCase, self).setUp()
+
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        self.conf = cfg.ConfigOpts()
+        opts._register(self.conf)
+        self.conf([])
+        self.conf.set_override('CSP_domain_id', 'csp', group='oslo_policy')
+        self.conf.set_override('policy_connection', 'sqlite:///' + path,
+                               group='oslo_policy')
+
+        common_sql.cleanup()
+        self.addCleanup(common_sql.cleanup)
+        sql.db_sync(self.conf)
+
+        with common_sql.transaction(self.conf) as session:
+            session.add(sql.Domain(id='d1', name='d1', enabled=True,
+                                   extra={}))
+            session.add(sql.Policy(id='p1', name='p1', domain_id='d1',
+                                   enabled=True, extra={}))
+
+    def add_rule(self, policy_id, serv, perm, condition):
+        with common_sql.transaction(self.conf) as session:
+            session.add(sql.Rule(id='%s:%s:%s' % (policy_id, serv, perm),
+                                 policy_id=policy_id, service=serv,
+                                 permission=perm, condition=condition,
+                                 extra={}))
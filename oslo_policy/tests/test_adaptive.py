@@ -0,0 +1,147 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+import sys
+import threading
+
+from oslotest import base as test_base
+
+from oslo_policy import _adaptive
+from oslo_policy import _checks
+from oslo_policy import _compiler
+from oslo_policy import _optimizer
+from oslo_policy import _parser
+from oslo_policy.tests import test_optimizer
+
+
+def _adapt(rule, compile_rules=False, interval=8):
+    return _adaptive.adapt(
+        _compiler.fold_roles(_parser.parse_rule(rule)), compile_rules,
+        interval)
+
+
+class AdaptTestCase(test_base.BaseTestCase):
+
+    def assertEquivalent(self, compile_rules, wrap=lambda creds: creds):
+        rule_dict = dict((name, _parser.parse_rule(rule))
+                         for name, rule in test_optimizer.RULE_DICT.items())
+        outcome = test_optimizer._outcome
+        for rule in test_optimizer.RULES:
+            original = _parser.parse_rule(rule)
+            check = _adaptive.adapt(
+                _compiler.fold_roles(_optimizer.optimize(original,
+                                                         rule_dict)),
+                compile_rules, 2)
+            # Enough rounds for the nodes to sample and reorder
+            for _i in range(16):
+                for target, creds in itertools.product(
+                        test_optimizer.TARGETS, test_optimizer.CREDS):
+                    self.assertEqual(
+                        outcome(original, target, creds, rule_dict),
+                        outcome(check, target, wrap(creds), rule_dict),
+                        '%s => %s with %s, %s' % (rule, check, target,
+                                                  creds))
+
+    def test_equivalent(self):
+        self.assertEquivalent(False)
+
+    def test_equivalent_compiled(self):
+        self.assertEquivalent(True)
+
+    def test_equivalent_credentials(self):
+        self.assertEquivalent(False, _checks.Credentials)
+
+    def test_sampled_branches_do_not_raise(self):
+        # The role check is only evaluated to be measured, and raises
+        check = _adapt('user_id:%(user_id)s or role:a')
+        for _i in range(2 * _adaptive._SAMPLE_EVERY):
+            self.assertTrue(check({'user_id': 'u1'}, {'user_id': 'u1'}, {}))
+
+    def test_reordered_role_checks_without_roles(self):
+        check = _adapt('user_id:%(user_id)s or role:a')
+        for _i in range(64):
+            check({'user_id': 'u2'}, {'user_id': 'u1', 'roles': ['a']}, {})
+        self.assertEqual('(role:a or user_id:%(user_id)s)', str(check))
+
+        # Evaluated in the original order, which does not reach role:a
+        for _i in range(2 * _adaptive._SAMPLE_EVERY):
+            self.assertTrue(check({'user_id': 'u1'}, {'user_id': 'u1'}, {}))
+            self.assertRaises(KeyError, check, {'user_id': 'u2'},
+                              {'user_id': 'u1'}, {})
+
+    def test_role_mask_is_a_branch(self):
+        check = _adapt('role:a or role:b or user_id:%(user_id)s')
+        self.assertIsInstance(check, _adaptive.AdaptiveOrCheck)
+        self.assertIsInstance(check.rules[0], _compiler.RoleMaskCheck)
+        self.assertEqual('(role:a or role:b)', str(check.rules[0]))
+
+        for _i in range(64):
+            self.assertTrue(check({'user_id': 'u1'},
+                                  {'user_id': 'u1', 'roles': ['c']}, {}))
+        self.assertEqual('(user_id:%(user_id)s or (role:a or role:b))',
+                         str(check))
+
+    def test_role_mask_alone(self):
+        mask = _compiler.fold_roles(_parser.parse_rule('role:a and role:b'))
+        self.assertIs(mask, _adaptive.adapt(mask))
+
+    def test_generic_checks_that_may_raise_stay(self):
+        for rule, target, creds, bad_target, bad_creds in (
+                ('n:%(n)d or role:a', {'n': 1}, {'n': '2'},
+                 {'n': 'x'}, {'n': '2'}),
+                ('user.id:%(user_id)s or role:a', {'user_id': 'u1'},
+                 {'user': {'id': 'u2'}}, {'user_id': 'u1'}, {'user': 'u1'})):
+            check = _adapt(rule)
+            creds['roles'] = bad_creds['roles'] = ['a']
+            # role:a decides every time
+            for _i in range(64):
+                self.assertTrue(check(target, creds, {}))
+            self.assertEqual('(%s)' % rule, str(check))
+            self.assertRaises(TypeError, check, bad_target, bad_creds, {})
+
+    def test_reordered_generic_checks_without_target(self):
+        check = _adapt('user_id:%(user_id)s or role:a')
+        creds = {'user_id': 'u1', 'roles': ['a']}
+        for _i in range(64):
+            check({'user_id': 'u2'}, creds, {})
+        self.assertEqual('(role:a or user_id:%(user_id)s)', str(check))
+        self.assertRaises(TypeError, check, None, creds, {})
+
+    def test_threads(self):
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        check = _adapt('user_id:%(user_id)s or role:a or role:b',
+                       interval=2)
+        errors = []
+
+        def evaluate():
+            try:
+                for i in range(500):
+                    roles = ['a'] if i % 3 else ['c']
+                    self.assertEqual(
+                        i % 3 != 0,
+                        check({'user_id': 'u2'},
+                              {'user_id': 'u1', 'roles': roles}, {}))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=evaluate) for _i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual(next(check._calls), 8 * 500 + 1)
@@ -0,0 +1,55 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslotest import base as test_base
+
+from oslo_policy import _analysis
+from oslo_policy import _parser
+
+
+class GetInputsTestCase(test_base.BaseTestCase):
+
+    def test_inputs(self):
+        inputs = _analysis.get_inputs(_parser.parse_rule(
+            'role:Admin or (user_id:%(obj.user_id)s and not role:reader)'))
+        self.assertTrue(inputs.cacheable)
+        self.assertEqual(frozenset(['obj.user_id']), inputs.target_keys)
+        self.assertEqual(frozenset([('user_id',)]), inputs.cred_paths)
+        self.assertEqual(frozenset(['admin', 'reader']), inputs.roles)
+
+    def test_extract_ignores_unchecked_roles(self):
+        inputs = _analysis.get_inputs(_parser.parse_rule(
+            'role:admin or user_id:%(obj.user_id)s'))
+        target = {'obj.user_id': 'u1'}
+
+        admin = inputs.extract(target, {'user_id': 'u2',
+                                        'roles': ['Admin', 'member']})
+        self.assertEqual(admin, inputs.extract(
+            target, {'user_id': 'u2', 'roles': ['reader', 'admin']}))
+
+        other = inputs.extract(target, {'user_id': 'u2',
+                                        'roles': ['member']})
+        self.assertNotEqual(admin, other)
+        self.assertEqual(other, inputs.extract(
+            target, {'user_id': 'u2', 'roles': []}))
+
+    def test_extract_without_roles(self):
+        inputs = _analysis.get_inputs(_parser.parse_rule('role:admin'))
+        self.assertIsNone(inputs.extract({}, {}))
+
+    def test_not_cacheable(self):
+        inputs = _analysis.get_inputs(_parser.parse_rule(
+            'role:admin or http://localhost/check'))
+        self.assertFalse(inputs.cacheable)
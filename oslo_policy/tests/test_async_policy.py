@@ -0,0 +1,87 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from concurrent import futures
+import sys
+import threading
+import unittest
+
+from oslo_policy import _checks
+from oslo_policy.tests import base
+
+if sys.version_info >= (3, 7):
+    import asyncio
+
+    from oslo_policy import async_policy
+
+
+class ThreadCheck(_checks.Check):
+    """Records the threads it is evaluated in."""
+
+    threads = []
+
+    def __call__(self, target, creds, enforcer):
+        self.threads.append(threading.current_thread())
+        return True
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'requires Python 3.7')
+class AsyncEnforcerTestCase(base.SQLTestCase):
+
+    def setUp(self):
+        super(AsyncEnforcerTestCase, self).setUp()
+        self.add_rule('p1', 'keystone', 'get_user', 'role:member')
+        self.add_rule('p1', 'keystone', 'update_user', 'thread:x')
+        _checks.register('thread', ThreadCheck)
+        self.addCleanup(_checks.registered_checks.pop, 'thread')
+        del ThreadCheck.threads[:]
+
+        self.enforcer = async_policy.AsyncEnforcer(self.conf)
+        self.addCleanup(self.enforcer.close)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def enforce(self, action, roles):
+        creds = {'domain_id': 'd1', 'user_id': 'u1', 'roles': roles}
+        target = {'obj.user.domain_id': 'd1'}
+        return self.loop.run_until_complete(
+            self.enforcer.enforce(action, target, creds))
+
+    def test_domain_rule(self):
+        action = ('keystone', 'get_user')
+        self.assertTrue(self.enforce(action, ['member']))
+        self.assertFalse(self.enforce(action, ['reader']))
+        # Now evaluated from the parsed rule, on the event loop
+        self.assertTrue(self.enforce(action, ['member']))
+
+    def test_blocking_check_runs_in_thread_pool(self):
+        action = ('keystone', 'update_user')
+        self.assertTrue(self.enforce(action, []))
+        self.assertTrue(self.enforce(action, []))
+        self.assertEqual(2, len(ThreadCheck.threads))
+        for thread in ThreadCheck.threads:
+            self.assertIsNot(threading.current_thread(), thread)
+
+    def test_close_shuts_down_own_executor(self):
+        enforcer = async_policy.AsyncEnforcer(self.conf)
+        enforcer.close()
+        self.assertRaises(RuntimeError, enforcer._executor.submit, int)
+
+    def test_close_leaves_given_executor(self):
+        executor = futures.ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        enforcer = async_policy.AsyncEnforcer(self.conf, executor=executor)
+        enforcer.close()
+        self.assertEqual(0, executor.submit(int).result())
@@ -0,0 +1,35 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslotest import base as test_base
+
+from benchmarks import cases
+from benchmarks import fixtures
+
+
+class BenchmarksTestCase(test_base.BaseTestCase):
+    """Run every benchmark once, so that they keep working."""
+
+    def test_run_once(self):
+        env = fixtures.Environment(domains=2, rules=3)
+        self.addCleanup(env.close)
+
+        names = set()
+        for group in cases.groups:
+            for name, func, ops in group(env):
+                self.assertNotIn(name, names)
+                names.add(name)
+                func()
+        self.assertTrue(names)
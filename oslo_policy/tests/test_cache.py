@@ -0,0 +1,119 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslotest import base as test_base
+
+from oslo_policy import _cache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def use_fake_clock(test):
+    """Make the caches use a clock the test moves forward."""
+
+    clock = FakeClock()
+    test.addCleanup(setattr, _cache, '_clock', _cache._clock)
+    _cache._clock = clock
+    return clock
+
+
+class LRUCacheTestCase(test_base.BaseTestCase):
+
+    def stats(self, cache):
+        stats = cache.stats()
+        return stats['hits'], stats['misses'], stats['evictions']
+
+    def test_eviction(self):
+        cache = _cache.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        # 'a' becomes the most recently used
+        self.assertEqual(1, cache.get('a'))
+        cache.set('c', 3)
+        self.assertNotIn('b', cache)
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((3, 1, 1), self.stats(cache))
+        self.assertEqual(2, cache.stats()['size'])
+        self.assertEqual(2, cache.stats()['maxsize'])
+
+    def test_set_existing_key(self):
+        cache = _cache.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('a', 3)
+        cache.set('c', 4)
+        self.assertEqual(['a', 'c'], sorted(k for k, v in cache.items()))
+        self.assertEqual(3, cache.get('a'))
+
+    def test_disabled(self):
+        cache = _cache.LRUCache(0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual('default', cache.get('a', 'default'))
+        self.assertEqual((0, 2, 0), self.stats(cache))
+        self.assertEqual(0, len(cache))
+
+    def test_ttl(self):
+        clock = use_fake_clock(self)
+        cache = _cache.LRUCache(10, ttl=60)
+        cache.set('a', 1)
+        clock.now += 30
+        cache.set('b', 2)
+        self.assertEqual(1, cache.get('a'))
+
+        clock.now += 30
+        # Expired on its 60th second
+        self.assertIsNone(cache.get('a'))
+        self.assertNotIn('a', cache)
+        self.assertEqual([('b', 2)], cache.items())
+        self.assertEqual(2, cache.get('b'))
+
+        clock.now += 30
+        self.assertEqual([], cache.items())
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((2, 2, 0), self.stats(cache))
+
+    def test_pop_and_clear_keep_counters(self):
+        cache = _cache.LRUCache(10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(1, cache.pop('a'))
+        self.assertIsNone(cache.pop('a'))
+        self.assertEqual(2, cache.get('b'))
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual((1, 0, 0), self.stats(cache))
+
+
+class IdentityKeyTestCase(test_base.BaseTestCase):
+
+    def test_identity(self):
+        a = {}
+        b = {}
+        self.assertEqual(_cache.IdentityKey(a), _cache.IdentityKey(a))
+        self.assertNotEqual(_cache.IdentityKey(a), _cache.IdentityKey(b))
+        cache = _cache.LRUCache(10)
+        cache.set(_cache.IdentityKey(a), 1)
+        self.assertEqual(1, cache.get(_cache.IdentityKey(a)))
+        self.assertIsNone(cache.get(_cache.IdentityKey(b)))
@@ -0,0 +1,155 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+import pickle
+import uuid
+
+from oslotest import base as test_base
+
+from oslo_policy import _checks
+from oslo_policy import _compiler
+from oslo_policy import _parser
+
+
+def _new_roles(count):
+    """Return roles no rule has checked so far."""
+
+    return ['r%s' % uuid.uuid4().hex for _i in range(count)]
+
+
+def _fold(*roles):
+    return _compiler.fold_roles(
+        _parser.parse_rule(' or '.join('role:%s' % r for r in roles)))
+
+
+class CredentialsTestCase(test_base.BaseTestCase):
+
+    def test_role_set(self):
+        creds = _checks.Credentials({'roles': ['A', 'b']})
+        self.assertEqual(frozenset(['a', 'b']), creds.role_set)
+        self.assertIs(creds.role_set, creds.role_set)
+
+    def test_role_set_follows_roles(self):
+        creds = _checks.Credentials({'roles': ['a']})
+        self.assertEqual(frozenset(['a']), creds.role_set)
+        creds['roles'] = ['B']
+        self.assertEqual(frozenset(['b']), creds.role_set)
+        creds.update(roles=[])
+        self.assertEqual(frozenset(), creds.role_set)
+
+    def test_role_mask_follows_new_bits(self):
+        first, second = _new_roles(2)
+        creds = _checks.Credentials({'roles': [first, second.upper()]})
+        # Neither role has a bit yet
+        self.assertEqual(0, creds.role_mask)
+
+        first_bit = _checks.role_bit(first)
+        self.assertEqual(first_bit, creds.role_mask)
+        second_bit = _checks.role_bit(second)
+        self.assertEqual(first_bit | second_bit, creds.role_mask)
+        self.assertEqual(first_bit | second_bit,
+                         _checks.role_mask({'roles': [first, second]}))
+
+    def test_role_mask_follows_roles(self):
+        first, second = _new_roles(2)
+        check = _fold(first, second)
+        self.assertIsInstance(check, _compiler.RoleMaskCheck)
+
+        creds = _checks.Credentials({'roles': [first]})
+        self.assertTrue(check({}, creds, {}))
+        creds['roles'] = ['other']
+        self.assertFalse(check({}, creds, {}))
+        creds['roles'] = [second]
+        self.assertTrue(check({}, creds, {}))
+
+
+class RoleBitsTestCase(test_base.BaseTestCase):
+
+    def test_cap(self):
+        known, other = _new_roles(2)
+        _checks.role_bit(known)
+        _checks.role_bit(other)
+        self.addCleanup(setattr, _checks, '_MAX_ROLE_BITS',
+                        _checks._MAX_ROLE_BITS)
+        _checks._MAX_ROLE_BITS = len(_checks._role_bits)
+
+        first, second = _new_roles(2)
+        self.assertTrue(_checks.has_role_bit(known))
+        self.assertFalse(_checks.has_role_bit(first))
+
+        # Evaluated on the role set, without giving the roles a bit
+        check = _fold(first, second)
+        self.assertNotIsInstance(check, _compiler.RoleMaskCheck)
+        compiled = _compiler.compile_check(check)
+        for roles, result in (([first], True), ([second.upper()], True),
+                              ([known], False), ([], False)):
+            creds = _checks.Credentials({'roles': roles})
+            self.assertEqual(result, check({}, creds, {}))
+            self.assertEqual(result, compiled({}, creds, {}))
+        self.assertNotIn(first, _checks._role_bits)
+        self.assertNotIn(second, _checks._role_bits)
+
+        # Roles with a bit still use the mask
+        check = _fold(known, other, first, second)
+        self.assertIsInstance(check, _compiler.RoleMaskCheck)
+        self.assertTrue(check({}, {'roles': [other]}, {}))
+        self.assertTrue(check({}, {'roles': [second]}, {}))
+        self.assertFalse(check({}, {'roles': []}, {}))
+        self.assertNotIn(second, _checks._role_bits)
+
+
+class SharedChecksTestCase(test_base.BaseTestCase):
+
+    def test_make_check_interns(self):
+        for kind, match in (('role', 'admin'), ('rule', 'admin'),
+                            ('user_id', '%(user_id)s'),
+                            ('http', '//example.com/%(name)s')):
+            check = _checks.make_check(kind, match)
+            self.assertIs(check, _checks.make_check(kind, match))
+        self.assertIsNot(_checks.make_check('role', 'admin'),
+                         _checks.make_check('role', 'member'))
+        self.assertIsNot(_checks.make_check('role', 'admin'),
+                         _checks.make_check('rule', 'admin'))
+
+    def test_parsed_rules_share_checks(self):
+        first = _parser.parse_rule('role:admin or user_id:%(user_id)s')
+        second = _parser.parse_rule('user_id:%(user_id)s and role:admin')
+        self.assertIs(first.rules[0], second.rules[1])
+        self.assertIs(first.rules[1], second.rules[0])
+
+    def test_registered_checks_not_shared(self):
+        @_checks.register('custom')
+        class CustomCheck(_checks.Check):
+            def __call__(self, target, cred, rule_dict):
+                return True
+
+        self.addCleanup(_checks.registered_checks.pop, 'custom')
+        check = _checks.make_check('custom', 'x')
+        self.assertIsInstance(check, CustomCheck)
+        self.assertIsNot(check, _checks.make_check('custom', 'x'))
+
+    def test_singletons(self):
+        for cls in (_checks.TrueCheck, _checks.FalseCheck):
+            check = cls()
+            self.assertIs(check, cls())
+            self.assertIs(check, copy.copy(check))
+            self.assertIs(check, copy.deepcopy(check))
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                self.assertIs(check,
+                              pickle.loads(pickle.dumps(check, protocol)))
+        self.assertIsNot(_checks.TrueCheck(), _checks.FalseCheck())
+        self.assertIs(_checks.TrueCheck(), _parser.parse_rule('@'))
+        self.assertIs(_checks.FalseCheck(), _parser.parse_rule('!'))
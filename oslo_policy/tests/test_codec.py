@@ -0,0 +1,78 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslotest import base as test_base
+
+from oslo_policy import _codec
+from oslo_policy import _parser
+
+
+RULES = {
+    'identity': {
+        'get_user': _parser.parse_rule('user_id:%(user_id)s or role:admin'),
+        'list_users': _parser.parse_rule(
+            'not (role:reader and domain_id:%(domain_id)s) or @'),
+    },
+    'compute': {
+        'start': _parser.parse_rule('!'),
+    },
+}
+
+
+class CodecTestCase(test_base.BaseTestCase):
+
+    def setUp(self):
+        super(CodecTestCase, self).setUp()
+        self.data = _codec.encode({'rules': (RULES, 'meta')}, 'buffer')
+
+    def read(self, data):
+        reader = _codec.Reader(data)
+        return [reader.load(name) for name in reader.sections()]
+
+    def assertRules(self, loaded):
+        rules, default_rule = loaded
+        self.assertIsNone(default_rule)
+        self.assertEqual(
+            dict((s, dict((p, str(c)) for p, c in r.items()))
+                 for s, r in RULES.items()),
+            dict((s, dict((p, str(c)) for p, c in r.items()))
+                 for s, r in rules.items()))
+
+    def test_round_trip(self):
+        reader = _codec.Reader(self.data)
+        self.assertEqual('buffer', reader.metadata)
+        self.assertEqual(['rules'], reader.sections())
+        self.assertEqual('meta', reader.section_metadata('rules'))
+        self.assertRules(reader.load('rules'))
+
+    def test_truncated(self):
+        for length in range(len(self.data)):
+            self.assertRaises(ValueError, self.read, self.data[:length])
+
+    def test_corrupt(self):
+        # Every byte set to 0xff, e.g. string indexes, counts and offsets
+        # out of range, either fails with ValueError or reads some rules
+        for i in range(len(self.data)):
+            data = self.data[:i] + b'\xff' + self.data[i + 1:]
+            try:
+                self.read(data)
+            except ValueError:
+                pass
+
+    def test_string_index_out_of_range(self):
+        header = list(_codec._HEADER.unpack_from(self.data))
+        header[6] = header[2]
+        data = _codec._HEADER.pack(*header) + self.data[_codec._HEADER.size:]
+        self.assertRaises(ValueError, _codec.Reader, data)
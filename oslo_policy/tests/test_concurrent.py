@@ -0,0 +1,160 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+from oslo_config import cfg
+from oslotest import base as test_base
+
+from oslo_policy import _checks
+from oslo_policy import _concurrent
+from oslo_policy import _http
+from oslo_policy import opts
+
+
+class _SlowCheck(_checks.HttpCheck):
+    """An http: check answering its match after a while."""
+
+    __slots__ = ()
+
+    def __call__(self, target, creds, rule_dict):
+        time.sleep(0.01)
+        return self.match == 'yes'
+
+
+def _slow(answer):
+    return _SlowCheck('http', answer)
+
+
+class _FailingCheck(_checks.HttpCheck):
+    """An http: check raising after its match, in seconds."""
+
+    __slots__ = ()
+
+    def __call__(self, target, creds, rule_dict):
+        time.sleep(float(self.match))
+        raise ValueError(self.match)
+
+
+def _failing(delay):
+    return _FailingCheck('http', delay)
+
+
+class ParallelizeTestCase(test_base.BaseTestCase):
+
+    def setUp(self):
+        super(ParallelizeTestCase, self).setUp()
+        self.configure(http_check_max_workers=2)
+        self.addCleanup(self.configure)
+
+    def configure(self, **overrides):
+        conf = cfg.ConfigOpts()
+        opts._register(conf)
+        conf([])
+        for name, value in overrides.items():
+            conf.set_override(name, value, group='oslo_policy')
+        _http.configure(conf)
+
+    def evaluate(self, check):
+        """Evaluate check, failing if it does not complete in time."""
+
+        results = []
+
+        def run():
+            try:
+                results.append((check({}, {}, {}), None))
+            except Exception as e:
+                results.append((None, e))
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive(), 'deadlocked')
+        result, error = results[0]
+        if error is not None:
+            raise error
+        return result
+
+    def assertFailsWith(self, delay, check):
+        """Assert that check raises the error of the branch of delay."""
+
+        try:
+            self.evaluate(check)
+        except ValueError as e:
+            self.assertEqual(delay, str(e))
+        else:
+            self.fail('%s did not raise' % check)
+
+    def test_flat(self):
+        check = _concurrent.parallelize(_checks.OrCheck(
+            [_slow('no'), _slow('no'), _slow('yes')]))
+        self.assertIsInstance(check, _concurrent.ConcurrentOrCheck)
+        self.assertTrue(self.evaluate(check))
+
+        check = _concurrent.parallelize(_checks.AndCheck(
+            [_slow('yes'), _slow('no'), _slow('yes')]))
+        self.assertIsInstance(check, _concurrent.ConcurrentAndCheck)
+        self.assertFalse(self.evaluate(check))
+
+    def test_nested_groups_in_small_pool(self):
+        # Each inner group would wait for the pool its outer group fills
+        check = _concurrent.parallelize(_checks.OrCheck([
+            _checks.AndCheck([_slow('yes'), _slow('no')]),
+            _checks.AndCheck([_slow('no'), _slow('yes')]),
+            _checks.AndCheck([_slow('yes'), _slow('yes')]),
+        ]))
+        self.assertIsInstance(check.rules[0], _concurrent.ConcurrentAndCheck)
+        self.assertTrue(self.evaluate(check))
+
+        check = _concurrent.parallelize(_checks.AndCheck([
+            _checks.OrCheck([_slow('no'), _slow('yes')]),
+            _checks.OrCheck([_slow('no'), _slow('no')]),
+        ]))
+        self.assertFalse(self.evaluate(check))
+
+    def test_leftmost_error(self):
+        self.configure(http_check_max_workers=3)
+        for group in (_checks.OrCheck, _checks.AndCheck):
+            # The rightmost branch fails first
+            check = _concurrent.parallelize(group(
+                [_failing('0.05'), _slow('yes' if group is _checks.AndCheck
+                                         else 'no'), _failing('0')]))
+            self.assertFailsWith('0.05', check)
+
+    def test_decision_despite_errors(self):
+        check = _concurrent.parallelize(_checks.OrCheck(
+            [_failing('0'), _slow('no'), _slow('yes')]))
+        self.assertTrue(self.evaluate(check))
+
+        check = _concurrent.parallelize(_checks.AndCheck(
+            [_failing('0'), _slow('no')]))
+        self.assertFalse(self.evaluate(check))
+
+    def test_leftmost_error_in_pool(self):
+        # The inner groups are evaluated in order in the pool
+        check = _concurrent.parallelize(_checks.OrCheck([
+            _checks.OrCheck([_failing('0.05'), _failing('0')]),
+            _checks.OrCheck([_failing('0.01'), _slow('no')]),
+        ]))
+        self.assertIsInstance(check.rules[0], _concurrent.ConcurrentOrCheck)
+        self.assertFailsWith('0.05', check)
+
+        check = _concurrent.parallelize(_checks.OrCheck([
+            _checks.OrCheck([_failing('0'), _slow('yes')]),
+            _checks.OrCheck([_slow('no'), _slow('no')]),
+        ]))
+        self.assertTrue(self.evaluate(check))
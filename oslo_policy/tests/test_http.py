@@ -0,0 +1,138 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from oslo_config import cfg
+from oslotest import base as test_base
+from six.moves import BaseHTTPServer
+from six.moves import http_client
+from six.moves import socketserver
+
+from oslo_policy import _http
+from oslo_policy import _parser
+from oslo_policy import opts
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers POST /<status>/<body>."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, self.client_address))
+        _empty, status, body = self.path.split('/', 2)
+        body = body.encode('ascii')
+        self.send_response(int(status))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class HttpClientTestCase(test_base.BaseTestCase):
+
+    def setUp(self):
+        super(HttpClientTestCase, self).setUp()
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.requests = []
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+        self.client = _http.HttpClient(connect_timeout=5, read_timeout=5,
+                                       cache_ttl=60)
+        self.addCleanup(self.client.close)
+
+    def test_post(self):
+        self.assertEqual(b'True', self.client.post(self.url + '/200/True',
+                                                   {'a': 'b'}))
+        self.assertEqual(b'False', self.client.post(self.url + '/201/False',
+                                                    {'a': 'b'}))
+
+    def test_keep_alive(self):
+        for i in range(3):
+            self.client.post(self.url + '/200/True', {'i': str(i)})
+        self.assertEqual(3, len(self.server.requests))
+        self.assertEqual(1, len(set(c for _p, c in self.server.requests)))
+
+    def test_cache(self):
+        for i in range(3):
+            self.client.post(self.url + '/200/True', {'a': 'b'})
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_error_status(self):
+        for status in (302, 404, 500):
+            self.assertRaises(http_client.HTTPException, self.client.post,
+                              self.url + '/%d/True' % status, {'a': 'b'})
+        # Errors are not cached, and the connection is still reused
+        self.assertRaises(http_client.HTTPException, self.client.post,
+                          self.url + '/500/True', {'a': 'b'})
+        self.assertEqual(4, len(self.server.requests))
+        self.assertEqual(1, len(set(c for _p, c in self.server.requests)))
+
+    def test_http_check(self):
+        conf = cfg.ConfigOpts()
+        opts._register(conf)
+        conf([])
+        _http.configure(conf)
+
+        check = _parser.parse_rule(self.url + '/200/True')
+        self.assertTrue(check({}, {}, {}))
+        check = _parser.parse_rule(self.url + '/500/True')
+        self.assertFalse(check({}, {}, {}))
+
+
+class ConfigureTestCase(test_base.BaseTestCase):
+
+    def _conf(self, **overrides):
+        conf = cfg.ConfigOpts()
+        opts._register(conf)
+        conf([])
+        for name, value in overrides.items():
+            conf.set_override(name, value, group='oslo_policy')
+        return conf
+
+    def test_same_settings(self):
+        _http.configure(self._conf())
+        client = _http.get_client()
+        executor = _http.get_executor()
+
+        _http.configure(self._conf())
+        self.assertIs(client, _http.get_client())
+        self.assertIs(executor, _http.get_executor())
+
+    def test_changed_settings(self):
+        _http.configure(self._conf())
+        client = _http.get_client()
+        executor = _http.get_executor()
+
+        _http.configure(self._conf(http_check_read_timeout=1.0,
+                                   http_check_max_workers=2))
+        self.addCleanup(_http.configure, self._conf())
+        self.assertIsNot(client, _http.get_client())
+        self.assertIsNot(executor, _http.get_executor())
+        # Still usable by the checks that hold it
+        self.assertEqual(1, executor.submit(lambda: 1).result())
@@ -0,0 +1,144 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslotest import base as test_base
+
+from oslo_policy import exception
+from oslo_policy import instrumentation
+from oslo_policy import policy
+from oslo_policy.tests import base
+
+
+ACTION = ('keystone', 'get_user')
+
+
+class HistogramTestCase(test_base.BaseTestCase):
+
+    def test_empty(self):
+        self.assertEqual({'count': 0, 'total': 0, 'mean': None, 'min': None,
+                          'max': None, 'buckets': {}},
+                         instrumentation.Histogram().as_dict())
+
+    def test_add(self):
+        histogram = instrumentation.Histogram(scale=10)
+        for value in (0, 0.25, 0.5, 3):
+            histogram.add(value)
+        self.assertEqual({'count': 4, 'total': 3.75, 'mean': 0.9375,
+                          'min': 0, 'max': 3,
+                          # 0, 2.5 and 5, 30 once scaled
+                          'buckets': {1: 1, 4: 1, 8: 1, 32: 1}},
+                         histogram.as_dict())
+
+
+class StatsTestCase(base.SQLTestCase):
+
+    def setUp(self):
+        super(StatsTestCase, self).setUp()
+        self.add_rule('p1', 'keystone', 'get_user', 'role:member')
+        self.stats = instrumentation.Stats()
+
+    def enforcer(self):
+        return policy.Enforcer(self.conf, instrumentation=self.stats)
+
+    def enforce(self, enforcer, roles, domain_id='d1'):
+        creds = {'domain_id': 'd1', 'user_id': 'u1', 'roles': roles}
+        return enforcer.enforce(ACTION, {'obj.user.domain_id': domain_id},
+                                creds)
+
+    def stage_counts(self, report):
+        return dict((name, stage['count'])
+                    for name, stage in report['stages'].items())
+
+    def test_enforce(self):
+        enforcer = self.enforcer()
+        self.assertTrue(self.enforce(enforcer, ['member']))
+        self.assertTrue(self.enforce(enforcer, ['member']))
+        self.assertFalse(self.enforce(enforcer, ['reader']))
+        # Denied by the system rule
+        self.assertFalse(self.enforce(enforcer, ['member'], 'd2'))
+
+        report = self.stats.report(enforcer)
+        self.assertEqual({'system': 4, 'domain_lookup': 3, 'domain': 3,
+                          'parse': 1}, self.stage_counts(report))
+        self.assertEqual(2, report['allowed'])
+        self.assertEqual(2, report['denied'])
+        self.assertEqual({'keystone:get_user': {'allowed': 2, 'denied': 2}},
+                         report['actions'])
+        self.assertEqual(4, report['enforcements']['count'])
+
+        # One query per domain lookup, without the domain cache
+        round_trips = report['db_round_trips']
+        self.assertEqual(4, round_trips['count'])
+        self.assertEqual(3, round_trips['total'])
+        self.assertEqual(0, round_trips['min'])
+
+        self.assertEqual(2, report['caches']['rules']['hits'])
+        self.assertEqual(1, report['caches']['rules']['misses'])
+        self.assertAlmostEqual(2.0 / 3,
+                               report['caches']['rules']['hit_ratio'])
+        self.assertIsNone(report['caches']['domains']['hit_ratio'])
+        self.assertNotIn('decisions', report['caches'])
+
+    def test_domain_cache(self):
+        self.conf.set_override('domain_cache_time', 60, group='oslo_policy')
+        enforcer = self.enforcer()
+        for _i in range(4):
+            self.assertTrue(self.enforce(enforcer, ['member']))
+
+        report = self.stats.report(enforcer)
+        self.assertEqual(0, report['db_round_trips']['min'])
+        self.assertEqual(
+            report['db_round_trips']['max'],
+            report['db_round_trips']['total'])
+        self.assertEqual(0.75, report['caches']['domains']['hit_ratio'])
+
+    def test_raising_enforcement_is_denied(self):
+        enforcer = self.enforcer()
+        creds = {'domain_id': 'missing', 'user_id': 'u1', 'roles': []}
+        self.assertRaises(exception.DomainNotFound, enforcer.enforce, ACTION,
+                          {'obj.user.domain_id': 'missing'}, creds)
+        report = self.stats.report()
+        self.assertEqual({'keystone:get_user': {'allowed': 0, 'denied': 1}},
+                         report['actions'])
+        self.assertNotIn('domain', report['stages'])
+        self.assertNotIn('caches', report)
+
+    def test_enforce_many(self):
+        enforcer = self.enforcer()
+        creds = {'domain_id': 'd1', 'user_id': 'u1', 'roles': ['member']}
+        results = enforcer.enforce_many(
+            [(ACTION, {'obj.user.domain_id': 'd1'}),
+             (ACTION, {'obj.user.domain_id': 'd2'}),
+             (('keystone', 'list_users'), {'qStr.domain_id': 'd1'})],
+            creds)
+        self.assertEqual([True, False, True], results)
+
+        report = self.stats.report()
+        # The domain policy is looked up once for the batch
+        self.assertEqual({'system': 3, 'domain_lookup': 1, 'domain': 2,
+                          'parse': 1}, self.stage_counts(report))
+        self.assertEqual({'keystone:get_user': {'allowed': 1, 'denied': 1},
+                          'keystone:list_users': {'allowed': 1,
+                                                  'denied': 0}},
+                         report['actions'])
+
+    def test_reset(self):
+        enforcer = self.enforcer()
+        self.enforce(enforcer, ['member'])
+        self.stats.reset()
+        report = self.stats.report()
+        self.assertEqual(0, report['enforcements']['count'])
+        self.assertEqual({}, report['stages'])
+        self.assertEqual({}, report['actions'])
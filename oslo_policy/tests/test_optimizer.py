@@ -0,0 +1,192 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+
+from oslotest import base as test_base
+
+from oslo_policy import _checks
+from oslo_policy import _compiler
+from oslo_policy import _optimizer
+from oslo_policy import _parser
+
+
+RULES = [
+    'user_id:%(user_id)s or role:a',
+    'role:a or user_id:%(user_id)s',
+    'user_id:%(user_id)s and role:a',
+    'role:a and role:b or role:c',
+    '(role:a or role:b) and domain_id:%(domain_id)s',
+    'domain_id:%(domain_id)s and (role:a or not role:b)',
+    '(user_id:%(user_id)s or @) and role:a',
+    'role:a and !',
+    'user_id:%(user_id)s and !',
+    'role:a or @',
+    '(role:a or user_id:%(user_id)s) or (role:b or user_id:%(user_id)s)',
+    'not (role:a and user_id:%(user_id)s) or domain_id:%(domain_id)s',
+    'rule:admin or user_id:%(user_id)s',
+    'rule:owner or role:a',
+    'rule:missing or role:a',
+    'domain_id:%(domain_id)s or rule:admin and role:b',
+    '(rule:owner and role:a) or (rule:admin and user_id:%(user_id)s)',
+]
+
+RULE_DICT = {
+    'admin': 'role:admin',
+    'owner': 'user_id:%(user_id)s',
+}
+
+CREDS = [
+    {'user_id': 'u1', 'domain_id': 'd1', 'roles': ['a']},
+    {'user_id': 'u1', 'domain_id': 'd1', 'roles': ['A', 'Admin']},
+    {'user_id': 'u1', 'domain_id': 'd1', 'roles': ['b', 'c']},
+    {'user_id': 'u2', 'domain_id': 'd2', 'roles': []},
+    # Role checks raise KeyError
+    {'user_id': 'u1', 'domain_id': 'd1'},
+    {'user_id': 'u2', 'domain_id': 'd2'},
+    {},
+]
+
+TARGETS = [
+    {'user_id': 'u1', 'domain_id': 'd1'},
+    {'user_id': 'u2', 'domain_id': 'd1'},
+    {'user_id': 'u1'},
+    {},
+]
+
+
+def _outcome(check, target, creds, rule_dict):
+    """Return the result of check, or the type of what it raised."""
+
+    try:
+        return bool(check(target, creds, rule_dict))
+    except Exception as e:
+        return type(e)
+
+
+class OptimizeTestCase(test_base.BaseTestCase):
+
+    def assertEquivalent(self, prepare):
+        rule_dict = dict((name, _parser.parse_rule(rule))
+                         for name, rule in RULE_DICT.items())
+        for rule in RULES:
+            original = _parser.parse_rule(rule)
+            check = prepare(_optimizer.optimize(original, rule_dict))
+            for target, creds in itertools.product(TARGETS, CREDS):
+                self.assertEqual(
+                    _outcome(original, target, creds, rule_dict),
+                    _outcome(check, target, creds, rule_dict),
+                    '%s => %s with %s, %s' % (rule, check, target, creds))
+
+    def test_equivalent(self):
+        self.assertEquivalent(lambda check: check)
+
+    def test_equivalent_compiled(self):
+        self.assertEquivalent(
+            lambda check: _compiler.compile_check(
+                _compiler.fold_roles(check)))
+
+    def test_equivalent_credentials(self):
+        rule_dict = dict((name, _parser.parse_rule(rule))
+                         for name, rule in RULE_DICT.items())
+        for rule in RULES:
+            original = _parser.parse_rule(rule)
+            check = _compiler.fold_roles(
+                _optimizer.optimize(original, rule_dict))
+            for target, creds in itertools.product(TARGETS, CREDS):
+                self.assertEqual(
+                    _outcome(original, target, creds, rule_dict),
+                    _outcome(check, target, _checks.Credentials(creds),
+                             rule_dict),
+                    rule)
+
+    def test_checks_that_may_raise_stay_in_place(self):
+        check = _optimizer.optimize(
+            _parser.parse_rule('user_id:%(user_id)s or role:a'))
+        self.assertEqual('(user_id:%(user_id)s or role:a)', str(check))
+        self.assertTrue(check({'user_id': 'u1'}, {'user_id': 'u1'}, {}))
+
+    def test_cheap_checks_first(self):
+        check = _optimizer.optimize(_parser.parse_rule(
+            'user_id:%(user_id)s or @ or !'))
+        self.assertEqual('@', str(check))
+
+        check = _optimizer.optimize(_parser.parse_rule(
+            'role:a or http://example.com/ or user_id:%(user_id)s or'
+            ' (domain_id:%(domain_id)s and project_id:%(project_id)s)'
+            ' or role:b'))
+        self.assertEqual(
+            '(role:a or http://example.com/ or user_id:%(user_id)s or'
+            ' (domain_id:%(domain_id)s and project_id:%(project_id)s)'
+            ' or role:b)', str(check))
+
+        check = _optimizer.optimize(_parser.parse_rule(
+            'role:a or (domain_id:%(domain_id)s and'
+            ' project_id:%(project_id)s) or user_id:%(user_id)s'))
+        self.assertEqual(
+            '(role:a or user_id:%(user_id)s or'
+            ' (domain_id:%(domain_id)s and project_id:%(project_id)s))',
+            str(check))
+
+    def test_absorbing_constant(self):
+        check = _optimizer.optimize(_parser.parse_rule(
+            'user_id:%(user_id)s and ! and role:a'))
+        self.assertEqual('!', str(check))
+
+        # Whether the role check raises still decides the result
+        check = _optimizer.optimize(_parser.parse_rule(
+            'role:a and ! and user_id:%(user_id)s'))
+        self.assertEqual('(role:a and !)', str(check))
+        self.assertRaises(KeyError, check, {}, {}, {})
+
+    def test_inline_rules(self):
+        rule_dict = {'owner': _parser.parse_rule('user_id:%(user_id)s'),
+                     'admin': _parser.parse_rule('role:admin')}
+        check = _optimizer.optimize(
+            _parser.parse_rule('rule:admin or rule:owner or rule:missing'),
+            rule_dict)
+        # rule:admin is kept, since it turns a KeyError into False, and
+        # stays first since the role check may raise something else
+        self.assertEqual('(rule:admin or user_id:%(user_id)s)', str(check))
+
+    def test_rules_cost_what_they_refer_to(self):
+        rule_dict = {'remote': _parser.parse_rule('http://example.com/'),
+                     'owner': _parser.parse_rule('user_id:%(user_id)s')}
+        check = _optimizer.optimize(_parser.parse_rule(
+            '(domain_id:%(domain_id)s and user_id:%(user_id)s) or'
+            ' rule:remote'), rule_dict)
+        self.assertEqual(
+            '((domain_id:%(domain_id)s and user_id:%(user_id)s) or'
+            ' rule:remote)', str(check))
+
+        self.assertGreater(
+            _optimizer.cost(_checks.RuleCheck('rule', 'remote'), rule_dict),
+            _optimizer.cost(_checks.RuleCheck('rule', 'owner'), rule_dict))
+        self.assertTrue(_optimizer.may_raise(
+            _checks.RuleCheck('rule', 'remote'), rule_dict))
+        self.assertFalse(_optimizer.may_raise(
+            _checks.RuleCheck('rule', 'owner'), rule_dict))
+        self.assertFalse(_optimizer.may_raise(
+            _checks.RuleCheck('rule', 'missing'), rule_dict))
+        # Unknown rules may raise
+        self.assertTrue(_optimizer.may_raise(
+            _checks.RuleCheck('rule', 'owner')))
+
+    def test_recursive_rules(self):
+        rule_dict = {'loop': _parser.parse_rule('rule:loop or role:a')}
+        check = _checks.RuleCheck('rule', 'loop')
+        self.assertTrue(_optimizer.may_raise(check, rule_dict))
+        self.assertGreater(_optimizer.cost(check, rule_dict),
+                           _optimizer.cost(rule_dict['loop']))
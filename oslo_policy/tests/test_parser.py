@@ -0,0 +1,111 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslotest import base as test_base
+
+from oslo_policy import _checks
+from oslo_policy import _parser
+
+
+class ParseRuleTestCase(test_base.BaseTestCase):
+
+    # Rules with the tree the shift-reduce parser that preceded the linear
+    # one built for them, as (rule, str() of the tree, type of the root).
+    # Mixing "and" and "or" without parentheses, like any syntax error,
+    # makes the whole rule "!".
+    RULES = [
+        ('', '@', _checks.TrueCheck),
+        ('@', '@', _checks.TrueCheck),
+        ('!', '!', _checks.FalseCheck),
+        ('role:admin', 'role:admin', _checks.RoleCheck),
+        ('rule:admin_required', 'rule:admin_required', _checks.RuleCheck),
+        ('user_id:%(obj.user.id)s',
+         'user_id:%(obj.user.id)s',
+         _checks.GenericCheck),
+        ("'member':%(role.name)s",
+         "'member':%(role.name)s",
+         _checks.GenericCheck),
+        ('True:%(enabled)s', 'True:%(enabled)s', _checks.GenericCheck),
+        ('role:a or role:b', '(role:a or role:b)', _checks.OrCheck),
+        ('role:a and role:b', '(role:a and role:b)', _checks.AndCheck),
+        ('role:a or role:b and role:c', '!', _checks.FalseCheck),
+        ('role:a and role:b or role:c', '!', _checks.FalseCheck),
+        ('(role:a or role:b) and role:c',
+         '((role:a or role:b) and role:c)',
+         _checks.AndCheck),
+        ('role:a and (role:b or role:c)',
+         '(role:a and (role:b or role:c))',
+         _checks.AndCheck),
+        ('not role:a', 'not role:a', _checks.NotCheck),
+        ('not role:a or role:b', '(not role:a or role:b)', _checks.OrCheck),
+        ('not (role:a or role:b)', 'not (role:a or role:b)', _checks.NotCheck),
+        ('not not role:a', 'not not role:a', _checks.NotCheck),
+        ('role:a or not role:b and role:c', '!', _checks.FalseCheck),
+        ('((role:a))', 'role:a', _checks.RoleCheck),
+        ('(role:a or (role:b and (role:c or role:d)))',
+         '(role:a or (role:b and (role:c or role:d)))',
+         _checks.OrCheck),
+        ('role:a or', '!', _checks.FalseCheck),
+        ('and role:a', '!', _checks.FalseCheck),
+        ('role:a and', '!', _checks.FalseCheck),
+        ('(role:a', '!', _checks.FalseCheck),
+        ('role:a)', '!', _checks.FalseCheck),
+        ('role:a role:b', '!', _checks.FalseCheck),
+        ('()', '!', _checks.FalseCheck),
+        ('role:a AND role:b', '(role:a and role:b)', _checks.AndCheck),
+        ('role:a Or role:b', '(role:a or role:b)', _checks.OrCheck),
+        ('NOT role:a', 'not role:a', _checks.NotCheck),
+        ('role:a or @', '(role:a or @)', _checks.OrCheck),
+        ('role:a and !', '(role:a and !)', _checks.AndCheck),
+        ('@ or !', '(@ or !)', _checks.OrCheck),
+        ('http://example.com/%(target)s',
+         'http://example.com/%(target)s',
+         _checks.HttpCheck),
+        ('role:a or http://example.com/x',
+         '(role:a or http://example.com/x)',
+         _checks.OrCheck),
+        ('domain_id:%(d)s and (role:admin or user_id:%(u)s)',
+         '(domain_id:%(d)s and (role:admin or user_id:%(u)s))',
+         _checks.AndCheck),
+        ('role:a or role:b or role:c or role:d',
+         '(role:a or role:b or role:c or role:d)',
+         _checks.OrCheck),
+        ('role:a and role:b and role:c',
+         '(role:a and role:b and role:c)',
+         _checks.AndCheck),
+        ('(role:a or role:b) or (role:c or role:d)',
+         '((role:a or role:b) or (role:c or role:d))',
+         _checks.OrCheck),
+        ('nonsense', '!', _checks.FalseCheck),
+        ('a:b:c', 'a:b:c', _checks.GenericCheck),
+        ('role:', 'role:', _checks.RoleCheck),
+    ]
+
+    def test_same_trees_as_shift_reduce_parser(self):
+        for rule, expected, cls in self.RULES:
+            check = _parser.parse_rule(rule)
+            self.assertEqual((expected, cls), (str(check), type(check)),
+                             rule)
+
+    def test_long_expression(self):
+        # The shift-reduce parser recursed once per operator
+        rule = ' or '.join('role:r%d' % i for i in range(5000))
+        check = _parser.parse_rule(rule)
+        self.assertIsInstance(check, _checks.OrCheck)
+        self.assertEqual(5000, len(check.rules))
+
+    def test_deep_nesting(self):
+        rule = '(' * 200 + 'role:a' + ')' * 200
+        self.assertEqual('role:a', str(_parser.parse_rule(rule)))
@@ -0,0 +1,258 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import gc
+import weakref
+
+from oslo_policy import _parser
+from oslo_policy.common import sql as common_sql
+from oslo_policy import exception
+from oslo_policy import policy
+from oslo_policy import sql
+from oslo_policy.tests import base
+from oslo_policy.tests import test_cache
+
+
+class _RuleDict(dict):
+    """A rule set that can be referenced weakly."""
+
+
+class DecisionCacheTestCase(base.SQLTestCase):
+
+    def setUp(self):
+        super(DecisionCacheTestCase, self).setUp()
+        self.add_rule('p1', 'keystone', 'get_user',
+                      'role:member and user_id:%(obj.user.id)s')
+        self.conf.set_override('decision_cache_size', 100,
+                               group='oslo_policy')
+        self.enforcer = policy.Enforcer(self.conf)
+
+    def enforce(self, action=('keystone', 'get_user'), user_id='u1',
+                roles=('member',), target_user_id='u1'):
+        creds = {'domain_id': 'd1', 'user_id': user_id, 'roles': roles}
+        target = {'obj.user.domain_id': 'd1', 'obj.user.id': target_user_id,
+                  'obj.group.domain_id': 'd1'}
+        return self.enforcer.enforce(action, target, creds)
+
+    def counts(self):
+        stats = self.enforcer.cache_stats()['decisions']
+        return stats['hits'], stats['misses']
+
+    def test_hit(self):
+        self.assertTrue(self.enforce())
+        # The system rule and the domain rule
+        self.assertEqual((0, 2), self.counts())
+        self.assertTrue(self.enforce())
+        self.assertEqual((2, 2), self.counts())
+        # Roles no rule checks are not part of the key
+        self.assertTrue(self.enforce(roles=('member', 'other')))
+        self.assertEqual((4, 2), self.counts())
+
+    def test_miss_on_changed_inputs(self):
+        self.assertTrue(self.enforce())
+        self.assertFalse(self.enforce(user_id='u2'))
+        self.assertEqual((1, 3), self.counts())
+        self.assertFalse(self.enforce(target_user_id='u2'))
+        self.assertEqual((2, 4), self.counts())
+        self.assertFalse(self.enforce(roles=('reader',)))
+        self.assertEqual((3, 5), self.counts())
+        self.assertTrue(self.enforce())
+        self.assertEqual((5, 5), self.counts())
+
+    def test_domain_rule_changed(self):
+        self.conf.set_override('domain_cache_time', 60, group='oslo_policy')
+        self.enforcer = policy.Enforcer(self.conf)
+        self.assertTrue(self.enforce())
+
+        with common_sql.transaction(self.conf) as session:
+            rule = session.query(sql.Rule).one()
+            rule.condition = 'role:admin'
+        # Still the cached snapshot
+        self.assertTrue(self.enforce())
+        self.enforcer.invalidate('d1')
+        self.assertFalse(self.enforce())
+
+    def test_rules_replaced(self):
+        action = ('keystone', 'get_group')
+        self.assertTrue(self.enforce(action, roles=('domain_admin',)))
+        self.enforcer.dflt_rules = policy.Rules.from_dict(
+            {'keystone': {'get_group': '!'}})
+        self.assertFalse(self.enforce(action, roles=('domain_admin',)))
+
+    def test_rule_dict_kept_alive(self):
+        check = _parser.parse_rule('rule:admin')
+        rule_dict = _RuleDict(admin=_parser.parse_rule('role:admin'))
+        ref = weakref.ref(rule_dict)
+        creds = {'roles': ['admin']}
+        self.assertTrue(self.enforcer._evaluate(check, {}, creds, rule_dict))
+
+        # While decisions are cached for it, its id() cannot be reused
+        del rule_dict
+        gc.collect()
+        self.assertIsNotNone(ref())
+        self.assertFalse(self.enforcer._evaluate(
+            check, {}, creds, _RuleDict(admin=_parser.parse_rule('!'))))
+
+
+class EnforceManyTestCase(base.SQLTestCase):
+
+    def setUp(self):
+        super(EnforceManyTestCase, self).setUp()
+        self.add_rule('p1', 'keystone', 'get_user', 'role:member')
+        self.enforcer = policy.Enforcer(self.conf)
+        self.creds = {'domain_id': 'd1', 'user_id': 'u1',
+                      'roles': ['member']}
+        self.pairs = [
+            (('keystone', 'get_user'), {'obj.user.domain_id': 'd1'}),
+            (('keystone', 'get_user'), {'obj.user.domain_id': 'd2'}),
+            (('keystone', 'get_group'), {'obj.group.domain_id': 'd1'}),
+            (('keystone', 'list_users'), {'qStr.domain_id': 'd1'}),
+        ]
+
+    def test_results_in_order(self):
+        expected = [self.enforcer.enforce(action, target, self.creds)
+                    for action, target in self.pairs]
+        self.assertEqual([True, False, False, True], expected)
+        self.assertEqual(expected,
+                         self.enforcer.enforce_many(self.pairs, self.creds))
+        self.assertEqual(
+            expected[::-1],
+            self.enforcer.enforce_many(self.pairs[::-1], self.creds))
+
+    def test_stream_is_lazy(self):
+        consumed = []
+
+        def pairs():
+            for pair in self.pairs:
+                consumed.append(pair)
+                yield pair
+
+        results = self.enforcer.enforce_many(pairs(), self.creds,
+                                             stream=True)
+        self.assertEqual([], consumed)
+        self.assertTrue(next(results))
+        self.assertEqual(1, len(consumed))
+        self.assertFalse(next(results))
+        self.assertEqual(2, len(consumed))
+        self.assertEqual([False, True], list(results))
+        self.assertEqual(4, len(consumed))
+
+    def test_raise_partway(self):
+        # The second pair is denied, and raises
+        self.assertRaises(policy.PolicyNotAuthorized,
+                          self.enforcer.enforce_many, self.pairs,
+                          self.creds, do_raise=True)
+
+        results = self.enforcer.enforce_many(self.pairs, self.creds,
+                                             stream=True, do_raise=True)
+        self.assertTrue(next(results))
+        self.assertRaises(policy.PolicyNotAuthorized, next, results)
+        # The batch ends with the first error
+        self.assertEqual([], list(results))
+
+    def test_unknown_domain(self):
+        creds = dict(self.creds, domain_id='missing')
+        pairs = [(('keystone', 'get_user'), {'obj.user.domain_id': 'd2'}),
+                 (('keystone', 'get_user'),
+                  {'obj.user.domain_id': 'missing'})]
+        results = self.enforcer.enforce_many(pairs, creds, stream=True)
+        # Denied by the system policy, without looking the domain up
+        self.assertFalse(next(results))
+        self.assertRaises(exception.DomainNotFound, next, results)
+
+
+class CacheStatsTestCase(base.SQLTestCase):
+
+    def setUp(self):
+        super(CacheStatsTestCase, self).setUp()
+        for perm, condition in (('get_user', 'role:a'),
+                                ('update_user', 'role:b'),
+                                ('delete_user', 'role:c')):
+            self.add_rule('p1', 'keystone', perm, condition)
+        self.conf.set_override('rule_cache_size', 2, group='oslo_policy')
+
+    def enforce(self, enforcer, perm):
+        creds = {'domain_id': 'd1', 'user_id': 'u1', 'roles': ['a']}
+        return enforcer.enforce(('keystone', perm),
+                                {'obj.user.domain_id': 'd1'}, creds)
+
+    def counts(self, enforcer, name):
+        stats = enforcer.cache_stats()[name]
+        return (stats['hits'], stats['misses'], stats['evictions'],
+                stats['size'])
+
+    def test_rule_cache_eviction(self):
+        enforcer = policy.Enforcer(self.conf)
+        self.assertTrue(self.enforce(enforcer, 'get_user'))
+        self.assertFalse(self.enforce(enforcer, 'update_user'))
+        self.assertFalse(self.enforce(enforcer, 'delete_user'))
+        self.assertEqual((0, 3, 1, 2), self.counts(enforcer, 'rules'))
+
+        self.assertFalse(self.enforce(enforcer, 'delete_user'))
+        self.assertEqual((1, 3, 1, 2), self.counts(enforcer, 'rules'))
+        # Evicted, parsed again
+        self.assertTrue(self.enforce(enforcer, 'get_user'))
+        self.assertEqual((1, 4, 2, 2), self.counts(enforcer, 'rules'))
+
+    def test_shared_condition(self):
+        self.add_rule('p1', 'keystone', 'change_password', 'role:a')
+        enforcer = policy.Enforcer(self.conf)
+        self.assertTrue(self.enforce(enforcer, 'get_user'))
+        self.assertTrue(self.enforce(enforcer, 'change_password'))
+        self.assertEqual((1, 1, 0, 1), self.counts(enforcer, 'rules'))
+
+    def test_domain_cache_expiry(self):
+        clock = test_cache.use_fake_clock(self)
+        self.conf.set_override('domain_cache_time', 60, group='oslo_policy')
+        enforcer = policy.Enforcer(self.conf)
+        self.assertTrue(self.enforce(enforcer, 'get_user'))
+        self.assertTrue(self.enforce(enforcer, 'get_user'))
+        self.assertEqual((1, 1, 0, 1), self.counts(enforcer, 'domains'))
+
+        clock.now += 60
+        self.assertTrue(self.enforce(enforcer, 'get_user'))
+        self.assertEqual((1, 2, 0, 1), self.counts(enforcer, 'domains'))
+        self.assertNotIn('decisions', enforcer.cache_stats())
+
+
+class BuiltinRulesTestCase(base.SQLTestCase):
+
+    def test_shared(self):
+        first = policy.Enforcer(self.conf)
+        second = policy.Enforcer(self.conf)
+        self.assertIs(first.sys_rules, second.sys_rules)
+        self.assertIs(first.dflt_rules, second.dflt_rules)
+
+    def test_immutable(self):
+        enforcer = policy.Enforcer(self.conf)
+        rule = _parser.parse_rule('@')
+        for rules in (enforcer.sys_rules, enforcer.dflt_rules):
+            self.assertIsInstance(rules, policy.Rules)
+            for mutate in (lambda d: d.__setitem__('serv', {}),
+                           lambda d: d.__delitem__('keystone'),
+                           lambda d: d.__ior__({'serv': {}}),
+                           lambda d: d.clear(),
+                           lambda d: d.pop('keystone'),
+                           lambda d: d.popitem(),
+                           lambda d: d.setdefault('serv', {}),
+                           lambda d: d.update(serv={})):
+                self.assertRaises(TypeError, mutate, rules)
+                self.assertRaises(TypeError, mutate, rules['keystone'])
+            self.assertRaises(TypeError, rules['keystone'].__setitem__,
+                              'get_user', rule)
+            self.assertNotIn('serv', rules)
+
+        other = policy.Enforcer(self.conf)
+        self.assertIn('get_user', other.sys_rules['keystone'])
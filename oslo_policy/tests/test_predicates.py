@@ -0,0 +1,168 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+
+from oslotest import base as test_base
+import sqlalchemy
+
+from oslo_policy import policy
+from oslo_policy import predicates
+from oslo_policy.tests import base
+
+
+ROWS = [
+    {'id': 1, 'domain_id': 'd1', 'owner': 'u1'},
+    {'id': 2, 'domain_id': 'd1', 'owner': 'u2'},
+    {'id': 3, 'domain_id': 'd2', 'owner': 'u1'},
+    {'id': 4, 'domain_id': None, 'owner': 'u1'},
+    {'id': 5, 'domain_id': 'd1', 'owner': None},
+    {'id': 6, 'domain_id': None, 'owner': None},
+    # The text of a NULL column
+    {'id': 7, 'domain_id': 'None', 'owner': 'u2'},
+]
+
+_d1 = predicates.Eq('obj.domain_id', 'd1')
+_u1 = predicates.Eq('obj.owner', 'u1')
+_none = predicates.Eq('obj.domain_id', 'None')
+
+PREDICATES = [
+    predicates.TRUE,
+    predicates.FALSE,
+    _d1,
+    _none,
+    predicates.Not(_d1),
+    predicates.Not(_none),
+    predicates.And([_d1, _u1]),
+    predicates.Or([_d1, _u1]),
+    predicates.Not(predicates.And([_d1, _u1])),
+    predicates.Not(predicates.Or([_d1, _u1])),
+    predicates.Or([predicates.Not(_u1), _none]),
+    predicates.Not(predicates.Or([predicates.Not(_d1),
+                                  predicates.Not(_u1)])),
+    predicates.And([predicates.Not(predicates.Not(_u1)), predicates.TRUE]),
+    predicates.Not(predicates.FALSE),
+]
+
+
+class PredicateTestCase(test_base.BaseTestCase):
+
+    def test_abstract(self):
+        self.assertRaises(TypeError, predicates.Predicate)
+
+        class NoKey(predicates.Predicate):
+            def matches(self, target):
+                return True
+
+        self.assertRaises(TypeError, NoKey)
+
+
+class ToSQLAlchemyTestCase(test_base.BaseTestCase):
+
+    def setUp(self):
+        super(ToSQLAlchemyTestCase, self).setUp()
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        metadata = sqlalchemy.MetaData()
+        self.table = sqlalchemy.Table(
+            'obj', metadata,
+            sqlalchemy.Column('id', sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column('domain_id', sqlalchemy.String(64)),
+            sqlalchemy.Column('owner', sqlalchemy.String(64)))
+        metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(self.table.insert(), ROWS)
+        self.columns = {'obj.domain_id': self.table.c.domain_id,
+                        'obj.owner': self.table.c.owner}
+
+    def select(self, predicate):
+        query = self.table.select().where(
+            predicates.to_sqlalchemy(predicate, self.columns))
+        with self.engine.connect() as connection:
+            return set(row[0] for row in connection.execute(query))
+
+    def test_matches_like_the_predicate(self):
+        for predicate in PREDICATES:
+            expected = set(
+                row['id'] for row in ROWS
+                if predicate.matches(dict(('obj.' + k, v)
+                                          for k, v in row.items())))
+            self.assertEqual(expected, self.select(predicate), predicate)
+
+    def test_null_columns(self):
+        # NULL is the text 'None', and is not 'd1'
+        self.assertEqual(set([4, 6, 7]), self.select(_none))
+        self.assertEqual(set([3, 4, 6, 7]),
+                         self.select(predicates.Not(_d1)))
+        self.assertEqual(set([1, 2, 3, 5]),
+                         self.select(predicates.Not(_none)))
+
+    def test_unknown_key(self):
+        self.assertRaises(KeyError, predicates.to_sqlalchemy,
+                          predicates.Eq('obj.name', 'n'), self.columns)
+
+
+class FilterPredicateTestCase(base.SQLTestCase):
+
+    def setUp(self):
+        super(FilterPredicateTestCase, self).setUp()
+        self.add_rule('p1', 'keystone', 'get_user',
+                      'role:member or user_id:%(obj.user.id)s')
+        self.add_rule('p1', 'keystone', 'update_user',
+                      'not role:reader and http://example.com/%(user_id)s')
+        self.enforcer = policy.Enforcer(self.conf)
+
+    def creds(self, roles):
+        return {'domain_id': 'd1', 'user_id': 'u1', 'roles': roles}
+
+    def test_domain_rule(self):
+        action = ('keystone', 'get_user')
+        domain = predicates.Eq('obj.user.domain_id', 'd1')
+        self.assertEqual(domain, self.enforcer.filter_predicate(
+            action, self.creds(['member'])))
+        self.assertEqual(
+            predicates.And([domain, predicates.Eq('obj.user.id', 'u1')]),
+            self.enforcer.filter_predicate(action, self.creds(['reader'])))
+
+    def test_agrees_with_enforce(self):
+        action = ('keystone', 'get_user')
+        targets = [
+            {'obj.user.domain_id': domain_id, 'obj.user.id': user_id}
+            for domain_id, user_id in itertools.product(['d1', 'd2'],
+                                                        ['u1', 'u2'])]
+        for roles in (['member'], ['reader'], []):
+            creds = self.creds(roles)
+            predicate = self.enforcer.filter_predicate(action, creds)
+            for target in targets:
+                self.assertEqual(
+                    bool(self.enforcer.enforce(action, target, creds)),
+                    predicate.matches(target), (roles, target))
+
+    def test_default_rule(self):
+        # No domain rule for get_group: the default policy applies
+        action = ('keystone', 'get_group')
+        self.assertEqual(
+            predicates.Eq('obj.group.domain_id', 'd1'),
+            self.enforcer.filter_predicate(action,
+                                           self.creds(['domain_admin'])))
+        self.assertEqual(predicates.FALSE, self.enforcer.filter_predicate(
+            action, self.creds(['member'])))
+
+    def test_irreducible_rule(self):
+        action = ('keystone', 'update_user')
+        self.assertIsNone(self.enforcer.filter_predicate(
+            action, self.creds(['member'])))
+        # Decided before the http: check is reached
+        self.assertEqual(predicates.FALSE, self.enforcer.filter_predicate(
+            action, self.creds(['reader'])))
@@ -0,0 +1,164 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+from oslo_serialization import jsonutils
+from oslotest import base as test_base
+import six
+
+from oslo_policy import _checks
+from oslo_policy import _parser
+from oslo_policy import _shared
+from oslo_policy.common import sql as common_sql
+from oslo_policy import sql
+from oslo_policy.tests import base
+
+
+RULES = {'identity': {'get_user': _parser.parse_rule('role:admin')}}
+
+
+class SharedRulesFileTestCase(test_base.BaseTestCase):
+
+    def setUp(self):
+        super(SharedRulesFileTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'rules')
+        # Two instances, as two processes of the host would have
+        self.leader = _shared.SharedRulesFile(self.path)
+        self.follower = _shared.SharedRulesFile(self.path)
+
+    def test_one_leader(self):
+        self.assertTrue(self.leader.try_lead())
+        self.assertFalse(self.follower.try_lead())
+        self.assertTrue(self.leader.try_lead())
+        self.assertFalse(self.follower.try_lead())
+
+    def test_no_file(self):
+        self.assertIsNone(self.follower.reader())
+
+    def test_unreadable_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a policy buffer')
+        self.assertIsNone(self.follower.reader())
+
+    def test_reader_follows_the_file(self):
+        self.leader.publish({'rules': RULES}, 'first')
+        reader = self.follower.reader()
+        self.assertEqual('first', reader.metadata)
+        self.assertIs(reader, self.follower.reader())
+
+        self.leader.publish({'rules': RULES, 'more': RULES}, 'second')
+        new_reader = self.follower.reader()
+        self.assertIsNot(reader, new_reader)
+        self.assertEqual('second', new_reader.metadata)
+        self.assertEqual(['more', 'rules'], sorted(new_reader.sections()))
+
+        # The replaced file stays mapped for the readers still using it
+        self.assertEqual(['rules'], reader.sections())
+        rules, _default_rule = reader.load('rules')
+        self.assertEqual('role:admin', str(rules['identity']['get_user']))
+
+    def test_publish_replaces_atomically(self):
+        self.leader.publish({'rules': RULES}, 'first')
+        self.assertEqual(['rules'], os.listdir(self.directory))
+
+    def test_failed_publish(self):
+        # rename() fails, the path being a directory
+        os.mkdir(self.path)
+        self.assertRaises(EnvironmentError, self.leader.publish,
+                          {'rules': RULES})
+        self.assertEqual(['rules'], os.listdir(self.directory))
+
+
+class SharedSnapshotsTestCase(base.SQLTestCase):
+    """Snapshots written by the leader and read by another process."""
+
+    def setUp(self):
+        super(SharedSnapshotsTestCase, self).setUp()
+        self.add_rule('p1', 'identity', 'get_user', 'role:admin')
+        with common_sql.transaction(self.conf) as session:
+            session.add(sql.Domain(id='d2', name='d2', enabled=True,
+                                   extra={}))
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.conf.set_override('domain_cache_time', 60, group='oslo_policy')
+        self.conf.set_override('policy_change_poll_interval', 60,
+                               group='oslo_policy')
+        self.path = os.path.join(self.directory, 'rules')
+
+    def backend(self):
+        return sql.CachingBackend(self.conf,
+                                  shared=_shared.SharedRulesFile(self.path))
+
+    def publish(self, backend):
+        revision, snapshots = backend.export_snapshots()
+        sections = {}
+        for domain_id, snapshot in snapshots:
+            rules = dict((serv, dict((perm, _parser.parse_rule(condition))
+                                     for perm, condition in r.items()))
+                         for serv, r in snapshot.rules.items())
+            sections[sql.SHARED_DOMAIN_PREFIX + domain_id] = (
+                rules, jsonutils.dumps(snapshot.policy))
+        backend._shared.publish(sections,
+                                jsonutils.dumps({'revision': revision}))
+
+    def test_snapshot_read_from_file(self):
+        leader = self.backend()
+        self.assertIsInstance(leader.get_domain_snapshot('d1').get_rule(
+            'identity', 'get_user'), six.string_types)
+        self.publish(leader)
+
+        snapshot = self.backend().get_domain_snapshot('d1')
+        self.assertEqual('p1', snapshot.policy['id'])
+        rule = snapshot.get_rule('identity', 'get_user')
+        # Parsed, so read from the file rather than the database
+        self.assertIsInstance(rule, _checks.BaseCheck)
+        self.assertEqual('role:admin', str(rule))
+
+    def test_missing_domain_read_from_database(self):
+        leader = self.backend()
+        leader.get_domain_snapshot('d1')
+        self.publish(leader)
+
+        snapshot = self.backend().get_domain_snapshot('d2')
+        self.assertIsNone(snapshot.policy)
+
+    def test_stale_domain_read_from_database(self):
+        leader = self.backend()
+        leader.get_domain_snapshot('d1')
+        self.publish(leader)
+
+        with common_sql.transaction(self.conf) as session:
+            rule = session.query(sql.Rule).one()
+            rule.condition = 'role:member'
+        leader.backend.record_change('d1', policy_id='p1')
+
+        snapshot = self.backend().get_domain_snapshot('d1')
+        self.assertEqual('role:member',
+                         snapshot.get_rule('identity', 'get_user'))
+
+    def test_file_without_revision(self):
+        _shared.SharedRulesFile(self.path).publish(
+            {sql.SHARED_DOMAIN_PREFIX + 'd1': (RULES, '{}')}, '{}')
+        # Which changes it misses is unknown: read from the database
+        snapshot = self.backend().get_domain_snapshot('d1')
+        self.assertEqual('p1', snapshot.policy['id'])
+        self.assertIsInstance(snapshot.get_rule('identity', 'get_user'),
+                              six.string_types)
@@ -0,0 +1,260 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+import sqlalchemy
+
+from oslo_policy.common import sql as common_sql
+from oslo_policy import exception
+from oslo_policy import sql
+from oslo_policy.tests import base
+
+
+class ChangeFeedTestCase(base.SQLTestCase):
+
+    def setUp(self):
+        super(ChangeFeedTestCase, self).setUp()
+        self.backend = sql.Backend(self.conf)
+
+    def test_record_change(self):
+        latest, changed = self.backend.get_changes_since()
+        self.assertEqual(0, latest)
+        self.assertEqual(set(), changed)
+
+        revision = self.backend.record_change('d1', policy_id='p1')
+        self.assertEqual((revision, set(['d1'])),
+                         self.backend.get_changes_since(latest))
+        self.assertEqual((revision, set()),
+                         self.backend.get_changes_since(revision))
+        self.assertEqual(revision,
+                         self.backend.get_enabled_policy_in_domain(
+                             'd1')['revision'])
+
+    def test_poll_changes(self):
+        self.conf.set_override('domain_cache_time', 60, group='oslo_policy')
+        self.conf.set_override('policy_change_poll_interval', 60,
+                               group='oslo_policy')
+        backend = sql.CachingBackend(self.conf, self.backend)
+        self.assertEqual(set(), backend.poll_changes())
+
+        backend.get_domain_snapshot('d1')
+        self.assertEqual(1, len(backend._snapshots))
+
+        self.backend.record_change('d1')
+        self.assertEqual(set(['d1']), backend.poll_changes())
+        self.assertEqual(0, len(backend._snapshots))
+
+
+class DomainSnapshotTestCase(base.SQLTestCase):
+
+    def setUp(self):
+        super(DomainSnapshotTestCase, self).setUp()
+        self.add_rule('p1', 'keystone', 'get_user', 'role:member')
+        self.add_rule('p1', 'keystone', 'list_users', 'role:reader')
+        self.backend = sql.Backend(self.conf)
+
+    def test_single_rule(self):
+        p_ref, rules = self.backend.get_enabled_policy_rule(
+            'd1', 'keystone', 'get_user')
+        self.assertEqual('p1', p_ref['id'])
+        self.assertEqual({'keystone': {'get_user': 'role:member'}}, rules)
+
+        p_ref, rules = self.backend.get_enabled_policy_rule(
+            'd1', 'keystone', 'delete_user')
+        self.assertEqual('p1', p_ref['id'])
+        self.assertEqual({}, rules)
+
+        self.assertRaises(exception.DomainNotFound,
+                          self.backend.get_enabled_policy_rule,
+                          'missing', 'keystone', 'get_user')
+
+    def test_uncached_snapshot_loads_one_rule(self):
+        backend = sql.CachingBackend(self.conf, self.backend)
+        snapshot = backend.get_domain_snapshot('d1', ('keystone', 'get_user'))
+        self.assertEqual('p1', snapshot.policy['id'])
+        self.assertEqual({'keystone': {'get_user': 'role:member'}},
+                         snapshot.rules)
+
+        snapshot = backend.get_domain_snapshot('d1')
+        self.assertEqual({'keystone': {'get_user': 'role:member',
+                                       'list_users': 'role:reader'}},
+                         snapshot.rules)
+
+    def test_cached_snapshot_loads_every_rule(self):
+        self.conf.set_override('domain_cache_time', 60, group='oslo_policy')
+        backend = sql.CachingBackend(self.conf, self.backend)
+        snapshot = backend.get_domain_snapshot('d1', ('keystone', 'get_user'))
+        self.assertEqual(2, len(snapshot.rules['keystone']))
+
+    def test_several_enabled_policies(self):
+        # Only possible where the unique index of enabled policies is missing
+        with common_sql.transaction(self.conf) as session:
+            session.execute(sqlalchemy.text(
+                'DROP INDEX %s' % sql._ENABLED_POLICY_INDEX))
+            session.add(sql.Policy(id='p0', name='p0', domain_id='d1',
+                                   enabled=True, extra={}))
+        self.add_rule('p0', 'keystone', 'get_user', 'role:admin')
+        self.add_rule('p0', 'keystone', 'get_project', 'role:admin')
+
+        self.assertEqual('p0', self.backend.get_enabled_policy_in_domain(
+            'd1')['id'])
+
+        p_ref, rules = self.backend.get_enabled_policy_rules('d1')
+        self.assertEqual('p0', p_ref['id'])
+        self.assertEqual({'keystone': {'get_user': 'role:admin',
+                                       'get_project': 'role:admin'}},
+                         rules)
+
+        p_ref, rules = self.backend.get_enabled_policy_rule(
+            'd1', 'keystone', 'list_users')
+        self.assertEqual('p0', p_ref['id'])
+        self.assertEqual({}, rules)
+
+
+class SessionScopeTestCase(base.SQLTestCase):
+
+    def count_commits(self, session):
+        commits = []
+        sqlalchemy.event.listen(session, 'after_commit',
+                                lambda s: commits.append(s))
+        return commits
+
+    def domain_ids(self):
+        session = common_sql.get_session(self.conf)
+        try:
+            return set(d.id for d in session.query(sql.Domain))
+        finally:
+            session.close()
+
+    def test_nested_scopes_share_a_session(self):
+        with common_sql.session_scope(self.conf) as session:
+            commits = self.count_commits(session)
+            with common_sql.session_scope(self.conf) as inner:
+                self.assertIs(session, inner)
+                with common_sql.transaction(self.conf) as transaction:
+                    self.assertIs(session, transaction)
+                    transaction.add(sql.Domain(id='d2', name='d2',
+                                               enabled=True, extra={}))
+            self.assertEqual([], commits)
+            with common_sql.transaction(self.conf) as transaction:
+                self.assertIs(session, transaction)
+            self.assertEqual([], commits)
+        self.assertEqual(1, len(commits))
+        self.assertEqual(set(['d1', 'd2']), self.domain_ids())
+
+        # The next scope starts a new session
+        with common_sql.session_scope(self.conf) as other:
+            self.assertIsNot(session, other)
+
+    def test_rollback_once(self):
+        def change():
+            with common_sql.session_scope(self.conf):
+                with common_sql.session_scope(self.conf) as inner:
+                    inner.add(sql.Domain(id='d2', name='d2', enabled=True,
+                                         extra={}))
+                    inner.flush()
+                    raise ValueError()
+
+        self.assertRaises(ValueError, change)
+        self.assertEqual(set(['d1']), self.domain_ids())
+        # The failed scope is not reused
+        with common_sql.transaction(self.conf) as session:
+            session.add(sql.Domain(id='d3', name='d3', enabled=True,
+                                   extra={}))
+        self.assertEqual(set(['d1', 'd3']), self.domain_ids())
+
+    def test_one_session_per_thread(self):
+        sessions = []
+
+        def scope():
+            with common_sql.session_scope(self.conf) as session:
+                sessions.append(session)
+
+        with common_sql.session_scope(self.conf) as session:
+            thread = threading.Thread(target=scope)
+            thread.start()
+            thread.join()
+        self.assertEqual(1, len(sessions))
+        self.assertIsNot(session, sessions[0])
+
+
+class _Facade(object):
+    """Records the arguments of the engine facade."""
+
+    def __init__(self, connection, **kwargs):
+        self.connection = connection
+        self.kwargs = kwargs
+        self.engine = sqlalchemy.create_engine(connection)
+
+    def get_engine(self):
+        return self.engine
+
+
+class EngineOptionsTestCase(base.SQLTestCase):
+
+    def setUp(self):
+        super(EngineOptionsTestCase, self).setUp()
+        facade = common_sql.db_session.EngineFacade
+        self.addCleanup(setattr, common_sql.db_session, 'EngineFacade',
+                        facade)
+        common_sql.db_session.EngineFacade = _Facade
+        common_sql.cleanup()
+
+    def test_pool_options(self):
+        self.conf.set_override('policy_max_pool_size', 7,
+                               group='oslo_policy')
+        self.conf.set_override('policy_max_overflow', 3, group='oslo_policy')
+        self.conf.set_override('policy_idle_timeout', 60,
+                               group='oslo_policy')
+        facade = common_sql._get_engine_facade(self.conf)
+        self.assertEqual({'max_pool_size': 7, 'max_overflow': 3,
+                          'idle_timeout': 60}, facade.kwargs)
+        self.assertFalse(sqlalchemy.event.contains(
+            facade.get_engine(), 'checkout', common_sql._ping_connection))
+
+    def test_pre_ping(self):
+        self.conf.set_override('policy_pool_pre_ping', True,
+                               group='oslo_policy')
+        engine = common_sql.get_engine(self.conf)
+        self.assertTrue(sqlalchemy.event.contains(
+            engine, 'checkout', common_sql._ping_connection))
+        with engine.connect() as connection:
+            self.assertEqual(1, connection.execute(
+                sqlalchemy.text('SELECT 1')).scalar())
+
+    def test_ping_dead_connection(self):
+        class Cursor(object):
+            closed = False
+
+            def execute(self, statement):
+                raise RuntimeError('gone away')
+
+            def close(self):
+                self.closed = True
+
+        class Connection(object):
+            def __init__(self):
+                self.cursors = []
+
+            def cursor(self):
+                self.cursors.append(Cursor())
+                return self.cursors[-1]
+
+        connection = Connection()
+        self.assertRaises(sqlalchemy.exc.DisconnectionError,
+                          common_sql._ping_connection, connection, None,
+                          None)
+        self.assertTrue(connection.cursors[0].closed)